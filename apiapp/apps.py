@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ApiappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apiapp'
+
+    def ready(self):
+        from apiapp import signals  # noqa: F401
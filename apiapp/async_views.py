@@ -0,0 +1,334 @@
+"""
+Async variant of the `TaskViewSet` endpoints for ASGI deployments.
+
+Enabled with `TASK_API_ASYNC=True`, see `apiapp/urls.py`. Reads go through
+the async ORM so a request waiting on the database doesn't hold a thread;
+writes which must share a transaction with the outbox run in `sync_to_async`
+since Django has no async transactions yet. Responses match `TaskViewSet`.
+
+`task_events`, the Server-Sent Events stream of task status changes, is
+routed whatever TASK_API_ASYNC is set to.
+"""
+from functools import wraps
+import json
+import logging
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotAuthenticated, ParseError
+from rest_framework.utils.encoders import JSONEncoder
+
+from apiapp.authentication import AsyncJWTAuthentication
+from apiapp.metrics import timed
+from apiapp.cache import invalidate_user_tasks
+from apiapp.conditional import alist_validators, detail_validators, not_modified, page_validators, set_validators
+from apiapp.events import events_enabled, publish_task_events, subscribe_task_events, task_event
+from apiapp.helpers import (
+    DEFAULT_TASK_RUNTIME,
+    TASK_EVENTS_KEEPALIVE_SECONDS,
+    TASK_STATUS_MAP,
+    validate_updation_status,
+)
+from apiapp.models import Task
+from apiapp.outbox import enqueue_task_runs
+from apiapp.pagination import TaskKeysetPagination
+from apiapp.serializers import (
+    TaskSerializer,
+    TaskUpdateSerializer,
+    TaskValuesSerializer,
+    TaskViewInDetailSerializer,
+    TaskViewSerializer,
+)
+from apiapp.validators import validate_timer, validate_uuid
+
+
+logger = logging.getLogger(__name__)
+
+
+def _response(data=None, status=200):
+    if data is None:
+        return HttpResponse(status=status)
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def _request_data(request):
+    if request.content_type == "application/json":
+        try:
+            return json.loads(request.body or b"{}")
+        except ValueError as e:
+            raise ParseError(f"JSON parse error - {e}")
+    return request.POST
+
+
+def async_authenticated(view):
+    """
+    Authenticate the request with `AsyncJWTAuthentication` and render DRF
+    exceptions raised by the view the same way DRF does.
+    """
+    authenticator = AsyncJWTAuthentication()
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            with timed("auth"):
+                result = await authenticator.aauthenticate(request)
+            if result is None:
+                raise NotAuthenticated()
+            request.user, request.auth = result
+            return await view(request, *args, **kwargs)
+        except APIException as e:
+            data = e.detail if isinstance(e.detail, (dict, list)) else {"detail": e.detail}
+            response = _response(data, status=e.status_code)
+            if e.status_code == 401:
+                response["WWW-Authenticate"] = authenticator.authenticate_header(request)
+            return response
+
+    return csrf_exempt(wrapper)
+
+
+def _method_not_allowed(request):
+    return _response({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+
+
+@async_authenticated
+async def task_list(request):
+    if request.method == "GET":
+        return await _list(request)
+    if request.method == "POST":
+        return await _create(request)
+    return _method_not_allowed(request)
+
+
+@async_authenticated
+async def task_detail(request, pk):
+    if not validate_uuid(pk):
+        logger.error(f"[async] Invalid task ID: {pk}")
+        return _response({"error": "Invalid task ID"}, status=400)
+    if request.method == "GET":
+        return await _retrieve(request, pk)
+    if request.method in ("PUT", "PATCH"):
+        return await _update(request, pk)
+    if request.method == "DELETE":
+        return await _destroy(request, pk)
+    return _method_not_allowed(request)
+
+
+async def _list(request):
+    status_filter = request.GET.get("status", None)
+    queryset = Task.objects.filter(user=request.user).order_by("created_at")
+    if TASK_STATUS_MAP.get(status_filter):
+        queryset = queryset.filter(status=status_filter)
+
+    url = request.build_absolute_uri()
+    serializer = TaskValuesSerializer(TaskViewSerializer)
+    paginator = TaskKeysetPagination()
+    if paginator.is_requested(request):
+        # Validators from the page's own rows, as in TaskViewSet.list
+        rows = paginator.get_page_queryset(serializer.values(queryset, "created_at", "updated_at", named=True), request)
+        page = paginator.set_page([row async for row in rows])
+        etag = page_validators(request.user.id, url, page, paginator.next_cursor)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        data = paginator.get_paginated_data(serializer.many(page))
+    else:
+        etag = await alist_validators(request.user.id, url, queryset)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        # Not aiterator(): values_list's iterator runs the query as soon as it is created
+        data = serializer.many([row async for row in serializer.values(queryset)])
+    return set_validators(_response(data), etag)
+
+
+async def _retrieve(request, pk):
+    task = await Task.objects.filter(user=request.user, task_id=pk).afirst()
+    if task is None:
+        logger.error(f"[async retrieve] Task not found for ID: {pk}")
+        return _response(status=404)
+    # The task is fetched either way, only its serialization is saved on a 304.
+    etag, last_modified = detail_validators(request.user.id, pk, task.updated_at)
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    return set_validators(_response(TaskViewInDetailSerializer(task).data), etag, last_modified)
+
+
+def _create_running_task(user, data, timer):
+    with transaction.atomic():
+        task = Task.objects.create(**data, user=user)
+        enqueue_task_runs([(task.task_id, int(timer), task.priority)])
+        invalidate_user_tasks(user.id)
+        publish_task_events(user.id, [(task.task_id, task.status)])
+    return task
+
+
+def _task_created(user, task):
+    invalidate_user_tasks(user.id)
+    publish_task_events(user.id, [(task.task_id, task.status)])
+
+
+async def _fork(request, task_id):
+    task = await Task.objects.filter(user=request.user, task_id=task_id).defer("task_id").afirst()
+    if task is None:
+        return _response({"error": f"Task with id:-{task_id} not found"}, status=404)
+    new_task = TaskSerializer(data={"name": f"{task.name}-forked"})
+    if not new_task.is_valid():
+        return _response(new_task.errors, status=400)
+    validated_data = new_task.validated_data
+    if await Task.objects.filter(user=request.user, name=validated_data["name"]).aexists():
+        return _response({"name": ["Task with this name already exists."]}, status=400)
+    new_task_instance = await Task.objects.acreate(**validated_data, user=request.user)
+    await sync_to_async(_task_created)(request.user, new_task_instance)
+    return _response(TaskSerializer(new_task_instance).data)
+
+
+async def _create(request):
+    data = _request_data(request)
+    fork_task_id = data.get("fork_task_id", None)
+    if fork_task_id and validate_uuid(fork_task_id):
+        return await _fork(request, fork_task_id)
+
+    timer = data.get("timer", DEFAULT_TASK_RUNTIME)
+    if not validate_timer(timer):
+        return _response({"error": "Timer must be a non-negative integer"}, status=400)
+    # No user_id in context: the name uniqueness query is run below through the async ORM.
+    serializer = TaskSerializer(data=data)
+    if not serializer.is_valid():
+        logger.error(f"[async create] Task creation failed: {serializer.errors}")
+        return _response(serializer.errors, status=400)
+    validated_data = serializer.validated_data
+    if await Task.objects.filter(user=request.user, name=validated_data["name"]).aexists():
+        return _response({"name": ["Task with this name already exists."]}, status=400)
+
+    if validated_data.get("status") == Task.TaskStatus.RUNNING:
+        task = await sync_to_async(_create_running_task)(request.user, validated_data, timer)
+    else:
+        task = await Task.objects.acreate(**validated_data, user=request.user)
+        await sync_to_async(_task_created)(request.user, task)
+    logger.info(f"[async create] Task created with ID: {task.task_id} - {task.created_at}")
+    return _response({"message": "Task created successfully"}, status=201)
+
+
+def _transition_task(user, queryset, task_id, status, fields, timer) -> bool:
+    with transaction.atomic():
+        if not queryset.transition(status):
+            return False
+        if fields:
+            queryset.update(**fields)
+        if status == Task.TaskStatus.RUNNING:
+            priority = fields.get("priority") or queryset.values_list("priority", flat=True).first()
+            enqueue_task_runs([(task_id, int(timer), priority)])
+        invalidate_user_tasks(user.id)
+        publish_task_events(user.id, [(task_id, status)])
+    return True
+
+
+async def _update(request, pk):
+    data = _request_data(request)
+    if "status" in data and validate_updation_status(data["status"]) is False:
+        logger.error(f'[async update] Invalid status value: {data["status"]}')
+        return _response({"error": "Invalid status value"}, status=400)
+    timer = data.get("timer", DEFAULT_TASK_RUNTIME)
+    if not validate_timer(timer):
+        return _response({"error": "Timer must be a non-negative integer"}, status=400)
+
+    serializer = TaskUpdateSerializer(data=data, partial=True)
+    if not serializer.is_valid():
+        return _response(serializer.errors, status=400)
+    fields = dict(serializer.validated_data)
+    status = fields.pop("status", None)
+    if "name" in fields and await Task.objects.filter(user=request.user, name=fields["name"]).aexists():
+        return _response({"name": ["Task with this name already exists."]}, status=400)
+
+    queryset = Task.objects.filter(user=request.user, task_id=pk)
+    if status is not None:
+        # A status change, its field updates and the outbox write share one transaction.
+        updated = await sync_to_async(_transition_task)(
+            request.user, queryset, uuid.UUID(pk), status, fields, timer
+        )
+    elif fields:
+        updated = await queryset.aupdate(**fields) == 1
+        await sync_to_async(invalidate_user_tasks)(request.user.id)
+    else:
+        updated = await queryset.aexists()
+
+    if not updated:
+        if status is None or not await queryset.aexists():
+            logger.error(f"[async update] Task not found for ID: {pk}")
+            return _response({"error": f"Task with id:-{pk} not found"}, status=404)
+        logger.error(f"[async update] Task {pk} can't move to status {status}")
+        return _response({"error": f"Task with id:-{pk} can't move to status {status}"}, status=409)
+    logger.info(f"[async update] Task updated successfully: {pk}")
+    return _response({"message": "Task updated successfully"}, status=200)
+
+
+async def _destroy(request, pk):
+    deleted, _ = await Task.objects.filter(user=request.user, task_id=uuid.UUID(pk)).adelete()
+    if not deleted:
+        return _response(status=404)
+    await sync_to_async(invalidate_user_tasks)(request.user.id)
+    logger.info(f"[async destroy] Task deleted successfully: {pk}")
+    return _response({"message": f"Task {pk} deleted successfully"}, status=204)
+
+
+def _sse(event) -> str:
+    return f"event: status\ndata: {json.dumps(event)}\n\n"
+
+
+async def _event_stream(user, task_id):
+    async with subscribe_task_events(user.id) as pubsub:
+        if task_id:
+            # Subscribed before reading the current status, so a completion
+            # racing with the connect is either in the snapshot or an event.
+            task = await Task.objects.filter(user=user, task_id=task_id).only("task_id", "status").afirst()
+            if task is None:
+                return
+            yield _sse(task_event(task.task_id, task.status))
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=TASK_EVENTS_KEEPALIVE_SECONDS)
+            if message is None:
+                # Comment line, keeps proxies from closing an idle stream.
+                yield ": keep-alive\n\n"
+                continue
+            event = json.loads(message["data"])
+            if task_id and event["task_id"] != task_id:
+                continue
+            yield _sse(event)
+
+
+@async_authenticated
+async def task_events(request):
+    """
+    Server-Sent Events stream of status changes of the user's tasks.
+
+    Each event is `{"task_id", "status"}` with the status label. With a
+    `task_id` query param only that task is streamed, starting with its current
+    status. Needs TASK_EVENTS_REDIS_URL and an ASGI server: WSGI consumes an
+    async streaming response to the end before sending any of it, so this
+    endless stream would never reach the client and would hold the worker
+    thread for good. Under WSGI it answers 501 instead.
+    """
+    if request.method != "GET":
+        return _method_not_allowed(request)
+    if not events_enabled():
+        return _response({"error": "Task events are disabled"}, status=503)
+    if not isinstance(request, ASGIRequest):
+        return _response({"error": "Task events need the API served over ASGI"}, status=501)
+    task_id = request.GET.get("task_id")
+    if task_id is not None:
+        if not validate_uuid(task_id):
+            return _response({"error": "Invalid task ID"}, status=400)
+        task_id = str(uuid.UUID(task_id))
+        if not await Task.objects.filter(user=request.user, task_id=task_id).aexists():
+            return _response({"error": f"Task with id:-{task_id} not found"}, status=404)
+
+    response = StreamingHttpResponse(_event_stream(request.user, task_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Don't let nginx buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,190 @@
+from collections import OrderedDict
+import threading
+import time
+
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from apiapp.metrics import timed
+from apiapp.models import CachedUser
+from apiapp.helpers import JWT_USER_CACHE_SIZE, JWT_USER_CACHE_TTL, JWT_USER_SHARED_CACHE_TTL
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a per-entry TTL.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard_if(self, predicate):
+        with self._lock:
+            for key in [key for key, (_, value) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Raw access token -> (user fields, validated token), per process.
+token_user_cache = TTLCache(maxsize=JWT_USER_CACHE_SIZE)
+
+
+def _user_cache_key(user_id) -> str:
+    return f"auth:user:{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    """
+    Drop a user from the shared and in-process caches, e.g. after it was
+    deactivated or its password changed. Other processes drop their
+    in-process entries within JWT_USER_CACHE_TTL seconds.
+    """
+    cache.delete(_user_cache_key(user_id))
+    token_user_cache.discard_if(lambda value: value[0]['id'] == user_id)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication which caches decoded token -> user.
+
+    A hit in the in-process LRU skips both the signature check and the user
+    query. On a miss the token is validated and the user (id, username,
+    is_active) is read from the shared cache, and from `auth_user` only if it
+    isn't cached there either. Entries never outlive the token expiry.
+
+    The returned user is a read-only `CachedUser`: only id, username and
+    is_active are loaded (the other fields are deferred, read from the
+    database on access) and saving or deleting it raises NotImplementedError.
+    """
+
+    def authenticate(self, request):
+        with timed('auth'):
+            return self._authenticate(request)
+
+    def _authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        cached = token_user_cache.get(raw_token)
+        if cached is not None:
+            user_fields, validated_token = cached
+            return self.build_user(user_fields), validated_token
+
+        validated_token = self.get_validated_token(raw_token)
+        user_fields = self.get_user_fields(validated_token)
+        self.cache_token(raw_token, user_fields, validated_token)
+        return self.build_user(user_fields), validated_token
+
+    def cache_token(self, raw_token, user_fields, validated_token):
+        ttl = min(JWT_USER_CACHE_TTL, validated_token['exp'] - time.time())
+        if ttl > 0:
+            token_user_cache.set(raw_token, (user_fields, validated_token), ttl)
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def get_user_fields(self, validated_token) -> dict:
+        user_id = self.get_user_id(validated_token)
+        user_fields = cache.get(_user_cache_key(user_id))
+        if user_fields is None:
+            user = self.get_user(validated_token)
+            user_fields = self.user_fields(user)
+            cache.set(_user_cache_key(user_id), user_fields, JWT_USER_SHARED_CACHE_TTL)
+        return user_fields
+
+    def user_fields(self, user) -> dict:
+        return {'id': user.pk, 'username': user.get_username(), 'is_active': user.is_active}
+
+    def build_user(self, user_fields):
+        return CachedUser.from_db(
+            'default',
+            ['id', 'username', 'is_active'],
+            [user_fields['id'], user_fields['username'], user_fields['is_active']],
+        )
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """
+    JWT authentication for the async task views.
+    Token parsing and signature checks are CPU only and reused as is, cache
+    and user lookups are awaited.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        cached = token_user_cache.get(raw_token)
+        if cached is not None:
+            user_fields, validated_token = cached
+            return self.build_user(user_fields), validated_token
+
+        validated_token = self.get_validated_token(raw_token)
+        user_fields = await self.aget_user_fields(validated_token)
+        self.cache_token(raw_token, user_fields, validated_token)
+        return self.build_user(user_fields), validated_token
+
+    async def aget_user_fields(self, validated_token) -> dict:
+        user_id = self.get_user_id(validated_token)
+        user_fields = await cache.aget(_user_cache_key(user_id))
+        if user_fields is None:
+            user = await self.aget_user(validated_token)
+            user_fields = self.user_fields(user)
+            await cache.aset(_user_cache_key(user_id), user_fields, JWT_USER_SHARED_CACHE_TTL)
+        return user_fields
+
+    async def aget_user(self, validated_token):
+        """
+        Async variant of `JWTAuthentication.get_user`.
+        """
+        user_id = self.get_user_id(validated_token)
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
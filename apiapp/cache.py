@@ -0,0 +1,73 @@
+"""
+Per-user cache of task list/detail responses.
+
+Every cached entry is keyed on a per-user version counter, and every write
+path bumps that counter through `invalidate_user_tasks`. Invalidating a user
+is therefore a single `INCR` and old entries simply stop being read and expire.
+
+The worker completes tasks from another process, so the cache has to be
+shared (Redis, see CACHE_REDIS_URL) for it to be enabled with TASK_CACHE_ENABLED.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from apiapp.helpers import TASK_CACHE_ENABLED, TASK_CACHE_TIMEOUT
+
+
+def _version_key(user_id) -> str:
+    return f"tasks:version:{user_id}"
+
+
+def get_tasks_version(user_id) -> int:
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # Seed with the current time so a version evicted from the cache is
+        # never reused for entries cached under an older counter.
+        cache.add(_version_key(user_id), time.time_ns() // 1000, timeout=None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def _bump_tasks_version(user_id):
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        get_tasks_version(user_id)
+
+
+def invalidate_user_tasks(user_id):
+    """
+    Invalidate the cached task responses of a user after a write.
+
+    The version is bumped right away and once more after the surrounding
+    transaction commits, so a read racing with the write can't cache
+    pre-commit rows under the post-write version.
+    """
+    if not TASK_CACHE_ENABLED or user_id is None:
+        return
+    _bump_tasks_version(user_id)
+    transaction.on_commit(lambda: _bump_tasks_version(user_id))
+
+
+def cached_task_data(user_id, key, compute):
+    """
+    Return the cached response data for `key`, computing and caching it on a miss.
+
+    args:
+        user_id: Owner of the tasks in the response.
+        key: What identifies the response for this user, e.g. the request URL.
+        compute: Callable returning the response data, None is not cached.
+    """
+    if not TASK_CACHE_ENABLED:
+        return compute()
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    cache_key = f"tasks:{user_id}:{get_tasks_version(user_id)}:{digest}"
+    data = cache.get(cache_key)
+    if data is None:
+        data = compute()
+        if data is not None:
+            cache.set(cache_key, data, TASK_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,95 @@
+"""
+Incremental change feed of a user's tasks.
+
+A change is either a task row, ordered by (updated_at, task_id), or a
+`TaskTombstone` of a deleted task, ordered by (deleted_at, task_id). Every
+write path stamps `updated_at` (see `TaskQuerySet.update`) and every delete
+leaves a tombstone (see `TaskQuerySet.delete`), so a client holding the
+`since` cursor of its last sync only reads what changed after it.
+
+Writes younger than TASK_CHANGES_SETTLE_SECONDS are held back: a transaction
+that stamped its rows before a later one committed would otherwise land
+behind a cursor already handed out.
+
+A cursor also carries the settle horizon of the last sync that read every
+change (`synced_at`): nothing before it is left unread, so a cursor only
+expires once that horizon, not the last change, is older than the tombstone
+retention. An account without recent writes keeps syncing incrementally.
+"""
+from datetime import timedelta
+import heapq
+
+from django.db.models import Q
+from django.utils import timezone
+
+from apiapp.helpers import TASK_CHANGES_SETTLE_SECONDS, TASK_TOMBSTONE_RETENTION_DAYS
+from apiapp.models import Task, TaskTombstone
+from apiapp.pagination import decode_synced_position, encode_position
+from apiapp.serializers import TaskViewInDetailSerializer
+
+
+class ChangesExpired(Exception):
+    """
+    The `since` cursor was last synced before the tombstone retention, deletes
+    after it may have been pruned and the client has to sync from scratch.
+    """
+
+
+def _after(queryset, field, position, task_id):
+    return queryset.filter(Q(**{f'{field}__gt': position}) | Q(**{field: position, 'task_id__gt': task_id}))
+
+
+def task_changes(user, since, limit) -> dict:
+    """
+    Changes to the tasks of `user` after the `since` cursor, at most `limit`.
+
+    Without `since` every task is returned and tombstones are skipped, which is
+    an initial sync. Raises ValidationError for an invalid cursor and
+    ChangesExpired for one last synced over TASK_TOMBSTONE_RETENTION_DAYS ago.
+
+    returns:
+        {"changes": [...], "since": <cursor of the next sync>, "has_more": bool}
+    """
+    now = timezone.now()
+    horizon = now - timedelta(seconds=TASK_CHANGES_SETTLE_SECONDS)
+    tasks = Task.objects.filter(user=user, updated_at__lte=horizon)
+    tombstones = TaskTombstone.objects.filter(user=user, deleted_at__lte=horizon)
+    synced_at = None
+    if since:
+        position, task_id, synced_at = decode_synced_position(since)
+        if max(position, synced_at) < now - timedelta(days=TASK_TOMBSTONE_RETENTION_DAYS):
+            raise ChangesExpired()
+        tasks = _after(tasks, 'updated_at', position, task_id)
+        tombstones = _after(tombstones, 'deleted_at', position, task_id)
+    else:
+        tombstones = tombstones.none()
+
+    # Each stream is read one row past the limit, the first `limit` rows of
+    # the merge are then the first `limit` changes overall.
+    task_rows = [
+        (task.updated_at, task.task_id, task)
+        for task in tasks.order_by('updated_at', 'task_id')[:limit + 1]
+    ]
+    tombstone_rows = [
+        (deleted_at, task_id, None)
+        for deleted_at, task_id in tombstones.order_by('deleted_at', 'task_id').values_list('deleted_at', 'task_id')[:limit + 1]
+    ]
+    rows = list(heapq.merge(task_rows, tombstone_rows, key=lambda row: row[:2]))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    serializer = TaskViewInDetailSerializer()
+    changes = [
+        {'task_id': str(task_id), 'deleted': task is None, 'task': serializer.to_representation(task) if task else None}
+        for _, task_id, task in rows
+    ]
+    # Every change up to the horizon is read once the last page is served
+    if not has_more:
+        synced_at = horizon
+    if rows:
+        next_since = encode_position(*rows[-1][:2], synced_at=synced_at)
+    elif since:
+        next_since = encode_position(position, task_id, synced_at=synced_at)
+    else:
+        next_since = None
+    return {'changes': changes, 'since': next_since, 'has_more': has_more}
@@ -0,0 +1,171 @@
+"""
+Batched task completions for Celery workers.
+
+`run_task` completing one task per transaction costs a SELECT and an UPDATE
+each; when many timers expire at once the worker floods the database with
+single-row transactions. Inside a worker, completions are buffered instead and
+flushed by `complete_tasks` as one set-based transition every
+TASK_COMPLETION_BATCH_SIZE tasks or TASK_COMPLETION_FLUSH_MS, whichever comes
+first.
+
+The buffer is flushed when the worker (process) shuts down, so a warm shutdown
+(SIGTERM, `celery control shutdown`) loses no completions. A worker killed
+outright (SIGKILL, OOM) loses the buffered ones, their messages already
+acknowledged; `complete_overdue_tasks`, run by the outbox relay, completes
+those tasks once they are TASK_COMPLETION_GRACE_SECONDS past their timer.
+Outside a worker (tests, eager runs) completions are written right away.
+"""
+from collections import defaultdict
+from datetime import timedelta
+import logging
+import os
+import threading
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from apiapp.cache import invalidate_user_tasks
+from apiapp.events import publish_task_events
+from apiapp.helpers import TASK_COMPLETION_BATCH_SIZE, TASK_COMPLETION_FLUSH_MS, TASK_COMPLETION_GRACE_SECONDS
+from apiapp.models import Task, TaskOutbox
+
+
+logger = logging.getLogger(__name__)
+
+
+def complete_tasks(task_ids) -> int:
+    """
+    Complete the running tasks among `task_ids` with one set-based transition,
+    invalidate the owners' caches and publish the status events.
+
+    returns:
+        Number of tasks completed; a concurrent fail or delete wins.
+    """
+    return _complete(Task.objects.filter(task_id__in=task_ids), len(task_ids))
+
+
+def _complete(queryset, expected) -> int:
+    completed = queryset.transition_returning(Task.TaskStatus.COMPLETED)
+    skipped = expected - len(completed)
+    if skipped:
+        logger.info(f"[run_task] {skipped} tasks are no longer running, skipping completion.")
+    by_user = defaultdict(list)
+    for task_id, user_id in completed:
+        by_user[user_id].append((task_id, Task.TaskStatus.COMPLETED))
+    for user_id, task_statuses in by_user.items():
+        invalidate_user_tasks(user_id)
+        publish_task_events(user_id, task_statuses)
+    return len(completed)
+
+
+def complete_overdue_tasks(grace_seconds=TASK_COMPLETION_GRACE_SECONDS, batch_size=TASK_COMPLETION_BATCH_SIZE) -> int:
+    """
+    Complete one batch of tasks still running `grace_seconds` after their timer
+    expired, whose completion was lost with a killed worker.
+
+    `due_at` is stamped when the run is published, and tasks with a run still
+    in the outbox are skipped, so a relay or broker outage never completes a
+    task that wasn't dispatched. The grace must cover the queue wait of a
+    scheduled run, or a late but not lost completion is written early (its own
+    run is then skipped).
+
+    returns:
+        Number of tasks completed.
+    """
+    due_before = timezone.now() - timedelta(seconds=grace_seconds)
+    overdue = (
+        Task.objects.filter(status=Task.TaskStatus.RUNNING, due_at__lt=due_before)
+        .exclude(task_id__in=TaskOutbox.objects.values('task_id'))
+    )
+    task_ids = list(overdue.order_by('due_at').values_list('task_id', flat=True)[:batch_size])
+    if not task_ids:
+        return 0
+    # Filtered again as the tasks are locked, a task restarted meanwhile is left running
+    completed = _complete(overdue.filter(task_id__in=task_ids), len(task_ids))
+    logger.warning(f"[complete_overdue_tasks] Completed {completed} tasks whose completion was lost")
+    return completed
+
+
+class CompletionBuffer:
+    """
+    Task IDs waiting to be completed, flushed every `batch_size` IDs (by the
+    caller of `add`) or `flush_ms` (by a background thread).
+
+    Only buffers once `start` is called (in a worker); the thread is started
+    lazily in each process, as prefork children inherit the buffer without it.
+    """
+
+    def __init__(self, batch_size=TASK_COMPLETION_BATCH_SIZE, flush_ms=TASK_COMPLETION_FLUSH_MS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.enabled = False
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread_pid = None
+
+    def start(self):
+        self.enabled = self.batch_size > 1
+        self._stopped.clear()
+
+    def add(self, task_id):
+        """
+        Complete `task_id` with the next flush, or right away if not buffering.
+        """
+        if not self.enabled:
+            complete_tasks([task_id])
+            return
+        self._ensure_thread()
+        with self._lock:
+            self._pending.append(task_id)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Complete the buffered tasks now. On a database error they stay buffered
+        for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                return complete_tasks(batch)
+            except Exception as e:
+                logger.error(f"[run_task] Completing {len(batch)} buffered tasks failed: {e}")
+                with self._lock:
+                    self._pending[:0] = batch
+                return 0
+
+    def close(self):
+        """
+        Stop buffering and flush what is left, on worker shutdown.
+        """
+        self.enabled = False
+        self._stopped.set()
+        self.flush()
+        with self._lock:
+            remaining = len(self._pending)
+        if remaining:
+            logger.error(f"[run_task] {remaining} buffered completions could not be written on shutdown.")
+
+    def _ensure_thread(self):
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                threading.Thread(target=self._run, name='task-completion-flusher', daemon=True).start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            # This thread holds its own connection, drop it if stale or broken
+            close_old_connections()
+            self.flush()
+
+
+completion_buffer = CompletionBuffer()
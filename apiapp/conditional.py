@@ -0,0 +1,88 @@
+"""
+ETag/Last-Modified validators for task list and detail responses.
+
+The ETag of a full list comes from one aggregate over the user's tasks,
+`max(updated_at)` and `count(*)` (the count catches deletes), served from the
+(user, updated_at) index. A request whose `If-None-Match` still matches gets a
+304 without the tasks being fetched or serialized.
+
+A keyset page and a single task are fetched anyway, which is one bounded
+query; their validators come from the rows fetched, and a 304 saves the
+serialization and the transfer.
+
+Only a single task has a Last-Modified. The newest `updated_at` of a list
+doesn't move when a task is deleted or leaves a filtered list, so
+If-Modified-Since alone would answer 304 for a list that changed.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def _etag(user_id, key, *parts) -> str:
+    digest = hashlib.sha1(repr((user_id, key, *parts)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _validator_aggregates():
+    return {'count': Count('pk'), 'last_modified': Max('updated_at')}
+
+
+def list_validators(user_id, key, queryset) -> str:
+    """
+    ETag of the tasks in `queryset`.
+
+    args:
+        user_id: Owner of the tasks.
+        key: What identifies the response for this user, e.g. the request URL.
+        queryset: The (filtered) tasks listed by the response.
+    """
+    result = queryset.aggregate(**_validator_aggregates())
+    return _etag(user_id, key, result['count'], result['last_modified'])
+
+
+async def alist_validators(user_id, key, queryset) -> str:
+    result = await queryset.aaggregate(**_validator_aggregates())
+    return _etag(user_id, key, result['count'], result['last_modified'])
+
+
+def page_validators(user_id, key, rows, next_cursor) -> str:
+    """
+    ETag of a page of tasks, from the `task_id` and `updated_at` of its rows
+    and the cursor of the next page, which appears or goes away as tasks after
+    the page are added or deleted.
+    """
+    updated = [(str(row.task_id), row.updated_at) for row in rows]
+    return _etag(user_id, key, updated, next_cursor)
+
+
+def detail_validators(user_id, key, updated_at):
+    """
+    (etag, last_modified) of a single task last written at `updated_at`.
+    """
+    return _etag(user_id, key, updated_at), updated_at
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    A 304 response if the request's validators still match, else None.
+    If-Modified-Since is only evaluated with a `last_modified`.
+    """
+    # Whole seconds, like Last-Modified itself; If-None-Match is checked first
+    # and is exact, If-Modified-Since alone can miss writes within a second.
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # The same URL returns different tasks per token.
+    patch_vary_headers(response, ('Authorization',))
+    return response
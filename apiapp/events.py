@@ -0,0 +1,91 @@
+"""
+Task status events, fanned out over Redis pub/sub.
+
+Every status write publishes `{"task_id", "status"}` on the owner's channel
+once its transaction commits. That covers the API views and the Celery worker
+completing a task. The async `task_events` view relays the channel to the
+browser or `client.py watch` as Server-Sent Events, so clients wait on
+completion instead of polling the detail endpoint.
+
+Enabled by setting TASK_EVENTS_REDIS_URL; publishing is a no-op otherwise.
+"""
+from contextlib import asynccontextmanager
+import json
+import logging
+
+from django.db import transaction
+
+from apiapp.helpers import TASK_EVENTS_REDIS_URL
+from apiapp.models import Task
+
+
+logger = logging.getLogger(__name__)
+
+_redis = None
+
+
+def events_enabled() -> bool:
+    return bool(TASK_EVENTS_REDIS_URL)
+
+
+def _channel(user_id) -> str:
+    return f"task-events:{user_id}"
+
+
+def _client():
+    global _redis
+    if _redis is None:
+        import redis
+
+        _redis = redis.Redis.from_url(TASK_EVENTS_REDIS_URL)
+    return _redis
+
+
+def task_event(task_id, status) -> dict:
+    """
+    Event payload of a task now in `status`, with the status label as in API responses.
+    """
+    return {"task_id": str(task_id), "status": str(Task.TaskStatus(status).label)}
+
+
+def publish_task_events(user_id, task_statuses):
+    """
+    Publish status events for tasks of `user_id` once the current transaction commits.
+
+    args:
+        user_id: Owner of the tasks.
+        task_statuses: List of (task_id, status) tuples.
+    """
+    if not events_enabled() or user_id is None or not task_statuses:
+        return
+    messages = [json.dumps(task_event(task_id, status)) for task_id, status in task_statuses]
+    transaction.on_commit(lambda: _publish(user_id, messages))
+
+
+def _publish(user_id, messages):
+    # The write is committed already, a Redis outage only costs the live
+    # notification; watchers re-read the task when they (re)connect.
+    try:
+        pipeline = _client().pipeline(transaction=False)
+        for message in messages:
+            pipeline.publish(_channel(user_id), message)
+        pipeline.execute()
+    except Exception as e:
+        logger.error(f"[events] Publishing {len(messages)} task events for user {user_id} failed: {e}")
+
+
+@asynccontextmanager
+async def subscribe_task_events(user_id):
+    """
+    Subscribe to the events of `user_id`, yielding a `redis.asyncio` PubSub.
+    """
+    import redis.asyncio
+
+    client = redis.asyncio.Redis.from_url(TASK_EVENTS_REDIS_URL)
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(_channel(user_id))
+        yield pubsub
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
@@ -0,0 +1,63 @@
+"""
+Streaming export of a user's tasks as NDJSON or CSV.
+
+Rows are read with `QuerySet.iterator(chunk_size=...)`, a server-side cursor on
+PostgreSQL, and written out one chunk at a time, so memory stays flat however
+many tasks are exported and the first bytes go out with the first chunk.
+"""
+import csv
+from itertools import islice
+import io
+import json
+
+from apiapp.helpers import TASK_EXPORT_CHUNK_SIZE
+from apiapp.serializers import TaskValuesSerializer, TaskViewInDetailSerializer
+
+
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _task_rows(serializer, queryset, chunk_size):
+    # Column tuples rather than model instances, see TaskValuesSerializer.
+    for row in serializer.values(queryset).iterator(chunk_size=chunk_size):
+        yield serializer.to_representation(row)
+
+
+def _chunks(rows, chunk_size):
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _ndjson_chunks(rows, chunk_size):
+    for chunk in _chunks(rows, chunk_size):
+        yield ''.join(json.dumps(row) + '\n' for row in chunk)
+
+
+def _csv_chunks(rows, fields, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    yield buffer.getvalue()
+    for chunk in _chunks(rows, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+
+
+def export_tasks(queryset, file_format, chunk_size=TASK_EXPORT_CHUNK_SIZE):
+    """
+    Lazily render the tasks of `queryset` in `file_format` (ndjson or csv).
+    Yields one string per chunk of rows, for a `StreamingHttpResponse`.
+    """
+    serializer = TaskValuesSerializer(TaskViewInDetailSerializer)
+    rows = _task_rows(serializer, queryset, chunk_size)
+    if file_format == 'csv':
+        return _csv_chunks(rows, serializer.fields, chunk_size)
+    return _ndjson_chunks(rows, chunk_size)
@@ -10,8 +10,82 @@ TASK_STATUS_MAP = {
     '': Task.TaskStatus.CREATED,
 }
 
+TASK_PRIORITY_MAP = {
+    'hi': Task.Priority.HIGH,
+    'high': Task.Priority.HIGH,
+    'nm': Task.Priority.NORMAL,
+    'normal': Task.Priority.NORMAL,
+    'lo': Task.Priority.LOW,
+    'low': Task.Priority.LOW,
+    '': Task.Priority.NORMAL,
+}
+
 DEFAULT_TASK_RUNTIME = config('DEFAULT_TASK_RUNTIME', default=1, cast=int)
 
+# Keyset pagination for task listings (opt-in via `cursor`/`page_size`)
+TASK_PAGE_SIZE = config('TASK_PAGE_SIZE', default=100, cast=int)
+TASK_MAX_PAGE_SIZE = config('TASK_MAX_PAGE_SIZE', default=1000, cast=int)
+
+# Maximum number of tasks accepted by a single bulk request
+TASK_BULK_MAX_SIZE = config('TASK_BULK_MAX_SIZE', default=5000, cast=int)
+
+# Rows fetched per server-side cursor round trip by the streaming task export
+TASK_EXPORT_CHUNK_SIZE = config('TASK_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Change feed: page size, how old a write must be to be served (so writes still
+# committing aren't skipped) and how long delete tombstones are kept
+TASK_CHANGES_PAGE_SIZE = config('TASK_CHANGES_PAGE_SIZE', default=500, cast=int)
+TASK_CHANGES_SETTLE_SECONDS = config('TASK_CHANGES_SETTLE_SECONDS', default=2, cast=float)
+TASK_TOMBSTONE_RETENTION_DAYS = config('TASK_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+
+# Outbox relay: dispatches published to the broker per batch, and whether to
+# also drain right after each commit (for setups without a relay process)
+TASK_OUTBOX_BATCH_SIZE = config('TASK_OUTBOX_BATCH_SIZE', default=500, cast=int)
+TASK_OUTBOX_DRAIN_ON_COMMIT = config('TASK_OUTBOX_DRAIN_ON_COMMIT', default=False, cast=bool)
+
+# Celery queues of task runs: high priority, normal, and low priority or long
+# (timer of at least TASK_LONG_TIMER_SECONDS) runs, each served by its own workers
+TASK_QUEUE_HIGH = config('TASK_QUEUE_HIGH', default='high')
+TASK_QUEUE_DEFAULT = config('TASK_QUEUE_DEFAULT', default='celery')
+TASK_QUEUE_BULK = config('TASK_QUEUE_BULK', default='bulk')
+TASK_LONG_TIMER_SECONDS = config('TASK_LONG_TIMER_SECONDS', default=60, cast=int)
+
+# Celery workers buffer task completions and write them as one UPDATE per
+# TASK_COMPLETION_BATCH_SIZE completions or TASK_COMPLETION_FLUSH_MS, whichever
+# comes first; a batch size of 1 writes each completion on its own
+TASK_COMPLETION_BATCH_SIZE = config('TASK_COMPLETION_BATCH_SIZE', default=500, cast=int)
+TASK_COMPLETION_FLUSH_MS = config('TASK_COMPLETION_FLUSH_MS', default=100, cast=int)
+
+# A task still running TASK_COMPLETION_GRACE_SECONDS after its timer expired
+# lost its completion (a worker killed with it buffered) and is completed by the
+# outbox relay, checked every TASK_COMPLETION_SWEEP_SECONDS
+TASK_COMPLETION_GRACE_SECONDS = config('TASK_COMPLETION_GRACE_SECONDS', default=60, cast=int)
+TASK_COMPLETION_SWEEP_SECONDS = config('TASK_COMPLETION_SWEEP_SECONDS', default=10, cast=float)
+
+# Per-user cache of task list/detail responses, needs a shared cache (CACHE_REDIS_URL)
+TASK_CACHE_ENABLED = config('TASK_CACHE_ENABLED', default=False, cast=bool)
+TASK_CACHE_TIMEOUT = config('TASK_CACHE_TIMEOUT', default=300, cast=int)
+
+# Task status events over Redis pub/sub (e.g. redis://localhost:6379/2), disabled
+# when unset, and the interval of keep-alive comments on idle event streams
+TASK_EVENTS_REDIS_URL = config('TASK_EVENTS_REDIS_URL', default='')
+TASK_EVENTS_KEEPALIVE_SECONDS = config('TASK_EVENTS_KEEPALIVE_SECONDS', default=15, cast=float)
+
+# Share of requests (0 to 1) timed by RequestMetricsMiddleware for the
+# Server-Timing header and /metrics; 0 turns the instrumentation off
+REQUEST_METRICS_SAMPLE_RATE = config('REQUEST_METRICS_SAMPLE_RATE', default=0.0, cast=float)
+
+# Celery task telemetry on /metrics: queue wait, run time, runs by state and
+# queue depth. Workers add their observations to the shared cache
+# (CACHE_REDIS_URL) every TASK_METRICS_FLUSH_SECONDS
+TASK_METRICS_ENABLED = config('TASK_METRICS_ENABLED', default=False, cast=bool)
+TASK_METRICS_FLUSH_SECONDS = config('TASK_METRICS_FLUSH_SECONDS', default=1.0, cast=float)
+
+# JWT authentication: in-process token -> user LRU, backed by the shared cache
+JWT_USER_CACHE_SIZE = config('JWT_USER_CACHE_SIZE', default=10000, cast=int)
+JWT_USER_CACHE_TTL = config('JWT_USER_CACHE_TTL', default=30, cast=int)
+JWT_USER_SHARED_CACHE_TTL = config('JWT_USER_SHARED_CACHE_TTL', default=300, cast=int)
+
 def validate_updation_status(status: str) -> bool:
     if status.strip().lower() not in ['ru', 'fa', 'co']:
         return False
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apiapp.helpers import TASK_TOMBSTONE_RETENTION_DAYS
+from apiapp.models import TaskTombstone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete task tombstones older than TASK_TOMBSTONE_RETENTION_DAYS. Change feed "
+        "cursors last synced before that are answered with 410 and resynced from scratch."
+    )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=TASK_TOMBSTONE_RETENTION_DAYS)
+        deleted, _ = TaskTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(f"Deleted {deleted} tombstones older than {cutoff.isoformat()}")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apiapp.models import Task, TaskStats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the per-user task statistics served by /api/tasks/stats/ from the "
+        "tasks, for all users or the given --user IDs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="user_ids", help="User ID, repeatable.")
+
+    def handle(self, *args, user_ids=None, **options):
+        if not user_ids:
+            user_ids = set(Task.objects.filter(user__isnull=False).values_list("user_id", flat=True).distinct())
+            user_ids.update(TaskStats.objects.values_list("user_id", flat=True).distinct())
+        for user_id in sorted(user_ids):
+            TaskStats.rebuild(user_id)
+        self.stdout.write(f"Rebuilt task stats of {len(user_ids)} users")
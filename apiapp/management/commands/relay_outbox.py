@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from apiapp.completions import complete_overdue_tasks
+from apiapp.outbox import drain_outbox
+from apiapp.helpers import TASK_COMPLETION_SWEEP_SECONDS, TASK_OUTBOX_BATCH_SIZE
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        "Relay pending task dispatches from the outbox table to the Celery broker, "
+        "and complete running tasks whose completion was lost."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=TASK_OUTBOX_BATCH_SIZE)
+        parser.add_argument(
+            '--interval', type=float, default=0.5, help="Seconds to wait when the outbox is empty."
+        )
+        parser.add_argument(
+            '--sweep-interval', type=float, default=TASK_COMPLETION_SWEEP_SECONDS,
+            help="Seconds between checks for overdue running tasks, 0 to disable."
+        )
+        parser.add_argument('--once', action='store_true', help="Drain the outbox once and exit.")
+
+    def handle(self, *args, **options):
+        next_sweep = time.monotonic()
+        while True:
+            try:
+                published = drain_outbox(options['batch_size'])
+            except Exception as e:
+                # Broker or database blip: keep the rows and retry after the interval.
+                self.stderr.write(f"Outbox relay failed: {e}")
+                published = 0
+                if options['once']:
+                    raise
+            else:
+                # Only while runs are being published, not through an outage
+                if options['sweep_interval'] and time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + options['sweep_interval']
+                    self.sweep(options['once'])
+            if options['once'] and published < options['batch_size']:
+                break
+            if not published:
+                time.sleep(options['interval'])
+
+    def sweep(self, once):
+        try:
+            complete_overdue_tasks()
+        except Exception as e:
+            self.stderr.write(f"Completing overdue tasks failed: {e}")
+            if once:
+                raise
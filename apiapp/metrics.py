@@ -0,0 +1,283 @@
+"""
+In-process metrics in the Prometheus text format, served by `/metrics`.
+
+A small registry of counters, gauges and histograms, safe to update from
+several threads. Every process keeps its own values (like `prometheus_client`
+without its multiprocess mode), so each web process is scraped on its own.
+
+Request timings: `RequestMetricsMiddleware` starts a `RequestTimings` for a
+sampled request (REQUEST_METRICS_SAMPLE_RATE) in a context variable; the
+query wrapper installed on every database connection, the JWT authentication
+and the dispatch code add to it with `add_timing`. It is reported in the
+response's `Server-Timing` header and in the request histograms below. When
+a request isn't sampled the context variable is unset and `add_timing` and
+the query wrapper only read it.
+
+Celery workers can't be scraped, their task metrics (`apiapp.task_metrics`)
+are read from the shared cache by a collector on every render.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import math
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels) -> tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labels(self, key) -> list:
+        return list(zip(self.labelnames, key))
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value) -> list:
+        return [f'{self.name}{_format_labels(self._labels(key))} {_format_value(value)}']
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def merge(self, bucket_counts, total, count, **labels):
+        """
+        Add observations aggregated elsewhere: per-bucket (not cumulative) counts
+        in the order of `buckets`, +Inf last, their sum and their count.
+        """
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            series[0] = [a + b for a, b in zip(series[0], bucket_counts)]
+            series[1] += total
+            series[2] += count
+
+    def _render_value(self, key, value) -> list:
+        counts, total, count = value
+        labels = self._labels(key)
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(
+                f'{self.name}_bucket{_format_labels(labels + [("le", _format_value(float(bound)))])} {cumulative}'
+            )
+        lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+        lines.append(f'{self.name}_count{_format_labels(labels)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def register_collector(self, collect):
+        """
+        Add `collect()`, called on every render for metrics built at scrape time
+        (read from the cache or the broker...). A failing collector is logged
+        and skipped, the other metrics are still rendered.
+        """
+        with self._lock:
+            if collect not in self._collectors:
+                self._collectors.append(collect)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for collect in collectors:
+            try:
+                metrics.extend(collect())
+            except Exception as e:
+                logger.error(f"[metrics] Collector {collect.__name__} failed: {e}")
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Time to produce the response.', ('view', 'method', 'status')
+))
+REQUEST_DB_DURATION = REGISTRY.register(Histogram(
+    'http_request_db_duration_seconds', 'Time spent in database queries per request.', ('view', 'method')
+))
+REQUEST_DB_QUERIES = REGISTRY.register(Histogram(
+    'http_request_db_queries', 'Database queries per request.', ('view', 'method'), buckets=COUNT_BUCKETS
+))
+REQUEST_AUTH_DURATION = REGISTRY.register(Histogram(
+    'http_request_auth_duration_seconds', 'Time spent authenticating the request.', ('view', 'method')
+))
+REQUEST_DISPATCH_DURATION = REGISTRY.register(Histogram(
+    'http_request_dispatch_duration_seconds', 'Time spent publishing task runs to the broker per request.',
+    ('view', 'method')
+))
+
+
+class RequestTimings:
+    """
+    Durations (seconds) accumulated while handling one request.
+    """
+    __slots__ = ('db', 'queries', 'auth', 'dispatch')
+
+    def __init__(self):
+        self.db = 0.0
+        self.queries = 0
+        self.auth = None
+        self.dispatch = None
+
+    def server_timing(self, total) -> str:
+        metrics = [f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries"']
+        if self.auth is not None:
+            metrics.append(f'auth;dur={self.auth * 1000:.2f}')
+        if self.dispatch is not None:
+            metrics.append(f'dispatch;dur={self.dispatch * 1000:.2f}')
+        metrics.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+current_timings: ContextVar = ContextVar('current_timings', default=None)
+
+
+def add_timing(name, seconds):
+    """
+    Add `seconds` to the `name` (auth, dispatch) timing of the sampled request, if any.
+    """
+    timings = current_timings.get()
+    if timings is not None:
+        setattr(timings, name, (getattr(timings, name) or 0.0) + seconds)
+
+
+@contextmanager
+def timed(name):
+    """
+    Time the block into `add_timing(name, ...)`.
+    """
+    if current_timings.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(name, time.perf_counter() - start)
+
+
+def query_timer(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting and timing queries of sampled requests.
+    """
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += time.perf_counter() - start
+        timings.queries += 1
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """
+    `connection_created` receiver adding `query_timer` to every new connection.
+    """
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+def observe_request(view, method, status, timings, total):
+    REQUEST_DURATION.observe(total, view=view, method=method, status=status)
+    REQUEST_DB_DURATION.observe(timings.db, view=view, method=method)
+    REQUEST_DB_QUERIES.observe(timings.queries, view=view, method=method)
+    if timings.auth is not None:
+        REQUEST_AUTH_DURATION.observe(timings.auth, view=view, method=method)
+    if timings.dispatch is not None:
+        REQUEST_DISPATCH_DURATION.observe(timings.dispatch, view=view, method=method)
@@ -0,0 +1,67 @@
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from apiapp.helpers import REQUEST_METRICS_SAMPLE_RATE
+from apiapp.metrics import RequestTimings, current_timings, observe_request
+
+
+def _sampled() -> bool:
+    return REQUEST_METRICS_SAMPLE_RATE >= 1 or (
+        REQUEST_METRICS_SAMPLE_RATE > 0 and random.random() < REQUEST_METRICS_SAMPLE_RATE
+    )
+
+
+class RequestMetricsMiddleware:
+    """
+    Time a sample of the requests (REQUEST_METRICS_SAMPLE_RATE): query count,
+    database, authentication, broker dispatch and total time. They are sent in
+    the `Server-Timing` header and recorded in the histograms served by
+    `/metrics`, labelled with the URL name of the view.
+
+    Total time ends when the view returns, a streaming response's body is not
+    included. Requests that aren't sampled go straight through.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not _sampled():
+            return self.get_response(request)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.record(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not _sampled():
+            return await self.get_response(request)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.record(request, response, timings, time.perf_counter() - start)
+
+    def record(self, request, response, timings, total):
+        # URL names, not paths, keep the label values bounded
+        match = request.resolver_match
+        view = (match.view_name if match else None) or "unmatched"
+        observe_request(view, request.method, response.status_code, timings, total)
+        response["Server-Timing"] = timings.server_timing(total)
+        return response
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 16:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0003_task_unique_task_name_per_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'created_at', 'task_id'], name='task_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'status', 'created_at', 'task_id'], name='task_user_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 'ru')), fields=['created_at'], name='task_running_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0004_task_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.UUIDField()),
+                ('timer', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
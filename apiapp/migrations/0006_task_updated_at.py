@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 17:20
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def backfill_updated_at(apps, schema_editor):
+    Task = apps.get_model('apiapp', 'Task')
+    Task.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0005_taskoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'updated_at'], name='task_user_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 17:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_tasks(apps, schema_editor):
+    Task = apps.get_model('apiapp', 'Task')
+    TaskStats = apps.get_model('apiapp', 'TaskStats')
+    counts = (
+        Task.objects.filter(user__isnull=False)
+        .values_list('user_id', 'status')
+        .annotate(count=models.Count('pk'))
+        .order_by()
+    )
+    TaskStats.objects.bulk_create(
+        TaskStats(user_id=user_id, status=status, count=count) for user_id, status, count in counts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0007_tasktombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('cr', 'Created'), ('ru', 'Running'), ('co', 'Completed'), ('fa', 'Failed')], max_length=2)),
+                ('count', models.BigIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'status'), name='unique_task_stats_per_user_status')],
+            },
+        ),
+        migrations.RunPython(count_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0008_taskstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='priority',
+            field=models.CharField(choices=[('hi', 'High'), ('nm', 'Normal'), ('lo', 'Low')], default='nm', max_length=2),
+        ),
+        migrations.AddField(
+            model_name='taskoutbox',
+            name='queue',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
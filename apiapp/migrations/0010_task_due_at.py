@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 18:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0009_task_priority'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_running_idx',
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='due_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 'ru')), fields=['due_at'], name='task_running_idx'),
+        ),
+    ]
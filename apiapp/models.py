@@ -1,8 +1,96 @@
-from django.db import models
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import User
 import uuid
 
+
+class TaskQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        `auto_now` is only applied by `save()`, so stamp `updated_at` on set-based
+        updates too; conditional GETs rely on it changing with every write.
+        """
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # Writes here join the caller's transaction without a savepoint (like
+        # Django's own save()); a failure rolls back the whole transaction.
+        with transaction.atomic(savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            TaskStats.apply(Counter((task.user_id, task.status) for task in objs))
+        return objs
+
+    def delete(self):
+        """
+        Delete the tasks and leave a `TaskTombstone` for each, so the change
+        feed can report deletes. Only the rows read (and locked) for the
+        tombstones and stats are deleted, a task inserted concurrently is never
+        deleted without them.
+        """
+        with transaction.atomic(savepoint=False):
+            deleted = list(self.select_for_update().values_list('task_id', 'user_id', 'status'))
+            if not deleted:
+                return 0, {}
+            count = 0
+            for task_ids in _chunked([task_id for task_id, _, _ in deleted]):
+                count += models.QuerySet.delete(Task.objects.filter(task_id__in=task_ids))[0]
+            TaskTombstone.objects.bulk_create(
+                TaskTombstone(task_id=task_id, user_id=user_id) for task_id, user_id, _ in deleted
+            )
+            TaskStats.apply({key: -count for key, count in Counter((user_id, status) for _, user_id, status in deleted).items()})
+        return count, {Task._meta.label: count}
+
+    def transition(self, status) -> int:
+        """
+        Move every task in the queryset that can legally reach `status`.
+
+        The tasks in a legal source status are locked and read first, so the
+        per-status counts of `TaskStats` can be moved along. A concurrent write
+        that already moved a task away from a legal source status wins and the
+        task is left untouched.
+        Returns the number of tasks that transitioned.
+        """
+        return self._transition(status)[0]
+
+    def transition_returning(self, status) -> list:
+        """
+        `transition`, returning the (task_id, user_id) of the moved tasks.
+        """
+        return [(task_id, user_id) for task_id, user_id, _ in self._transition(status)[1]]
+
+    def _transition(self, status):
+        with transaction.atomic(savepoint=False):
+            moved = list(
+                self.filter(status__in=Task.transition_sources(status))
+                .select_for_update()
+                .values_list('task_id', 'user_id', 'status')
+            )
+            updated = 0
+            for task_ids in _chunked([task_id for task_id, _, _ in moved]):
+                # Still conditional, for databases without row locks (SQLite)
+                updated += (
+                    Task.objects.filter(task_id__in=task_ids, status__in=Task.transition_sources(status))
+                    .update(status=status)
+                )
+            deltas = Counter()
+            for _, user_id, source in moved:
+                deltas[(user_id, source)] -= 1
+                deltas[(user_id, status)] += 1
+            TaskStats.apply(deltas)
+        return updated, moved
+
+
+def _chunked(values, size=1000):
+    # Bounds the `IN (...)` lists of set-based writes
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
 class Task(models.Model):
     class TaskStatus(models.TextChoices):
         CREATED = 'cr', _('Created')
@@ -10,16 +98,245 @@ class Task(models.Model):
         COMPLETED = 'co', _('Completed')
         FAILED = 'fa', _('Failed')
 
+    class Priority(models.TextChoices):
+        HIGH = 'hi', _('High')
+        NORMAL = 'nm', _('Normal')
+        LOW = 'lo', _('Low')
+
+    # Legal status edges, source status -> allowed target statuses
+    TRANSITIONS = {
+        TaskStatus.CREATED: (TaskStatus.RUNNING, TaskStatus.FAILED),
+        TaskStatus.RUNNING: (TaskStatus.COMPLETED, TaskStatus.FAILED),
+        TaskStatus.COMPLETED: (TaskStatus.RUNNING,),
+        TaskStatus.FAILED: (TaskStatus.RUNNING,),
+    }
+
     task_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=200)
     status = models.CharField(max_length=2, choices=TaskStatus.choices, default=TaskStatus.CREATED)
+    # Picks the Celery queue the task runs on, see `apiapp.outbox.task_queue`
+    priority = models.CharField(max_length=2, choices=Priority.choices, default=Priority.NORMAL)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # When the timer of the current run expires, set as `apiapp.outbox.drain_outbox` publishes it
+    due_at = models.DateTimeField(null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
 
+    objects = TaskQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['name', 'user'], name='unique_task_name_per_user')
         ]
+        indexes = [
+            # Task listing: filter on user, ordered by (created_at, task_id) keyset
+            models.Index(fields=['user', 'created_at', 'task_id'], name='task_user_created_idx'),
+            # Task listing with status filter
+            models.Index(fields=['user', 'status', 'created_at', 'task_id'], name='task_user_status_created_idx'),
+            # ETag/Last-Modified validators of a user's tasks: max(updated_at) and count,
+            # and the change feed keyset on (updated_at, task_id)
+            models.Index(fields=['user', 'updated_at', 'task_id'], name='task_user_updated_idx'),
+            # Running tasks scanned for lost completions, see `complete_overdue_tasks`
+            models.Index(
+                fields=['due_at'],
+                condition=models.Q(status='ru'),
+                name='task_running_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Count new tasks in `TaskStats`, and move the count of an existing task
+        saved with another status or user (the admin, a shell).
+
+        The API changes statuses through `transition`, which keeps the counts
+        itself and only allows legal edges; `save` writes any status, so the
+        admin can still fix a task up.
+        """
+        with transaction.atomic(savepoint=False):
+            if self._state.adding:
+                super().save(*args, **kwargs)
+                TaskStats.apply({(self.user_id, self.status): 1})
+                return
+            previous = Task.objects.filter(pk=self.pk).select_for_update().values_list('user_id', 'status').first()
+            super().save(*args, **kwargs)
+            if previous is None:
+                return
+            update_fields = kwargs.get('update_fields')
+            saved = (
+                self.user_id if update_fields is None or 'user' in update_fields else previous[0],
+                self.status if update_fields is None or 'status' in update_fields else previous[1],
+            )
+            deltas = Counter()
+            deltas[previous] -= 1
+            deltas[saved] += 1
+            TaskStats.apply(deltas)
+
+    def delete(self, using=None, keep_parents=False):
+        """
+        Delete through `TaskQuerySet.delete`, so a task deleted from the admin
+        or a shell also leaves a tombstone and is uncounted from `TaskStats`.
+
+        Tasks deleted by the cascade of their user's deletion skip both; the
+        user's tombstones and counters are deleted by the same cascade.
+        """
+        return type(self).objects.filter(pk=self.pk).delete()
+
+    @classmethod
+    def transition_sources(cls, status) -> list:
+        """
+        Statuses a task can legally move to `status` from.
+        """
+        return [source for source, targets in cls.TRANSITIONS.items() if status in targets]
+
+    def transition(self, status) -> bool:
+        """
+        Compare-and-set this task's status.
+        Returns True if the transition won, False if it is not a legal edge from
+        the task's current status in the database.
+        """
+        won = Task.objects.filter(pk=self.pk).transition(status) == 1
+        if won:
+            self.status = status
+        return won
 
     def __str__(self):
         return f'{self.task_id}-{self.name}-{self.status}-{self.user.username if self.user else "No User"}'
+
+
+class TaskOutbox(models.Model):
+    """
+    Pending `run_task` dispatches.
+    Rows are written in the same transaction as the task write and relayed to
+    the Celery broker by `apiapp.outbox.drain_outbox`, so a request never waits
+    on the broker and a dispatch is never published for an uncommitted task.
+    """
+    task_id = models.UUIDField()
+    timer = models.PositiveIntegerField()
+    # Celery queue to publish on, empty for the default queue
+    queue = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.id}-{self.task_id}-{self.timer}'
+
+
+class TaskTombstone(models.Model):
+    """
+    Marker of a deleted task, read by the change feed (`apiapp.changes`).
+    Written by `TaskQuerySet.delete` and pruned after
+    TASK_TOMBSTONE_RETENTION_DAYS by the `prune_task_tombstones` command.
+    """
+    task_id = models.UUIDField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at', 'task_id'], name='tombstone_user_deleted_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task_id}-{self.deleted_at}'
+
+
+class TaskStats(models.Model):
+    """
+    Number of tasks per user and status.
+
+    Kept up to date in the transaction of every task write (`Task.save`,
+    `TaskQuerySet.bulk_create`, `transition` and `delete`), so
+    `GET /api/tasks/stats/` reads at most four rows. `rebuild_task_stats`
+    recounts them from the tasks if they ever drift.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='task_stats')
+    status = models.CharField(max_length=2, choices=Task.TaskStatus.choices)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'status'], name='unique_task_stats_per_user_status')
+        ]
+
+    @classmethod
+    def ensure_rows(cls, user_ids):
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, status=status) for user_id in user_ids for status in Task.TaskStatus.values],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def apply(cls, deltas):
+        """
+        Add `deltas`, a mapping of (user_id, status) -> change in count, with one
+        UPDATE per user. Tasks without a user aren't counted.
+        """
+        per_user = {}
+        for (user_id, status), delta in deltas.items():
+            if user_id is not None and delta:
+                per_user.setdefault(user_id, {})[status] = delta
+        for user_id, status_deltas in per_user.items():
+            queryset = cls.objects.filter(user_id=user_id, status__in=status_deltas)
+            change = Case(
+                *(When(status=status, then=Value(delta)) for status, delta in status_deltas.items()),
+                output_field=models.BigIntegerField(),
+            )
+            if queryset.update(count=F('count') + change) < len(status_deltas):
+                # First write of this user: create the zero rows, then count.
+                cls.ensure_rows([user_id])
+                queryset.update(count=F('count') + change)
+
+    @classmethod
+    def for_user(cls, user_id) -> dict:
+        """
+        {"total": n, "by_status": {label: n}} of the tasks of `user_id`.
+        """
+        counts = dict(cls.objects.filter(user_id=user_id).values_list('status', 'count'))
+        by_status = {str(label): counts.get(status, 0) for status, label in Task.TaskStatus.choices}
+        return {'total': sum(by_status.values()), 'by_status': by_status}
+
+    @classmethod
+    def rebuild(cls, user_id) -> dict:
+        """
+        Recount the tasks of `user_id` and overwrite its counters.
+        Returns the new counts by status.
+        """
+        with transaction.atomic():
+            cls.ensure_rows([user_id])
+            # Locking the counters holds back concurrent task writes of the
+            # user until the recount is stored.
+            rows = list(cls.objects.select_for_update().filter(user_id=user_id))
+            counts = dict(
+                Task.objects.filter(user_id=user_id)
+                .values_list('status')
+                .annotate(count=models.Count('pk'))
+                .order_by()
+            )
+            for row in rows:
+                row.count = counts.get(row.status, 0)
+            cls.objects.bulk_update(rows, ['count'])
+        return counts
+
+    def __str__(self):
+        return f'{self.user_id}-{self.status}-{self.count}'
+
+
+class CachedUser(User):
+    """
+    A user resolved by `CachedJWTAuthentication` from its cache, with only id,
+    username and is_active loaded; the other fields are deferred and read from
+    the database on access.
+
+    Read only: the cached fields may be stale, so saving or deleting it is
+    refused. Load the user with `User.objects.get` to change it.
+    """
+
+    class Meta:
+        proxy = True
+
+    def save(self, *args, **kwargs):
+        raise NotImplementedError("A cached user is read only, load it with User.objects.get to save it.")
+
+    def delete(self, *args, **kwargs):
+        raise NotImplementedError("A cached user is read only, load it with User.objects.get to delete it.")
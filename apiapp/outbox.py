@@ -0,0 +1,91 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.utils import timezone
+from apiapp.models import Task, TaskOutbox
+from apiapp.metrics import timed
+from apiapp.tasks import run_task
+from apiapp.helpers import (
+    TASK_LONG_TIMER_SECONDS,
+    TASK_OUTBOX_BATCH_SIZE,
+    TASK_OUTBOX_DRAIN_ON_COMMIT,
+    TASK_QUEUE_BULK,
+    TASK_QUEUE_DEFAULT,
+    TASK_QUEUE_HIGH,
+)
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+def task_queue(priority, timer) -> str:
+    """
+    Celery queue of a task run. Low priority and long runs share the bulk queue,
+    so a burst of them can't hold up the high priority and normal queues.
+    """
+    if priority == Task.Priority.LOW or int(timer) >= TASK_LONG_TIMER_SECONDS:
+        return TASK_QUEUE_BULK
+    if priority == Task.Priority.HIGH:
+        return TASK_QUEUE_HIGH
+    return TASK_QUEUE_DEFAULT
+
+
+def enqueue_task_runs(task_runs):
+    """
+    Record `run_task` dispatches in the outbox.
+    Must be called inside the transaction that moved the tasks to running.
+
+    args:
+        task_runs: List of (task_id, timer, priority) tuples.
+    """
+    if not task_runs:
+        return
+    TaskOutbox.objects.bulk_create(
+        TaskOutbox(task_id=task_id, timer=int(timer), queue=task_queue(priority, timer))
+        for task_id, timer, priority in task_runs
+    )
+    if TASK_OUTBOX_DRAIN_ON_COMMIT:
+        transaction.on_commit(_drain_after_commit)
+
+
+def _drain_after_commit():
+    try:
+        with timed('dispatch'):
+            drain_outbox()
+    except Exception as e:
+        # Rows stay in the outbox and are picked up by the next drain.
+        logger.error(f"[outbox] Drain after commit failed: {e}")
+
+
+def drain_outbox(batch_size=TASK_OUTBOX_BATCH_SIZE) -> int:
+    """
+    Publish one batch of outbox rows to the broker and delete them.
+
+    Rows are locked with SKIP LOCKED so several relays can run side by side. If
+    publishing fails the transaction rolls back and the whole batch is retried,
+    so a dispatch may be published twice but never lost; `run_task` only
+    completes a running task once, which makes that harmless.
+
+    The tasks published are stamped with when their timer expires (`due_at`,
+    one UPDATE per distinct timer), for `complete_overdue_tasks`. It isn't a
+    change of the task, `updated_at` is left alone.
+
+    returns:
+        Number of dispatches published.
+    """
+    with transaction.atomic():
+        rows = list(TaskOutbox.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size])
+        if not rows:
+            return 0
+        by_timer = defaultdict(list)
+        for row in rows:
+            run_task.apply_async((row.task_id, row.timer), queue=row.queue or TASK_QUEUE_DEFAULT)
+            by_timer[row.timer].append(row.task_id)
+        now = timezone.now()
+        for timer, task_ids in by_timer.items():
+            models.QuerySet.update(Task.objects.filter(task_id__in=task_ids), due_at=now + timedelta(seconds=timer))
+        TaskOutbox.objects.filter(id__in=[row.id for row in rows]).delete()
+    logger.info(f"[outbox] Published {len(rows)} task runs")
+    return len(rows)
@@ -0,0 +1,132 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from apiapp.helpers import TASK_PAGE_SIZE, TASK_MAX_PAGE_SIZE
+from apiapp.validators import validate_uuid
+
+
+def encode_position(timestamp, task_id, synced_at=None) -> str:
+    """
+    Opaque cursor for a (timestamp, task_id) keyset position. Change feed
+    cursors also carry `synced_at`, see `decode_synced_position`.
+    """
+    position = {'c': timestamp.isoformat(), 't': str(task_id)}
+    if synced_at is not None:
+        position['s'] = synced_at.isoformat()
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_position(cursor: str):
+    """
+    Decode an opaque cursor into a (timestamp, task_id) position.
+    """
+    return decode_synced_position(cursor)[:2]
+
+
+def decode_synced_position(cursor: str):
+    """
+    Decode an opaque cursor into a (timestamp, task_id, synced_at) position;
+    `synced_at` is the timestamp for a cursor without one.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        timestamp = parse_datetime(position['c'])
+        task_id = position['t']
+        synced_at = parse_datetime(position['s']) if 's' in position else timestamp
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValidationError({'error': 'Invalid cursor'})
+    if timestamp is None or synced_at is None or not isinstance(task_id, str) or not validate_uuid(task_id):
+        raise ValidationError({'error': 'Invalid cursor'})
+    return timestamp, task_id, synced_at
+
+
+class TaskKeysetPagination(BasePagination):
+    """
+    Opt-in keyset (cursor) pagination ordered by (created_at, task_id).
+
+    Pagination is only applied when the request carries a `cursor` or
+    `page_size` query param, so plain `GET /api/tasks/` keeps returning a list.
+    Each page is fetched with a `WHERE (created_at, task_id) > cursor` seek
+    instead of an OFFSET, so page N costs the same as page 1.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('created_at', 'task_id')
+
+    # `request.GET` rather than `query_params` so the async views can reuse the
+    # paginator with a plain Django request.
+    def is_requested(self, request) -> bool:
+        params = request.GET
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return TASK_PAGE_SIZE
+        if page_size <= 0:
+            return TASK_PAGE_SIZE
+        return min(page_size, TASK_MAX_PAGE_SIZE)
+
+    def encode_cursor(self, task) -> str:
+        return encode_position(task.created_at, task.task_id)
+
+    def decode_cursor(self, cursor: str):
+        """
+        Decode an opaque cursor into a (created_at, task_id) position.
+        """
+        return decode_position(cursor)
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Lazy queryset for the requested page, one row longer than the page size
+        to know whether there is a next page. Evaluate it and pass the rows to
+        `set_page`.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.GET.get(self.cursor_query_param)
+        if cursor:
+            created_at, task_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, task_id__gt=task_id)
+            )
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        page = rows[:self.page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_data(self, data) -> dict:
+        return {
+            'next': self.get_next_link(),
+            'cursor': self.next_cursor,
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
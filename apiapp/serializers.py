@@ -1,12 +1,15 @@
 from apiapp.models import Task
 from rest_framework import serializers
-from apiapp.helpers import TASK_STATUS_MAP
+from apiapp.helpers import TASK_PRIORITY_MAP, TASK_STATUS_MAP
 
 
 class BaseTaskSerializer(serializers.ModelSerializer):
+    # Free text, mapped to a Task.Priority by validate_priority
+    priority = serializers.CharField(required=False, allow_blank=True)
+
     class Meta:
         model = Task
-        fields = ['task_id', 'name', 'status', 'created_at']
+        fields = ['task_id', 'name', 'status', 'priority', 'created_at']
         read_only_fields = ['task_id', 'created_at']
         extra_kwargs = {'name': {'required': True},}
         abstract = True
@@ -24,6 +27,15 @@ class BaseTaskSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("Task with this name already exists.")
         return value
 
+    def validate_priority(self, value: str):
+        """
+        Validate the priority field, accepting codes (hi, nm, lo) and names (high, normal, low).
+        """
+        value = value.strip().lower()
+        if value not in TASK_PRIORITY_MAP:
+            raise serializers.ValidationError("Priority field can only be 'hi', 'nm' or 'lo'.")
+        return TASK_PRIORITY_MAP[value]
+
 
 class TaskViewSerializer(BaseTaskSerializer):
     status = serializers.ChoiceField(choices=Task.TaskStatus.choices, source='get_status_display', read_only=True)
@@ -33,9 +45,10 @@ class TaskViewSerializer(BaseTaskSerializer):
 
 class TaskViewInDetailSerializer(BaseTaskSerializer):
     """
-    Serializer for viewing task details with display of status labels.
+    Serializer for viewing task details with display of status and priority labels.
     """
     status = serializers.ChoiceField(choices=Task.TaskStatus.choices, source='get_status_display', read_only=True)
+    priority = serializers.ChoiceField(choices=Task.Priority.choices, source='get_priority_display', read_only=True)
 
 
 class TaskSerializer(BaseTaskSerializer):
@@ -60,3 +73,46 @@ class TaskUpdateSerializer(BaseTaskSerializer):
         if value not in ['ru', 'cr']:
             raise serializers.ValidationError("Status field can only be 'run' or 'create'/.")
         return TASK_STATUS_MAP.get(value, Task.TaskStatus.CREATED)
+
+
+class TaskValuesSerializer:
+    """
+    Read-only fast path of a task serializer for listings.
+
+    Rows are fetched with `values_list` of the serializer's columns instead of
+    as model instances, and fields shown through `get_<field>_display` are mapped
+    with a code -> label table built once, in the active language, when this is
+    created; other fields go through their DRF field's `to_representation`. The
+    output is the same as `serializer_class(tasks, many=True).data`.
+    """
+
+    def __init__(self, serializer_class):
+        fields = serializer_class().fields
+        self.fields = list(fields)
+        self.columns = []
+        self._converters = []
+        for name, field in fields.items():
+            if field.source == f'get_{name}_display':
+                labels = {value: str(label) for value, label in Task._meta.get_field(name).flatchoices}
+                self.columns.append(name)
+                self._converters.append(lambda value, labels=labels: labels.get(value, value))
+            else:
+                self.columns.append(field.source)
+                self._converters.append(field.to_representation)
+
+    def values(self, queryset, *extra, named=False):
+        """
+        `values_list` of the serializer's columns, followed by the `extra` columns
+        not among them (`created_at` for a pagination cursor...).
+        """
+        extra = [column for column in extra if column not in self.columns]
+        return queryset.values_list(*self.columns, *extra, named=named)
+
+    def to_representation(self, row) -> dict:
+        return {
+            name: None if value is None else convert(value)
+            for name, convert, value in zip(self.fields, self._converters, row)
+        }
+
+    def many(self, rows) -> list:
+        return [self.to_representation(row) for row in rows]
@@ -0,0 +1,20 @@
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apiapp.authentication import invalidate_cached_user
+from apiapp.metrics import install_query_timer
+from apiapp.task_metrics import install_task_metrics
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user_auth_cache(sender, instance, **kwargs):
+    """
+    Drop cached JWT users on any user change (deactivation, password change...).
+    """
+    invalidate_cached_user(instance.pk)
+
+
+connection_created.connect(install_query_timer, dispatch_uid='apiapp.metrics.install_query_timer')
+install_task_metrics()
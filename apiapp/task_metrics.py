@@ -0,0 +1,262 @@
+"""
+Telemetry of Celery task runs, served by `/metrics` with the request metrics.
+
+Hooked into the Celery signals by `install_task_metrics` when
+TASK_METRICS_ENABLED:
+
+- publish stamps the message with a `published_at` header;
+- prerun observes the queue wait, from `published_at` (or the message's ETA,
+  a countdown timer isn't waiting for a worker) until a worker starts it;
+- postrun observes the run time and counts the runs by final state, FAILURE
+  included.
+
+Worker processes can't be scraped one by one, so they add their observations
+to counters in the shared cache (CACHE_REDIS_URL), buffered per process and
+written every TASK_METRICS_FLUSH_SECONDS. `/metrics` of any web process reads
+them back, along with the depth of every task queue read from the broker, at
+scrape time.
+
+The queue wait compares the clocks of the publishing and the worker hosts,
+keep them in sync.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+import logging
+import os
+import threading
+import time
+
+from celery import states
+from celery.signals import (
+    before_task_publish, task_postrun, task_prerun, worker_init, worker_process_shutdown, worker_shutdown,
+)
+from django.core.cache import cache
+
+from apiapp.helpers import (
+    TASK_METRICS_ENABLED, TASK_METRICS_FLUSH_SECONDS, TASK_QUEUE_BULK, TASK_QUEUE_DEFAULT, TASK_QUEUE_HIGH,
+)
+from apiapp.metrics import DURATION_BUCKETS, REGISTRY, Counter, Gauge, Histogram
+
+
+logger = logging.getLogger(__name__)
+
+QUEUES = (TASK_QUEUE_HIGH, TASK_QUEUE_DEFAULT, TASK_QUEUE_BULK)
+STATES = (states.SUCCESS, states.FAILURE, states.RETRY, states.REJECTED, states.IGNORED)
+WAIT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+# name: (documentation, buckets)
+HISTOGRAMS = {
+    'celery_task_queue_wait_seconds': ('Time from publish, or ETA, until a worker starts the task.', WAIT_BUCKETS),
+    'celery_task_run_seconds': ('Time the task ran in the worker.', DURATION_BUCKETS),
+}
+RUNS = 'celery_task_runs_total'
+
+
+def _key(name, task, queue, part) -> str:
+    return f"task-metrics:{name}:{task}:{queue}:{part}"
+
+
+def _histogram_deltas(name, value, task, queue) -> list:
+    # Non-cumulative bucket counts, the sum in microseconds to INCR it
+    bounds = HISTOGRAMS[name][1]
+    return [
+        (_key(name, task, queue, bisect_left(bounds, value)), 1),
+        (_key(name, task, queue, 'sum'), round(value * 1_000_000)),
+        (_key(name, task, queue, 'count'), 1),
+    ]
+
+
+class TaskMetricsBuffer:
+    """
+    Counter increments waiting to be written to the cache, every `flush_seconds`
+    by a background thread.
+
+    Only buffers once `start` is called (in a worker); the thread is started
+    lazily in each process, as prefork children inherit the buffer without it.
+    """
+
+    def __init__(self, flush_seconds=TASK_METRICS_FLUSH_SECONDS):
+        self.flush_interval = flush_seconds
+        self.enabled = False
+        self._deltas = defaultdict(int)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread_pid = None
+
+    def start(self):
+        self.enabled = True
+        self._stopped.clear()
+
+    def add(self, deltas):
+        with self._lock:
+            for key, delta in deltas:
+                self._deltas[key] += delta
+        if not self.enabled:
+            self.flush()
+            return
+        self._ensure_thread()
+
+    def flush(self):
+        """
+        Write the buffered increments. On a cache error they stay buffered for
+        the next flush.
+        """
+        with self._lock:
+            pending, self._deltas = list(self._deltas.items()), defaultdict(int)
+        try:
+            while pending:
+                key, delta = pending[-1]
+                cache.add(key, 0, timeout=None)
+                cache.incr(key, delta)
+                pending.pop()
+        except Exception as e:
+            logger.error(f"[task_metrics] Writing {len(pending)} task metrics failed: {e}")
+            with self._lock:
+                for key, delta in pending:
+                    self._deltas[key] += delta
+
+    def close(self):
+        self.enabled = False
+        self._stopped.set()
+        self.flush()
+
+    def _ensure_thread(self):
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                threading.Thread(target=self._run, name='task-metrics-flusher', daemon=True).start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+
+metrics_buffer = TaskMetricsBuffer()
+_started = {}
+
+
+def _queue(request) -> str:
+    return (request.delivery_info or {}).get('routing_key') or ''
+
+
+def stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers['published_at'] = time.time()
+
+
+def task_started(task_id=None, task=None, **kwargs):
+    request = task.request
+    if request.is_eager:
+        return
+    published_at = getattr(request, 'published_at', None)
+    if published_at is not None:
+        ready_at = published_at
+        if request.eta:
+            ready_at = max(ready_at, datetime.fromisoformat(request.eta).timestamp())
+        wait = max(time.time() - ready_at, 0.0)
+        metrics_buffer.add(_histogram_deltas('celery_task_queue_wait_seconds', wait, task.name, _queue(request)))
+    _started[task_id] = time.perf_counter()
+
+
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is None:
+        return
+    queue = _queue(task.request)
+    deltas = _histogram_deltas('celery_task_run_seconds', time.perf_counter() - started, task.name, queue)
+    deltas.append((_key(RUNS, task.name, queue, state), 1))
+    metrics_buffer.add(deltas)
+
+
+def start_metrics_buffer(**kwargs):
+    metrics_buffer.start()
+
+
+def flush_metrics_buffer(**kwargs):
+    metrics_buffer.close()
+
+
+def _task_names() -> list:
+    from taskmanager.celery import app
+
+    return sorted(name for name in app.tasks if not name.startswith('celery.'))
+
+
+def collect_task_metrics() -> list:
+    """
+    Task metrics of all workers, read from the cache with one `get_many`.
+    """
+    series = [(task, queue) for task in _task_names() for queue in QUEUES]
+    keys = [_key(RUNS, task, queue, state) for task, queue in series for state in STATES]
+    for name, (_, bounds) in HISTOGRAMS.items():
+        for task, queue in series:
+            keys.extend(_key(name, task, queue, part) for part in [*range(len(bounds) + 1), 'sum', 'count'])
+    values = cache.get_many(keys)
+
+    runs = Counter(RUNS, 'Task runs by final state.', ('task', 'queue', 'state'))
+    for task, queue in series:
+        for state in STATES:
+            count = values.get(_key(RUNS, task, queue, state))
+            if count:
+                runs.inc(count, task=task, queue=queue, state=state)
+    metrics = [runs]
+    for name, (documentation, bounds) in HISTOGRAMS.items():
+        histogram = Histogram(name, documentation, ('task', 'queue'), buckets=bounds)
+        for task, queue in series:
+            count = values.get(_key(name, task, queue, 'count'))
+            if count:
+                histogram.merge(
+                    [values.get(_key(name, task, queue, index), 0) for index in range(len(bounds) + 1)],
+                    values.get(_key(name, task, queue, 'sum'), 0) / 1_000_000,
+                    count,
+                    task=task,
+                    queue=queue,
+                )
+        metrics.append(histogram)
+    return metrics
+
+
+def queue_depths() -> dict:
+    """
+    Messages waiting for a worker in each task queue. Countdown runs a worker
+    already reserved (task timers) aren't waiting and aren't counted.
+    """
+    from taskmanager.celery import app
+
+    depths = {}
+    with app.connection_for_read() as connection:
+        for queue in QUEUES:
+            with connection.channel() as channel:
+                try:
+                    depths[queue] = channel.queue_declare(queue=queue, passive=True).message_count
+                except connection.channel_errors:
+                    # Never declared, or an empty Redis list
+                    depths[queue] = 0
+    return depths
+
+
+def collect_queue_depths() -> list:
+    depth = Gauge('celery_queue_depth', 'Messages waiting in the queue for a worker.', ('queue',))
+    for queue, count in queue_depths().items():
+        depth.set(count, queue=queue)
+    return [depth]
+
+
+def install_task_metrics():
+    """
+    Connect the Celery signals and add the task metrics to `/metrics`, if
+    TASK_METRICS_ENABLED.
+    """
+    if not TASK_METRICS_ENABLED:
+        return
+    before_task_publish.connect(stamp_published_at, dispatch_uid='apiapp.task_metrics.publish')
+    task_prerun.connect(task_started, dispatch_uid='apiapp.task_metrics.prerun')
+    task_postrun.connect(task_finished, dispatch_uid='apiapp.task_metrics.postrun')
+    worker_init.connect(start_metrics_buffer, dispatch_uid='apiapp.task_metrics.worker_init')
+    worker_shutdown.connect(flush_metrics_buffer, dispatch_uid='apiapp.task_metrics.worker_shutdown')
+    worker_process_shutdown.connect(flush_metrics_buffer, dispatch_uid='apiapp.task_metrics.process_shutdown')
+    REGISTRY.register_collector(collect_task_metrics)
+    REGISTRY.register_collector(collect_queue_depths)
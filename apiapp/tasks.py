@@ -1,19 +1,41 @@
+from celery.signals import worker_init, worker_process_shutdown, worker_shutdown
 from taskmanager.celery import app
-from apiapp.models import Task
-import time
+from apiapp.completions import completion_buffer
 import logging
 
 
+logger = logging.getLogger(__name__)
+
+
 @app.task()
 def run_task(task_id, timer):
     """
     For task concurrency, we are using Celery.
     Run a task with a specified timer and update its status to completed.
+
+    The timer is not slept inside the worker: a positive timer re-schedules this
+    task with a countdown (ETA) and returns, so the worker slot is free for other
+    tasks while the timer runs. The scheduled run (timer=0) completes the task,
+    on the queue the task was dispatched to.
+    """
+    if timer > 0:
+        queue = (run_task.request.delivery_info or {}).get('routing_key')
+        run_task.apply_async((task_id, 0), countdown=timer, queue=queue)
+        return
+    # Only a running task can complete; a concurrent fail or delete wins.
+    # Inside a worker the completion is buffered and written with others.
+    completion_buffer.add(task_id)
+
+
+@worker_init.connect
+def start_completion_buffer(**kwargs):
+    completion_buffer.start()
+
+
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def flush_completion_buffer(**kwargs):
+    """
+    Write the buffered completions before the worker (or a prefork child) exits.
     """
-    task = Task.objects.get(task_id=task_id)
-    if task:
-        time.sleep(timer)
-        task.status = Task.TaskStatus.COMPLETED
-        task.save(update_fields=['status'])
-    else:
-        raise ValueError(f"Issue with task {task_id} not found.")
+    completion_buffer.close()
@@ -0,0 +1,236 @@
+"""
+Query budgets of the task API.
+
+Every endpoint is pinned to the exact number of queries it runs, so an extra
+query (a second save, an existence check or lookup that could be folded into
+another, an N+1) fails here instead of showing up as latency in production.
+Counts include the SAVEPOINT/RELEASE of a view's transaction, which is a
+BEGIN/COMMIT outside of tests. Requests are sent with the token's user already
+cached, as for every request after the first; `test_cold_token_costs_one_user_query`
+covers the first.
+
+`TaskScaleTestCase` runs list and retrieve against 10k and 100k tasks and is
+only run with TASK_SCALE_TESTS=1:
+
+    TASK_SCALE_TESTS=1 python manage.py test apiapp.test_query_budgets
+"""
+import os
+import statistics
+import time
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apiapp.authentication import token_user_cache
+from apiapp.models import Task
+from apiapp.pagination import encode_position
+
+
+class QueryBudgetTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='budgetuser', password='testpass')
+        cls.tasks = Task.objects.bulk_create(Task(name=f'Budget {i}', user=cls.user) for i in range(20))
+
+    def setUp(self):
+        cache.clear()
+        token_user_cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.client.get(reverse('task-stats'))  # caches the token's user
+
+    def test_cold_token_costs_one_user_query(self):
+        token_user_cache.clear()
+        cache.clear()
+        with self.assertNumQueries(2):
+            self.client.get(reverse('task-stats'))
+
+    def test_list(self):
+        # Validators aggregate, then the tasks
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('task-list'))
+        self.assertEqual(len(response.data), 20)
+
+    def test_list_page(self):
+        # Validators come from the page's rows, no aggregate over every task
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('task-list'), {'page_size': 5})
+        with self.assertNumQueries(1):
+            self.client.get(response.data['next'])
+
+    def test_list_not_modified(self):
+        response = self.client.get(reverse('task-list'))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('task-list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_retrieve(self):
+        # The validators come from the task fetched
+        with self.assertNumQueries(1):
+            self.client.get(reverse('task-detail', args=[self.tasks[0].task_id]))
+
+    def test_create(self):
+        # Name check, INSERT, stats UPDATE
+        with self.assertNumQueries(5):
+            response = self.client.post(reverse('task-list'), {'name': 'New'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_create_running(self):
+        # ... and the outbox INSERT
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('task-list'), {'name': 'New', 'status': 'ru', 'timer': 1})
+        self.assertEqual(response.status_code, 201)
+
+    def test_fork(self):
+        # Source task, name check, INSERT, stats UPDATE
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse('task-list'), {'fork_task_id': str(self.tasks[0].task_id)})
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_create(self):
+        # Independent of the batch size: one name check, one INSERT, one stats UPDATE
+        for size in (1, 50):
+            with self.assertNumQueries(5):
+                response = self.client.post(
+                    reverse('task-bulk-create'), [{'name': f'Bulk {size}-{i}'} for i in range(size)], format='json'
+                )
+            self.assertEqual(response.status_code, 201)
+
+    def test_rename(self):
+        with self.assertNumQueries(4):
+            response = self.client.put(reverse('task-detail', args=[self.tasks[0].task_id]), {'name': 'Renamed'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_run(self):
+        # Locked read, conditional UPDATE, stats UPDATE, priority, outbox INSERT
+        with self.assertNumQueries(7):
+            response = self.client.put(reverse('task-detail', args=[self.tasks[0].task_id]), {'status': 'ru'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_destroy(self):
+        # Locked read, DELETE, tombstone INSERT, stats UPDATE
+        with self.assertNumQueries(4):
+            response = self.client.delete(reverse('task-detail', args=[self.tasks[0].task_id]))
+        self.assertEqual(response.status_code, 204)
+
+    def test_bulk_update(self):
+        for task_ids in (self.tasks[:1], self.tasks[1:]):
+            with self.assertNumQueries(5):
+                response = self.client.post(
+                    reverse('task-bulk-update'),
+                    {'task_ids': [str(task.task_id) for task in task_ids], 'status': 'fa'},
+                    format='json',
+                )
+            self.assertEqual(response.data['updated'], len(task_ids))
+
+    def test_bulk_update_to_running(self):
+        # Locked read of the IDs to dispatch and the outbox INSERT on top
+        with self.assertNumQueries(7):
+            response = self.client.post(
+                reverse('task-bulk-update'), {'filter': {'status': 'cr'}, 'status': 'ru'}, format='json'
+            )
+        self.assertEqual(response.data['updated'], 20)
+
+    def test_bulk_delete(self):
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('task-bulk-delete'), {'filter': {'status': 'cr'}}, format='json')
+        self.assertEqual(response.data['deleted'], 20)
+
+    def test_export(self):
+        # The rows are read as the response is streamed
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('task-export'))
+            b''.join(response.streaming_content)
+
+    @patch('apiapp.changes.TASK_CHANGES_SETTLE_SECONDS', 0)
+    def test_changes(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('task-changes'))
+        with self.assertNumQueries(2):
+            # Tasks and tombstones after the cursor
+            self.client.get(reverse('task-changes'), {'since': response.data['since']})
+
+    def test_stats(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('task-stats'))
+
+    def test_signup(self):
+        self.client.credentials()
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                reverse('user-signup'), {'username': 'newuser', 'password': 'pass', 'email': 'new@example.com'}
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def test_token(self):
+        self.client.credentials()
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('token_obtain_pair'), {'username': 'budgetuser', 'password': 'testpass'})
+        self.assertEqual(response.status_code, 200)
+
+
+@skipUnless(os.environ.get('TASK_SCALE_TESTS'), 'set TASK_SCALE_TESTS=1 to run the 10k/100k task tests')
+class TaskScaleTestCase(APITestCase):
+    """
+    List (paginated) and retrieve keep the same queries as a user's tasks grow
+    tenfold, and their latency grows much less than tenfold.
+    """
+    SIZES = (10_000, 100_000)
+    RUNS = 15
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {}
+        for size in cls.SIZES:
+            user = User.objects.create_user(username=f'scaleuser{size}', password='testpass')
+            Task.objects.bulk_create(
+                (Task(name=f'Scale {i}', user=user) for i in range(size)), batch_size=5000
+            )
+            cls.users[size] = user
+
+    def measure(self, user, path):
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+        self.client.get(path)  # warm up
+        timings = []
+        for _ in range(self.RUNS):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = self.client.get(path)
+                timings.append(time.perf_counter() - start)
+            self.assertEqual(response.status_code, 200)
+        return len(queries), statistics.median(timings)
+
+    def assertScales(self, paths):
+        results = [self.measure(self.users[size], paths[size]) for size in self.SIZES]
+        (small_queries, small_time), (large_queries, large_time) = results
+        self.assertEqual(small_queries, large_queries)
+        growth = self.SIZES[1] / self.SIZES[0]
+        self.assertLess(large_time / small_time, growth / 2, f'{small_time * 1000:.1f}ms -> {large_time * 1000:.1f}ms')
+
+    def test_list_page_scales(self):
+        path = reverse('task-list') + '?page_size=100'
+        self.assertScales({size: path for size in self.SIZES})
+
+    def test_list_deep_page_scales(self):
+        # A cursor halfway through the tasks costs as much as the first page
+        paths = {}
+        for size, user in self.users.items():
+            task = Task.objects.filter(user=user).order_by('created_at', 'task_id')[size // 2]
+            cursor = encode_position(task.created_at, task.task_id)
+            paths[size] = f"{reverse('task-list')}?page_size=100&cursor={cursor}"
+        self.assertScales(paths)
+
+    def test_retrieve_scales(self):
+        paths = {
+            size: reverse('task-detail', args=[Task.objects.filter(user=user).values_list('task_id', flat=True)[size // 2]])
+            for size, user in self.users.items()
+        }
+        self.assertScales(paths)
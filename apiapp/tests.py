@@ -3,8 +3,50 @@ from django.urls import reverse
 from apiapp.models import Task
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 from apiapp.tasks import run_task
+from apiapp.outbox import drain_outbox
+from apiapp.completions import CompletionBuffer, complete_overdue_tasks
+from apiapp.helpers import DEFAULT_TASK_RUNTIME
+from apiapp.models import TaskOutbox, TaskStats, TaskTombstone
+from apiapp.pagination import decode_position, encode_position
+from django.utils import timezone
+from django.utils.http import http_date
+from django.db import IntegrityError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.conf import settings
+from django.urls import include, path
+from apiapp.urls import get_task_urls
+from apiapp.cache import get_tasks_version, invalidate_user_tasks
+from django.core.cache import cache
+from django.core.management import call_command
+from apiapp.authentication import CachedJWTAuthentication, token_user_cache
+from datetime import timedelta
+from contextlib import asynccontextmanager
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.test.utils import CaptureQueriesContext
+from apiapp.export import export_tasks
+from apiapp.async_views import _event_stream
+from apiapp.serializers import TaskValuesSerializer, TaskViewInDetailSerializer, TaskViewSerializer
+from rest_framework.renderers import JSONRenderer
+from apiapp.metrics import REQUEST_DURATION, Counter, Histogram, Registry
+from apiapp.task_metrics import (
+    TaskMetricsBuffer, collect_task_metrics, queue_depths, stamp_published_at, task_finished, task_started,
+)
+from kombu import Connection
+from taskmanager.celery import app as celery_app
+from pathlib import Path
+from rich.console import Console
+import client
+import base64
+import csv
+import io
+import json
+import subprocess
+import sys
+import tempfile
+import time
 import uuid
 
 
@@ -47,7 +89,7 @@ class TaskModelTestCase(APITestCase):
         The test will check if the task is created with status 'ru' and if the run_task function is called.
         Once the task is created, it will simulate running the task and check if the status changes to 'co'.
         """
-        with patch('apiapp.tasks.run_task.delay') as mock_run_task:
+        with patch('apiapp.tasks.run_task.apply_async') as mock_run_task:
             response = self.client.post(
                 reverse('task-list'),
                 data={
@@ -61,7 +103,8 @@ class TaskModelTestCase(APITestCase):
             self.assertEqual(Task.objects.filter(name='Running Task', user=self.user).count(), 1)
             self.assertEqual(task.name, 'Running Task')
             self.assertEqual(task.status, 'ru')
-            mock_run_task.assert_called_once_with(task.task_id, 1)
+            drain_outbox()
+            mock_run_task.assert_called_once_with((task.task_id, 1), queue='celery')
 
             run_task(task.task_id, 0)
             task.refresh_from_db()
@@ -127,7 +170,7 @@ class TaskModelTestCase(APITestCase):
         To change task name as well as status (running). Which will call run_task function.
         To complete the task.
         """
-        with patch('apiapp.tasks.run_task.delay') as mock_run_task:
+        with patch('apiapp.tasks.run_task.apply_async') as mock_run_task:
             task = Task.objects.create(name='Test Task 96', status='cr', user=self.user)
             response = self.client.put(
                 reverse('task-detail', args=[task.task_id]),
@@ -141,7 +184,8 @@ class TaskModelTestCase(APITestCase):
             self.assertEqual(response.status_code, 200)
             self.assertEqual(task.name, 'Updated Task 24')
             self.assertEqual(task.status, 'ru')
-            mock_run_task.assert_called_once_with(task.task_id, 1)
+            drain_outbox()
+            mock_run_task.assert_called_once_with((task.task_id, 1), queue='celery')
 
             run_task(task.task_id, 0)
             task.refresh_from_db()
@@ -246,3 +290,1825 @@ class TaskModelTestCase(APITestCase):
         response_4 = self.client_2.get(reverse('task-list'))
         self.assertEqual(response_4.status_code, 200)
         self.assertEqual(len(response_4.data), Task.objects.filter(user=self.user_2).count())
+
+
+class TaskPaginationTestCase(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='pageuser', password='testpass')
+        cls.client = APIClient()
+        cls.access_token = cls.client.post(
+            reverse('token_obtain_pair'),
+            data={'username': 'pageuser', 'password': 'testpass'},
+            format='json'
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access_token.data['access']}")
+        for i in range(5):
+            Task.objects.create(name=f'Page Task {i}', status='cr' if i % 2 else 'co', user=self.user)
+
+    def test_list_without_pagination_params_returns_plain_list(self):
+        """
+        Test pagination is opt-in and plain list responses are unchanged.
+        """
+        response = self.client.get(reverse('task-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 5)
+
+    def test_walk_all_pages_with_cursor(self):
+        """
+        Test walking every page returns all tasks once, ordered by (created_at, task_id).
+        """
+        expected = [
+            str(task_id) for task_id in
+            Task.objects.filter(user=self.user).order_by('created_at', 'task_id').values_list('task_id', flat=True)
+        ]
+        seen = []
+        params = {'page_size': 2}
+        while True:
+            response = self.client.get(reverse('task-list'), params)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(task['task_id'] for task in response.data['results'])
+            if response.data['cursor'] is None:
+                self.assertIsNone(response.data['next'])
+                break
+            params = {'page_size': 2, 'cursor': response.data['cursor']}
+        self.assertEqual(seen, expected)
+
+    def test_cursor_pagination_keeps_status_filter(self):
+        """
+        Test the status filter is applied on every page.
+        """
+        response = self.client.get(reverse('task-list'), {'status': 'co', 'page_size': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        response = self.client.get(
+            reverse('task-list'), {'status': 'co', 'page_size': 5, 'cursor': response.data['cursor']}
+        )
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertTrue(all(task['status'] == 'Completed' for task in response.data['results']))
+
+    def test_page_size_is_capped(self):
+        """
+        Test page size larger than TASK_MAX_PAGE_SIZE is capped.
+        """
+        with patch('apiapp.pagination.TASK_MAX_PAGE_SIZE', 3):
+            response = self.client.get(reverse('task-list'), {'page_size': 100})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['cursor'])
+
+    def test_invalid_cursor(self):
+        """
+        Test an invalid cursor is rejected.
+        """
+        response = self.client.get(reverse('task-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Invalid cursor')
+        # Well-formed, but with a task ID that isn't a string
+        for position in ({'c': '2024-01-01T00:00:00', 't': 1}, {'c': '2024-01-01T00:00:00', 't': None}):
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+            response = self.client.get(reverse('task-list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['error'], 'Invalid cursor')
+
+
+class TaskExportTestCase(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='exportuser', password='testpass')
+        cls.client = APIClient()
+        cls.access_token = cls.client.post(
+            reverse('token_obtain_pair'),
+            data={'username': 'exportuser', 'password': 'testpass'},
+            format='json'
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access_token.data['access']}")
+        for i in range(5):
+            Task.objects.create(name=f'Export Task {i}', status='cr' if i % 2 else 'co', user=self.user)
+        other_user = User.objects.create_user(username='otherexportuser', password='testpass')
+        Task.objects.create(name='Other Export Task', user=other_user)
+
+    def test_export_ndjson(self):
+        """
+        Test the default export streams one JSON object per task, in listing order.
+        """
+        response = self.client.get(reverse('task-export'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        expected = Task.objects.filter(user=self.user).order_by('created_at', 'task_id')
+        self.assertEqual(rows, [TaskViewInDetailSerializer(task).data for task in expected])
+
+    def test_export_csv_with_status_filter(self):
+        """
+        Test the csv export writes a header and applies the status filter.
+        """
+        response = self.client.get(reverse('task-export'), {'file_format': 'csv', 'status': 'co'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(list(rows[0]), ['task_id', 'name', 'status', 'priority', 'created_at'])
+        self.assertTrue(all(row['status'] == 'Completed' for row in rows))
+
+    def test_export_is_chunked(self):
+        """
+        Test rows are fetched with a single query and written out per chunk.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            chunks = list(export_tasks(Task.objects.filter(user=self.user).order_by('created_at'), 'ndjson', 2))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(sum(chunk.count('\n') for chunk in chunks), 5)
+
+    def test_export_invalid_format(self):
+        """
+        Test an unknown export format is rejected.
+        """
+        response = self.client.get(reverse('task-export'), {'file_format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TaskConditionalGetTestCase(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='etaguser', password='testpass')
+        cls.client = APIClient()
+        cls.access_token = cls.client.post(
+            reverse('token_obtain_pair'),
+            data={'username': 'etaguser', 'password': 'testpass'},
+            format='json'
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access_token.data['access']}")
+        self.task = Task.objects.create(name='ETag Task', status='ru', user=self.user)
+        Task.objects.create(name='Other ETag Task', status='cr', user=self.user)
+
+    def test_list_not_modified(self):
+        """
+        Test a list request with a matching If-None-Match gets a 304 without loading tasks.
+        """
+        response = self.client.get(reverse('task-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('task-list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        task_queries = [q['sql'] for q in queries if 'apiapp_task' in q['sql']]
+        self.assertEqual(len(task_queries), 1)
+        self.assertIn('COUNT', task_queries[0])
+
+    def test_list_etag_changes_on_writes(self):
+        """
+        Test updates, worker completions and deletes all change the list ETag.
+        """
+        etags = [self.client.get(reverse('task-list'))['ETag']]
+        self.client.put(reverse('task-detail', args=[self.task.task_id]), data={'name': 'Renamed ETag Task'})
+        etags.append(self.client.get(reverse('task-list'))['ETag'])
+        run_task(self.task.task_id, 0)
+        etags.append(self.client.get(reverse('task-list'))['ETag'])
+        self.client.delete(reverse('task-detail', args=[self.task.task_id]))
+        etags.append(self.client.get(reverse('task-list'))['ETag'])
+        self.assertEqual(len(set(etags)), 4)
+
+        response = self.client.get(reverse('task-list'), HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+    def test_list_ignores_if_modified_since(self):
+        """
+        Test a list isn't answered 304 on If-Modified-Since alone, a delete
+        doesn't move the newest updated_at of the tasks left.
+        """
+        since = http_date(time.time() + 60)
+        for params in ({}, {'page_size': 5}):
+            self.assertEqual(self.client.get(reverse('task-list'), params, HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+        Task.objects.filter(pk=self.task.pk).delete()
+        response = self.client.get(reverse('task-list'), HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+    def test_list_etag_depends_on_query(self):
+        """
+        Test filtered lists don't share validators with the full list.
+        """
+        etag = self.client.get(reverse('task-list'))['ETag']
+        response = self.client.get(reverse('task-list'), {'status': 'cr'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_page_validators_are_page_scoped(self):
+        """
+        Test a page's validators come from its own rows: one query, no aggregate,
+        and they change when a task on the page changes or one is added after it.
+        """
+        params = {'page_size': 1}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('task-list'), params)
+        task_queries = [q['sql'] for q in queries if 'apiapp_task' in q['sql']]
+        self.assertEqual(len(task_queries), 1)
+        self.assertNotIn('COUNT', task_queries[0])
+        etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('task-list'), params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # The second page isn't on the first one
+        Task.objects.filter(name='Other ETag Task').transition(Task.TaskStatus.FAILED)
+        self.assertEqual(self.client.get(reverse('task-list'), params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        run_task(self.task.task_id, 0)
+        response = self.client.get(reverse('task-list'), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # The last page gets a next cursor once a task is added after it
+        last_page = {'page_size': 5}
+        etag = self.client.get(reverse('task-list'), last_page)['ETag']
+        Task.objects.create(name='Later ETag Task', user=self.user)
+        self.assertEqual(self.client.get(reverse('task-list'), last_page, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_retrieve_not_modified(self):
+        """
+        Test detail validators, including If-Modified-Since.
+        """
+        url = reverse('task-detail', args=[self.task.task_id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        run_task(self.task.task_id, 0)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'Completed')
+
+    def test_set_based_updates_stamp_updated_at(self):
+        """
+        Test queryset updates and transitions move updated_at forward.
+        """
+        updated_at = self.task.updated_at
+        Task.objects.filter(pk=self.task.pk).transition(Task.TaskStatus.FAILED)
+        self.task.refresh_from_db()
+        self.assertGreater(self.task.updated_at, updated_at)
+
+
+@patch('apiapp.changes.TASK_CHANGES_SETTLE_SECONDS', 0)
+class TaskChangeFeedTestCase(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='changesuser', password='testpass')
+        cls.client = APIClient()
+        cls.access_token = cls.client.post(
+            reverse('token_obtain_pair'),
+            data={'username': 'changesuser', 'password': 'testpass'},
+            format='json'
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access_token.data['access']}")
+        self.tasks = [
+            Task.objects.create(name=f'Change Task {i}', status='ru', user=self.user) for i in range(3)
+        ]
+
+    def sync(self, since=None, **params):
+        if since:
+            params['since'] = since
+        response = self.client.get(reverse('task-changes'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_initial_sync_returns_all_tasks(self):
+        """
+        Test a sync without a cursor returns every task and a sync from its cursor returns nothing.
+        """
+        data = self.sync()
+        self.assertEqual(
+            {change['task_id'] for change in data['changes']}, {str(task.task_id) for task in self.tasks}
+        )
+        self.assertFalse(any(change['deleted'] for change in data['changes']))
+        self.assertEqual(data['changes'][0]['task'], TaskViewInDetailSerializer(self.tasks[0]).data)
+
+        again = self.sync(data['since'])
+        self.assertEqual(again['changes'], [])
+        self.assertEqual(decode_position(again['since']), decode_position(data['since']))
+
+    def test_writes_after_cursor(self):
+        """
+        Test updates, worker completions and deletes after the cursor are returned in order.
+        """
+        since = self.sync()['since']
+        self.client.put(reverse('task-detail', args=[self.tasks[0].task_id]), data={'name': 'Changed Name'})
+        run_task(self.tasks[1].task_id, 0)
+        self.client.delete(reverse('task-detail', args=[self.tasks[2].task_id]))
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.sync(since)
+        self.assertEqual(
+            [(change['task_id'], change['deleted']) for change in data['changes']],
+            [(str(self.tasks[0].task_id), False), (str(self.tasks[1].task_id), False), (str(self.tasks[2].task_id), True)],
+        )
+        self.assertEqual(data['changes'][0]['task']['name'], 'Changed Name')
+        self.assertEqual(data['changes'][1]['task']['status'], 'Completed')
+        self.assertIsNone(data['changes'][2]['task'])
+        self.assertEqual(len([q for q in queries if 'apiapp_task' in q['sql']]), 2)
+
+    def test_pages_through_tasks_and_tombstones(self):
+        """
+        Test `limit` pages across both tasks and tombstones without skipping any.
+        """
+        since = self.sync()['since']
+        Task.objects.filter(task_id=self.tasks[0].task_id).delete()
+        Task.objects.filter(task_id=self.tasks[1].task_id).transition(Task.TaskStatus.FAILED)
+        Task.objects.filter(task_id=self.tasks[2].task_id).delete()
+        seen = []
+        while True:
+            data = self.sync(since, limit=1)
+            seen.extend((change['task_id'], change['deleted']) for change in data['changes'])
+            since = data['since']
+            if not data['has_more']:
+                break
+        self.assertEqual(seen, [
+            (str(self.tasks[0].task_id), True),
+            (str(self.tasks[1].task_id), False),
+            (str(self.tasks[2].task_id), True),
+        ])
+
+    def test_bulk_delete_leaves_tombstones(self):
+        """
+        Test set-based deletes are reported by the feed.
+        """
+        response = self.client.post(
+            reverse('task-bulk-delete'), data={'filter': {'status': 'ru'}}, format='json'
+        )
+        self.assertEqual(response.data['deleted'], 3)
+        self.assertEqual(TaskTombstone.objects.filter(user=self.user).count(), 3)
+
+    def test_recent_writes_are_held_back(self):
+        """
+        Test writes inside the settle window are only served once it has passed.
+        """
+        with patch('apiapp.changes.TASK_CHANGES_SETTLE_SECONDS', 60):
+            self.assertEqual(self.sync()['changes'], [])
+
+    def test_invalid_and_expired_cursor(self):
+        """
+        Test an invalid cursor is rejected and one older than the tombstone retention expired.
+        """
+        response = self.client.get(reverse('task-changes'), {'since': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        since = encode_position(timezone.now() - timedelta(days=365), uuid.uuid4())
+        response = self.client.get(reverse('task-changes'), {'since': since})
+        self.assertEqual(response.status_code, 410)
+
+    def test_cursor_of_idle_account_does_not_expire(self):
+        """
+        Test a cursor is expired on its last sync, not its last change, so an
+        account without writes inside the retention keeps syncing.
+        """
+        Task.objects.filter(user=self.user).update(updated_at=timezone.now() - timedelta(days=365))
+        since = self.sync()['since']
+        again = self.sync(since)
+        self.assertEqual(again['changes'], [])
+        self.sync(again['since'])
+
+
+class FakePubSub:
+    """
+    Stands in for a `redis.asyncio` PubSub, returns the queued messages then times out.
+    """
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=None):
+        if self.messages:
+            return {'type': 'message', 'data': json.dumps(self.messages.pop(0)).encode()}
+        return None
+
+
+@patch('apiapp.async_views.events_enabled', lambda: True)
+class TaskEventStreamTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='eventsuser', password='testpass')
+        cls.headers = {'Authorization': f'Bearer {RefreshToken.for_user(cls.user).access_token}'}
+
+    def fake_subscription(self, messages):
+        self.subscribed = []
+
+        @asynccontextmanager
+        async def subscribe(user_id):
+            self.subscribed.append(user_id)
+            yield FakePubSub(messages)
+
+        return patch('apiapp.async_views.subscribe_task_events', subscribe)
+
+    def capture_streams(self):
+        # Django wraps the stream in its own generator, closing the wrapper
+        # leaves the view's generator (and its subscription) open.
+        self.streams = []
+
+        def event_stream(*args):
+            stream = _event_stream(*args)
+            self.streams.append(stream)
+            return stream
+
+        return patch('apiapp.async_views._event_stream', event_stream)
+
+    async def test_stream_of_one_task(self):
+        """
+        Test a task stream starts with the current status and skips other tasks' events.
+        """
+        task = await Task.objects.acreate(name='Watched Task', status='ru', user=self.user)
+        messages = [
+            {'task_id': str(uuid.uuid4()), 'status': 'Completed'},
+            {'task_id': str(task.task_id), 'status': 'Completed'},
+        ]
+        with self.fake_subscription(messages), self.capture_streams():
+            response = await self.async_client.get(
+                reverse('task-events'), {'task_id': str(task.task_id)}, headers=self.headers
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            stream = response.streaming_content
+            events = [await anext(stream) for _ in range(3)]
+            await stream.aclose()
+            await self.streams[0].aclose()
+        self.assertEqual(self.subscribed, [self.user.id])
+        self.assertEqual(events, [
+            f'event: status\ndata: {json.dumps({"task_id": str(task.task_id), "status": "Running"})}\n\n'.encode(),
+            f'event: status\ndata: {json.dumps(messages[1])}\n\n'.encode(),
+            b': keep-alive\n\n',
+        ])
+
+    async def test_unknown_task_and_disabled(self):
+        response = await self.async_client.get(
+            reverse('task-events'), {'task_id': str(uuid.uuid4())}, headers=self.headers
+        )
+        self.assertEqual(response.status_code, 404)
+        with patch('apiapp.async_views.events_enabled', lambda: False):
+            response = await self.async_client.get(reverse('task-events'), headers=self.headers)
+        self.assertEqual(response.status_code, 503)
+
+    def test_wsgi_is_refused(self):
+        """
+        Test the stream isn't started under WSGI, which would never send it.
+        """
+        with self.fake_subscription([]):
+            response = self.client.get(reverse('task-events'), headers=self.headers)
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(self.subscribed, [])
+
+
+@patch('apiapp.events.TASK_EVENTS_REDIS_URL', 'redis://localhost:6379/2')
+class TaskEventPublishTestCase(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='publishuser', password='testpass')
+        cls.client = APIClient()
+        cls.access_token = cls.client.post(
+            reverse('token_obtain_pair'),
+            data={'username': 'publishuser', 'password': 'testpass'},
+            format='json'
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access_token.data['access']}")
+
+    def published(self, mock_publish):
+        return [
+            (user_id, json.loads(message)) for (user_id, messages), _ in mock_publish.call_args_list
+            for message in messages
+        ]
+
+    def test_status_writes_publish_after_commit(self):
+        """
+        Test the update view and the worker completion publish status events once committed.
+        """
+        task = Task.objects.create(name='Published Task', status='cr', user=self.user)
+        with patch('apiapp.events._publish') as mock_publish:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.client.put(reverse('task-detail', args=[task.task_id]), data={'status': 'ru', 'timer': 1})
+            mock_publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+            with self.captureOnCommitCallbacks(execute=True):
+                run_task(task.task_id, 0)
+        self.assertEqual(self.published(mock_publish), [
+            (self.user.id, {'task_id': str(task.task_id), 'status': 'Running'}),
+            (self.user.id, {'task_id': str(task.task_id), 'status': 'Completed'}),
+        ])
+
+    def test_publish_failure_is_logged(self):
+        """
+        Test a Redis outage doesn't fail the committed write.
+        """
+        with patch('apiapp.events._client', side_effect=ConnectionError('redis down')):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('task-list'), data={'name': 'Unpublished Task'})
+        self.assertEqual(response.status_code, 201)
+
+
+class TaskQueryPlanTestCase(TestCase):
+    """
+    Check via EXPLAIN that hot task queries are served by the Task indexes
+    instead of a table scan plus an in-memory sort.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='planuser', password='testpass')
+        Task.objects.bulk_create(
+            Task(name=f'Plan Task {i}', status=['cr', 'ru', 'co', 'fa'][i % 4], user=cls.user)
+            for i in range(200)
+        )
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are always cheaper to seq-scan; force the planner to show index usage.
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+                cursor.execute('ANALYZE apiapp_task')
+        elif connection.vendor != 'sqlite':
+            self.skipTest(f'No query plan assertions for {connection.vendor}')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        if connection.vendor == 'sqlite':
+            self.assertNotIn('TEMP B-TREE', plan)
+        else:
+            self.assertNotIn('Sort', plan)
+
+    def test_list_uses_user_created_index(self):
+        queryset = Task.objects.filter(user=self.user).order_by('created_at', 'task_id')
+        self.assertUsesIndex(queryset, 'task_user_created_idx')
+
+    def test_keyset_page_uses_user_created_index(self):
+        first = Task.objects.filter(user=self.user).order_by('created_at', 'task_id').first()
+        queryset = Task.objects.filter(user=self.user, created_at__gte=first.created_at).order_by('created_at', 'task_id')[:10]
+        self.assertUsesIndex(queryset, 'task_user_created_idx')
+
+    def test_status_filter_uses_user_status_created_index(self):
+        queryset = Task.objects.filter(user=self.user, status='co').order_by('created_at', 'task_id')
+        self.assertUsesIndex(queryset, 'task_user_status_created_idx')
+
+    def test_running_scan_uses_partial_index(self):
+        queryset = Task.objects.filter(status='ru').order_by('due_at')
+        self.assertUsesIndex(queryset, 'task_running_idx')
+
+
+class TaskBulkCreateTestCase(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='bulkuser', password='testpass')
+        cls.client = APIClient()
+        cls.access_token = cls.client.post(
+            reverse('token_obtain_pair'),
+            data={'username': 'bulkuser', 'password': 'testpass'},
+            format='json'
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access_token.data['access']}")
+
+    def test_bulk_create_reports_errors_per_item(self):
+        """
+        Test valid items are created while invalid ones are reported by index,
+        and running tasks are queued for dispatch.
+        """
+        Task.objects.create(name='Existing Task', status='cr', user=self.user)
+        with patch('apiapp.tasks.run_task.apply_async') as mock_run_task:
+            response = self.client.post(
+                reverse('task-bulk-create'),
+                data=[
+                    {'name': 'Bulk Task 1'},
+                    {'name': 'Bulk Task 2', 'status': 'ru', 'timer': 3},
+                    {'name': 'Existing Task'},
+                    {'name': 'Bulk Task 1'},
+                    {'name': 'Bulk Task 3', 'status': 'invalid-status'},
+                    {'name': 'Bulk Task 4', 'timer': -1},
+                    'not-a-task',
+                ],
+                format='json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['index'] for item in response.data['created']], [0, 1])
+        self.assertEqual([item['index'] for item in response.data['errors']], [2, 3, 4, 5, 6])
+        self.assertIn('name', response.data['errors'][0]['errors'])
+        self.assertIn('status', response.data['errors'][2]['errors'])
+        self.assertIn('timer', response.data['errors'][3]['errors'])
+
+        running = Task.objects.get(name='Bulk Task 2', user=self.user)
+        self.assertEqual(running.status, 'ru')
+        self.assertEqual(Task.objects.get(name='Bulk Task 1', user=self.user).status, 'cr')
+        mock_run_task.assert_not_called()
+        with patch('apiapp.tasks.run_task.apply_async') as mock_run_task:
+            self.assertEqual(drain_outbox(), 1)
+        mock_run_task.assert_called_once_with((running.task_id, 3), queue='celery')
+
+    def test_bulk_create_single_existence_query(self):
+        """
+        Test name uniqueness is checked with one query for the whole batch.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('task-bulk-create'),
+                data={'tasks': [{'name': f'Batch Task {i}'} for i in range(50)]},
+                format='json',
+            )
+        task_selects = [q for q in queries if q['sql'].startswith('SELECT') and '"apiapp_task"' in q['sql']]
+        task_inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "apiapp_task"')]
+        self.assertEqual(len(task_selects), 1)
+        self.assertEqual(len(task_inserts), 1)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Task.objects.filter(user=self.user, name__startswith='Batch Task').count(), 50)
+
+    def test_bulk_create_rejects_empty_or_oversized_batch(self):
+        """
+        Test empty and oversized batches are rejected.
+        """
+        response = self.client.post(reverse('task-bulk-create'), data=[], format='json')
+        self.assertEqual(response.status_code, 400)
+        with patch('apiapp.views.TASK_BULK_MAX_SIZE', 2):
+            response = self.client.post(
+                reverse('task-bulk-create'),
+                data=[{'name': f'Too Many {i}'} for i in range(3)],
+                format='json',
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Task.objects.filter(name__startswith='Too Many').count(), 0)
+
+
+class TaskBulkUpdateDeleteTestCase(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='bulkedituser', password='testpass')
+        cls.other_user = User.objects.create_user(username='bulkotheruser', password='testpass')
+        cls.client = APIClient()
+        cls.access_token = cls.client.post(
+            reverse('token_obtain_pair'),
+            data={'username': 'bulkedituser', 'password': 'testpass'},
+            format='json'
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access_token.data['access']}")
+        self.failed = [Task.objects.create(name=f'Failed {i}', status='fa', user=self.user) for i in range(3)]
+        self.created = [Task.objects.create(name=f'Created {i}', status='cr', user=self.user) for i in range(2)]
+        self.foreign = Task.objects.create(name='Failed 0', status='fa', user=self.other_user)
+
+    def test_bulk_update_by_ids_runs_single_update(self):
+        """
+        Test a bulk status transition by IDs is a single UPDATE statement.
+        """
+        task_ids = [str(task.task_id) for task in self.created]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('task-bulk-update'), data={'task_ids': task_ids, 'status': 'fa'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "apiapp_task"')]), 1)
+        self.assertEqual(Task.objects.filter(user=self.user, status='fa').count(), 5)
+
+    def test_bulk_update_to_running_dispatches_tasks(self):
+        """
+        Test moving tasks to running queues them for dispatch.
+        """
+        with patch('apiapp.tasks.run_task.apply_async') as mock_run_task:
+            response = self.client.post(
+                reverse('task-bulk-update'),
+                data={'filter': {'status': 'fa'}, 'status': 'ru', 'timer': 2},
+                format='json',
+            )
+            drain_outbox()
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(
+            sorted(call.args[0] for call in mock_run_task.call_args_list),
+            sorted((task.task_id, 2) for task in self.failed),
+        )
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.status, 'fa')
+
+    def test_bulk_update_with_invalid_status(self):
+        """
+        Test bulk update follows validate_updation_status rules.
+        """
+        response = self.client.post(
+            reverse('task-bulk-update'), data={'filter': {'status': 'fa'}, 'status': 'cr'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Invalid status value')
+
+    def test_bulk_delete_by_filter(self):
+        """
+        Test deleting all failed tasks older than a timestamp with one DELETE.
+        """
+        Task.objects.filter(task_id=self.failed[0].task_id).update(created_at='2020-01-01T00:00:00Z')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('task-bulk-delete'),
+                data={'filter': {'status': 'fa', 'created_before': '2021-01-01T00:00:00Z'}},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['deleted'], 1)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('DELETE')]), 1)
+        self.assertFalse(Task.objects.filter(task_id=self.failed[0].task_id).exists())
+        self.assertTrue(Task.objects.filter(task_id=self.foreign.task_id).exists())
+
+    def test_bulk_delete_requires_selector(self):
+        """
+        Test bulk delete without task_ids or filter is rejected.
+        """
+        response = self.client.post(reverse('task-bulk-delete'), data={}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('task-bulk-delete'), data={'task_ids': ['invalid-id']}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['task_ids'], ['invalid-id'])
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 5)
+
+    def test_bulk_filter_rejects_unknown_keys(self):
+        """
+        Test a misspelt filter key is rejected instead of matching every task.
+        """
+        for url, data in (
+            ('task-bulk-delete', {'filter': {'stauts': 'cr'}}),
+            ('task-bulk-update', {'filter': {'status': 'cr', 'name': 'x'}, 'status': 'fa'}),
+        ):
+            response = self.client.post(reverse(url), data=data, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['error'], 'Unknown filter keys')
+        self.assertEqual(response.data['keys'], ['name'])
+        self.assertEqual(Task.objects.filter(user=self.user, status='fa').count(), 3)
+        self.assertEqual(Task.objects.filter(user=self.user, status='cr').count(), 2)
+
+    def test_bulk_filter_rejects_non_string_values(self):
+        """
+        Test a filter value of the wrong type is a 400, not a server error.
+        """
+        for url, data in (
+            ('task-bulk-delete', {'filter': {'status': ['fa']}}),
+            ('task-bulk-update', {'filter': {'status': {'in': 'cr'}}, 'status': 'fa'}),
+            ('task-bulk-delete', {'filter': {'created_before': 1}}),
+        ):
+            response = self.client.post(reverse(url), data=data, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(Task.objects.filter(user=self.user, status='fa').count(), 3)
+        self.assertEqual(Task.objects.filter(user=self.user, status='cr').count(), 2)
+
+
+class TaskStatsTestCase(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='statsuser', password='testpass')
+        cls.client = APIClient()
+        cls.access_token = cls.client.post(
+            reverse('token_obtain_pair'),
+            data={'username': 'statsuser', 'password': 'testpass'},
+            format='json'
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access_token.data['access']}")
+
+    def assertStatsMatchTasks(self):
+        counts = {str(label): Task.objects.filter(user=self.user, status=status).count()
+                  for status, label in Task.TaskStatus.choices}
+        response = self.client.get(reverse('task-stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'total': sum(counts.values()), 'by_status': counts})
+
+    def test_stats_follow_every_write_path(self):
+        """
+        Test the counters match the tasks after creates, forks, updates, bulk
+        writes, completions and deletes.
+        """
+        with patch('apiapp.tasks.run_task.apply_async'):
+            self.client.post(reverse('task-list'), data={'name': 'Stats 1', 'status': 'ru', 'timer': 1})
+            self.client.post(reverse('task-list'), data={'name': 'Stats 2'})
+            self.assertStatsMatchTasks()
+            first = Task.objects.get(name='Stats 1')
+            self.client.post(reverse('task-list'), data={'fork_task_id': str(first.task_id)})
+            self.client.post(
+                reverse('task-bulk-create'),
+                data={'tasks': [{'name': f'Stats bulk {i}', 'status': 'ru'} for i in range(3)]},
+                format='json',
+            )
+            self.assertStatsMatchTasks()
+            second = Task.objects.get(name='Stats 2')
+            self.client.put(reverse('task-detail', args=[second.task_id]), data={'status': 'ru'})
+            run_task(first.task_id, 0)
+            self.client.post(
+                reverse('task-bulk-update'), data={'filter': {'status': 'ru'}, 'status': 'fa'}, format='json'
+            )
+            self.assertStatsMatchTasks()
+            self.client.delete(reverse('task-detail', args=[first.task_id]))
+            self.client.post(reverse('task-bulk-delete'), data={'filter': {'status': 'fa'}}, format='json')
+        self.assertStatsMatchTasks()
+        self.assertEqual(TaskStats.for_user(self.user.id)['total'], 1)
+
+    def test_instance_delete(self):
+        """
+        Test deleting a task instance (admin, shell) leaves a tombstone and
+        uncounts it, and deleting the user takes its tasks, counters and
+        tombstones along.
+        """
+        task = Task.objects.create(name='Instance delete', user=self.user)
+        Task.objects.create(name='Instance keep', user=self.user)
+        self.assertEqual(task.delete(), (1, {'apiapp.Task': 1}))
+        self.assertTrue(TaskTombstone.objects.filter(task_id=task.task_id, user=self.user).exists())
+        self.assertStatsMatchTasks()
+
+        user = User.objects.create_user(username='statscascade', password='testpass')
+        Task.objects.create(name='Cascade', user=user).delete()
+        Task.objects.create(name='Cascade 2', user=user)
+        user.delete()
+        self.assertFalse(Task.objects.filter(user_id=user.id).exists())
+        self.assertFalse(TaskStats.objects.filter(user_id=user.id).exists())
+        self.assertFalse(TaskTombstone.objects.filter(user_id=user.id).exists())
+
+    def test_instance_save_moves_counts(self):
+        """
+        Test saving an existing task with another status or user (admin, shell)
+        moves its count, and a save without either leaves the counts alone.
+        """
+        task = Task.objects.create(name='Instance save', user=self.user)
+        task.status = Task.TaskStatus.COMPLETED
+        task.save()
+        self.assertStatsMatchTasks()
+        task.name = 'Instance saved'
+        task.save()
+        task.status = Task.TaskStatus.FAILED
+        task.save(update_fields=['name'])
+        self.assertStatsMatchTasks()
+        task.save(update_fields=['status'])
+        self.assertStatsMatchTasks()
+
+        other = User.objects.create_user(username='statsowner', password='testpass')
+        task.user = other
+        task.save()
+        self.assertStatsMatchTasks()
+        self.assertEqual(TaskStats.for_user(other.id)['by_status']['Failed'], 1)
+
+    def test_stats_read_counters_only(self):
+        """
+        Test the stats endpoint reads the counters, not the tasks.
+        """
+        Task.objects.create(name='Stats only', user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('task-stats'))
+        self.assertEqual(response.data['by_status']['Created'], 1)
+        self.assertFalse([q for q in queries if 'apiapp_task"' in q['sql']])
+        self.assertEqual(len([q for q in queries if 'apiapp_taskstats' in q['sql']]), 1)
+
+    def test_rebuild_task_stats(self):
+        """
+        Test rebuild_task_stats recounts drifted counters from the tasks.
+        """
+        Task.objects.create(name='Rebuild 1', user=self.user)
+        Task.objects.create(name='Rebuild 2', status='fa', user=self.user)
+        TaskStats.objects.filter(user=self.user).update(count=7)
+        call_command('rebuild_task_stats', user_ids=[self.user.id], stdout=io.StringIO())
+        self.assertEqual(
+            TaskStats.for_user(self.user.id),
+            {'total': 2, 'by_status': {'Created': 1, 'Running': 0, 'Completed': 0, 'Failed': 1}},
+        )
+
+
+class RunTaskTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='runtaskuser', password='testpass')
+
+    def test_timer_is_scheduled_instead_of_slept(self):
+        """
+        Test a positive timer re-schedules the completion with a countdown
+        and leaves the task running.
+        """
+        task = Task.objects.create(name='Timer Task', status='ru', user=self.user)
+        with patch('apiapp.tasks.run_task.apply_async') as mock_apply_async:
+            run_task(task.task_id, 30)
+        mock_apply_async.assert_called_once_with((task.task_id, 0), countdown=30, queue=None)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'ru')
+
+    def test_scheduled_run_completes_task(self):
+        """
+        Test the scheduled run (timer=0) completes the task.
+        """
+        task = Task.objects.create(name='Timer Task', status='ru', user=self.user)
+        run_task(task.task_id, 0)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'co')
+
+    def test_buffered_completions_flush_as_one_update(self):
+        """
+        Test a worker's buffered completions are written together once the
+        batch is full, with one UPDATE of the tasks.
+        """
+        tasks = [Task.objects.create(name=f'Buffered {i}', status='ru', user=self.user) for i in range(3)]
+        buffer = CompletionBuffer(batch_size=3, flush_ms=60000)
+        buffer.start()
+        buffer.add(tasks[0].task_id)
+        buffer.add(tasks[1].task_id)
+        self.assertEqual(Task.objects.filter(user=self.user, status='co').count(), 0)
+        with CaptureQueriesContext(connection) as queries:
+            buffer.add(tasks[2].task_id)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "apiapp_task"')]), 1)
+        self.assertEqual(Task.objects.filter(user=self.user, status='co').count(), 3)
+        buffer.close()
+
+    def test_buffered_completions_flush_on_shutdown(self):
+        """
+        Test closing the buffer on worker shutdown writes what is left, and a
+        failed flush keeps the completions for the next one.
+        """
+        task = Task.objects.create(name='Shutdown Task', status='ru', user=self.user)
+        buffer = CompletionBuffer(batch_size=10, flush_ms=60000)
+        buffer.start()
+        buffer.add(task.task_id)
+        with patch('apiapp.completions.complete_tasks', side_effect=Exception('database is down')):
+            self.assertEqual(buffer.flush(), 0)
+        buffer.close()
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'co')
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_lost_completions_are_swept(self):
+        """
+        Test running tasks past their timer and the grace are completed, as
+        after a worker was killed with their completions buffered.
+        """
+        now = timezone.now()
+        lost = Task.objects.create(name='Lost', status='ru', user=self.user, due_at=now - timedelta(seconds=120))
+        late = Task.objects.create(name='Late', status='ru', user=self.user, due_at=now - timedelta(seconds=30))
+        failed = Task.objects.create(name='Failed', status='fa', user=self.user, due_at=now - timedelta(seconds=120))
+        self.assertEqual(complete_overdue_tasks(grace_seconds=60), 1)
+        statuses = dict(Task.objects.filter(user=self.user).values_list('name', 'status'))
+        self.assertEqual(statuses, {lost.name: 'co', late.name: 'ru', failed.name: 'fa'})
+        self.assertEqual(complete_overdue_tasks(grace_seconds=60), 0)
+
+
+class TaskTransitionTestCase(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='transitionuser', password='testpass')
+        cls.client = APIClient()
+        cls.access_token = cls.client.post(
+            reverse('token_obtain_pair'),
+            data={'username': 'transitionuser', 'password': 'testpass'},
+            format='json'
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access_token.data['access']}")
+
+    def test_only_legal_edges_transition(self):
+        """
+        Test Task.transition applies legal edges and rejects illegal ones.
+        """
+        task = Task.objects.create(name='Edge Task', status='cr', user=self.user)
+        self.assertFalse(task.transition(Task.TaskStatus.COMPLETED))
+        self.assertEqual(task.status, 'cr')
+        self.assertTrue(task.transition(Task.TaskStatus.RUNNING))
+        self.assertTrue(task.transition(Task.TaskStatus.COMPLETED))
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'co')
+
+    def test_transition_is_a_single_conditional_update(self):
+        """
+        Test a transition writes the tasks with one UPDATE ... WHERE status IN (...)
+        and the stats with one more.
+        """
+        task = Task.objects.create(name='Cas Task', status='ru', user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            updated = Task.objects.filter(task_id=task.task_id).transition(Task.TaskStatus.COMPLETED)
+        self.assertEqual(updated, 1)
+        task_updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "apiapp_task"')]
+        stats_updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "apiapp_taskstats"')]
+        self.assertEqual(len(task_updates), 1)
+        self.assertIn('"status" IN', task_updates[0])
+        self.assertEqual(len(stats_updates), 1)
+
+    def test_completion_does_not_overwrite_failed_task(self):
+        """
+        Test run_task completion loses against a concurrent fail.
+        """
+        task = Task.objects.create(name='Failed Meanwhile', status='ru', user=self.user)
+        Task.objects.filter(task_id=task.task_id).update(status='fa')
+        run_task(task.task_id, 0)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'fa')
+
+    def test_update_illegal_transition_conflicts(self):
+        """
+        Test updating a running task to running again is rejected with 409.
+        """
+        task = Task.objects.create(name='Already Running', status='ru', user=self.user)
+        with patch('apiapp.tasks.run_task.apply_async') as mock_run_task:
+            response = self.client.put(
+                reverse('task-detail', args=[task.task_id]), data={'status': 'ru', 'name': 'Renamed'}
+            )
+        self.assertEqual(response.status_code, 409)
+        mock_run_task.assert_not_called()
+        task.refresh_from_db()
+        self.assertEqual(task.name, 'Already Running')
+
+    def test_update_failed_task_to_running(self):
+        """
+        Test a failed task can be re-run.
+        """
+        task = Task.objects.create(name='Retry Task', status='fa', user=self.user)
+        with patch('apiapp.tasks.run_task.apply_async') as mock_run_task:
+            response = self.client.put(reverse('task-detail', args=[task.task_id]), data={'status': 'ru', 'timer': 1})
+            drain_outbox()
+        self.assertEqual(response.status_code, 200)
+        mock_run_task.assert_called_once_with((task.task_id, 1), queue='celery')
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'ru')
+
+
+class TaskOutboxTestCase(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='outboxuser', password='testpass')
+        cls.client = APIClient()
+        cls.access_token = cls.client.post(
+            reverse('token_obtain_pair'),
+            data={'username': 'outboxuser', 'password': 'testpass'},
+            format='json'
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access_token.data['access']}")
+
+    def test_create_writes_outbox_without_touching_broker(self):
+        """
+        Test creating a running task writes an outbox row instead of publishing.
+        """
+        with patch('apiapp.tasks.run_task.apply_async') as mock_run_task:
+            response = self.client.post(reverse('task-list'), data={'name': 'Outbox Task', 'status': 'ru', 'timer': 2})
+        self.assertEqual(response.status_code, 201)
+        mock_run_task.assert_not_called()
+        task = Task.objects.get(name='Outbox Task', user=self.user)
+        self.assertEqual(list(TaskOutbox.objects.values_list('task_id', 'timer')), [(task.task_id, 2)])
+        self.assertIsNone(task.due_at)
+
+    def test_relay_completes_overdue_tasks(self):
+        """
+        Test the relay also completes running tasks whose completion was lost.
+        """
+        task = Task.objects.create(
+            name='Overdue', status='ru', user=self.user, due_at=timezone.now() - timedelta(hours=1)
+        )
+        call_command('relay_outbox', '--once')
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'co')
+
+    def test_undispatched_tasks_are_not_swept(self):
+        """
+        Test a task whose run is still in the outbox isn't completed, nor swept
+        by a relay that can't reach the broker.
+        """
+        task = Task.objects.create(
+            name='Undispatched', status='ru', user=self.user, due_at=timezone.now() - timedelta(hours=1)
+        )
+        TaskOutbox.objects.create(task_id=task.task_id, timer=1)
+        self.assertEqual(complete_overdue_tasks(grace_seconds=60), 0)
+        with patch('apiapp.tasks.run_task.apply_async', side_effect=ConnectionError('broker down')):
+            with self.assertRaises(ConnectionError):
+                call_command('relay_outbox', '--once')
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'ru')
+        with patch('apiapp.tasks.run_task.apply_async'):
+            call_command('relay_outbox', '--once')
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'ru')
+        self.assertGreater(task.due_at, timezone.now())
+
+    def test_drain_publishes_in_batches(self):
+        """
+        Test the relay publishes rows in order, in batches, and deletes them.
+        """
+        task_ids = [uuid.uuid4() for _ in range(5)]
+        TaskOutbox.objects.bulk_create(TaskOutbox(task_id=task_id, timer=1) for task_id in task_ids)
+        with patch('apiapp.tasks.run_task.apply_async') as mock_run_task:
+            self.assertEqual(drain_outbox(batch_size=3), 3)
+            self.assertEqual(drain_outbox(batch_size=3), 2)
+            self.assertEqual(drain_outbox(batch_size=3), 0)
+        self.assertEqual([call.args[0][0] for call in mock_run_task.call_args_list], task_ids)
+        self.assertFalse(TaskOutbox.objects.exists())
+
+    def test_drain_stamps_due_at(self):
+        """
+        Test publishing a run stamps when its timer expires, without changing updated_at.
+        """
+        task = Task.objects.create(name='Due Task', status='ru', user=self.user)
+        TaskOutbox.objects.create(task_id=task.task_id, timer=30)
+        with patch('apiapp.tasks.run_task.apply_async'):
+            drain_outbox()
+        published = Task.objects.get(pk=task.pk)
+        self.assertAlmostEqual(published.due_at, timezone.now() + timedelta(seconds=30), delta=timedelta(seconds=5))
+        self.assertEqual(published.updated_at, task.updated_at)
+
+    def test_drain_keeps_rows_when_broker_fails(self):
+        """
+        Test a broker failure leaves the batch in the outbox for the next drain.
+        """
+        TaskOutbox.objects.create(task_id=uuid.uuid4(), timer=1)
+        with patch('apiapp.tasks.run_task.apply_async', side_effect=ConnectionError('broker down')):
+            with self.assertRaises(ConnectionError):
+                drain_outbox()
+        self.assertEqual(TaskOutbox.objects.count(), 1)
+
+    def test_rolled_back_write_leaves_no_dispatch(self):
+        """
+        Test outbox rows are rolled back with the task write.
+        """
+        with patch('apiapp.tasks.run_task.apply_async') as mock_run_task:
+            with patch('apiapp.views.Task.objects.bulk_create', side_effect=IntegrityError):
+                response = self.client.post(
+                    reverse('task-bulk-create'), data=[{'name': 'Rolled Back', 'status': 'ru'}], format='json'
+                )
+            drain_outbox()
+        self.assertEqual(response.status_code, 409)
+        mock_run_task.assert_not_called()
+
+    def test_runs_are_routed_by_priority_and_timer(self):
+        """
+        Test high priority runs go to the high queue, low priority and long runs
+        to the bulk queue and the rest to the default queue.
+        """
+        with patch('apiapp.tasks.run_task.apply_async') as mock_run_task:
+            self.client.post(
+                reverse('task-bulk-create'),
+                data=[
+                    {'name': 'High', 'status': 'ru', 'priority': 'high', 'timer': 1},
+                    {'name': 'High long', 'status': 'ru', 'priority': 'hi', 'timer': 3600},
+                    {'name': 'Normal', 'status': 'ru', 'timer': 1},
+                    {'name': 'Low', 'status': 'ru', 'priority': 'lo', 'timer': 1},
+                ],
+                format='json',
+            )
+            drain_outbox()
+        queues = {call.args[0][0]: call.kwargs['queue'] for call in mock_run_task.call_args_list}
+        self.assertEqual(
+            {Task.objects.get(task_id=task_id).name: queue for task_id, queue in queues.items()},
+            {'High': 'high', 'High long': 'bulk', 'Normal': 'celery', 'Low': 'bulk'},
+        )
+
+    def test_priority_is_validated_and_shown(self):
+        """
+        Test an unknown priority is rejected and the detail view shows its label.
+        """
+        response = self.client.post(reverse('task-list'), data={'name': 'Bad priority', 'priority': 'urgent'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('priority', response.data)
+        self.client.post(reverse('task-list'), data={'name': 'Low priority', 'priority': 'lo'})
+        task = Task.objects.get(name='Low priority', user=self.user)
+        response = self.client.get(reverse('task-detail', args=[task.task_id]))
+        self.assertEqual(response.data['priority'], 'Low')
+        with patch('apiapp.tasks.run_task.apply_async') as mock_run_task:
+            self.client.put(reverse('task-detail', args=[task.task_id]), data={'status': 'ru', 'priority': 'hi'})
+            drain_outbox()
+        mock_run_task.assert_called_once_with((task.task_id, DEFAULT_TASK_RUNTIME), queue='high')
+
+
+class AsyncTaskUrls:
+    """
+    URL conf serving the async task views, as with TASK_API_ASYNC=True.
+    """
+    urlpatterns = [path('api/', include(get_task_urls(use_async=True)))]
+
+
+@override_settings(ROOT_URLCONF=AsyncTaskUrls)
+class AsyncTaskViewTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='asyncuser', password='testpass')
+        cls.headers = {'Authorization': f'Bearer {RefreshToken.for_user(cls.user).access_token}'}
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(reverse('task-list'))
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(reverse('task-list'), headers={'Authorization': 'Bearer invalid'})
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response.headers)
+
+    async def test_list_and_retrieve_match_sync_views(self):
+        """
+        Test the async list/retrieve responses match TaskViewSet.
+        """
+        task = await Task.objects.acreate(name='Async Task', status='co', user=self.user)
+        await Task.objects.acreate(name='Async Task 2', status='cr', user=self.user)
+        response = await self.async_client.get(reverse('task-list'), {'status': 'co'}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{'task_id': str(task.task_id), 'status': 'Completed'}])
+
+        response = await self.async_client.get(reverse('task-list'), {'page_size': 1}, headers=self.headers)
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertIsNotNone(response.json()['cursor'])
+
+        response = await self.async_client.get(reverse('task-detail', args=[task.task_id]), headers=self.headers)
+        self.assertEqual(response.json()['name'], 'Async Task')
+        self.assertEqual(response.json()['status'], 'Completed')
+        response = await self.async_client.get(reverse('task-detail', args=['invalid-id']), headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Invalid task ID')
+
+    async def test_create_update_destroy(self):
+        response = await self.async_client.post(
+            reverse('task-list'), {'name': 'Async Created'}, content_type='application/json', headers=self.headers
+        )
+        self.assertEqual(response.status_code, 201)
+        response = await self.async_client.post(
+            reverse('task-list'), {'name': 'Async Created'}, content_type='application/json', headers=self.headers
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['name'], ['Task with this name already exists.'])
+
+        task = await Task.objects.aget(name='Async Created', user=self.user)
+        response = await self.async_client.put(
+            reverse('task-detail', args=[task.task_id]),
+            {'status': 'ru', 'name': 'Async Renamed', 'timer': 3},
+            content_type='application/json',
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        await task.arefresh_from_db()
+        self.assertEqual((task.name, task.status), ('Async Renamed', 'ru'))
+        self.assertTrue(await TaskOutbox.objects.filter(task_id=task.task_id, timer=3).aexists())
+
+        response = await self.async_client.put(
+            reverse('task-detail', args=[task.task_id]), {'status': 'ru'},
+            content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 409)
+
+        response = await self.async_client.delete(reverse('task-detail', args=[task.task_id]), headers=self.headers)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(await Task.objects.filter(task_id=task.task_id).aexists())
+        response = await self.async_client.delete(reverse('task-detail', args=[task.task_id]), headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_conditional_get(self):
+        """
+        Test the async views honour the same validators as TaskViewSet.
+        """
+        task = await Task.objects.acreate(name='Async ETag Task', user=self.user)
+        for url in (reverse('task-list'), reverse('task-detail', args=[task.task_id])):
+            response = await self.async_client.get(url, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            response = await self.async_client.get(url, headers={**self.headers, 'If-None-Match': response['ETag']})
+            self.assertEqual(response.status_code, 304)
+
+    async def test_fork(self):
+        """
+        Test an async fork belongs to the user, is counted and keeps names unique.
+        """
+        task = await Task.objects.acreate(name='Async Source', user=self.user)
+        with patch('apiapp.async_views.publish_task_events') as mock_publish:
+            response = await self.async_client.post(
+                reverse('task-list'), {'fork_task_id': str(task.task_id)},
+                content_type='application/json', headers=self.headers,
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Async Source-forked')
+        fork = await Task.objects.aget(name='Async Source-forked')
+        self.assertEqual(fork.user_id, self.user.id)
+        mock_publish.assert_called_once_with(self.user.id, [(fork.task_id, fork.status)])
+        stats = await sync_to_async(TaskStats.for_user)(self.user.id)
+        self.assertEqual(stats['total'], 2)
+
+        response = await self.async_client.post(
+            reverse('task-list'), {'fork_task_id': str(task.task_id)},
+            content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['name'], ['Task with this name already exists.'])
+
+    async def test_bulk_routes_stay_on_viewset(self):
+        response = await self.async_client.post(
+            reverse('task-bulk-create'), [{'name': 'Async Bulk'}], content_type='application/json', headers=self.headers
+        )
+        self.assertEqual(response.status_code, 201)
+
+
+@patch('apiapp.cache.TASK_CACHE_ENABLED', True)
+class TaskResponseCacheTestCase(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cacheuser', password='testpass')
+        cls.client = APIClient()
+        cls.access_token = cls.client.post(
+            reverse('token_obtain_pair'),
+            data={'username': 'cacheuser', 'password': 'testpass'},
+            format='json'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access_token.data['access']}")
+
+    def task_queries(self, queries):
+        return [q for q in queries if 'apiapp_task' in q['sql']]
+
+    def test_list_is_served_from_cache(self):
+        """
+        Test a repeated list request doesn't query tasks.
+        """
+        Task.objects.create(name='Cached Task', status='cr', user=self.user)
+        first = self.client.get(reverse('task-list'))
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(reverse('task-list'))
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(self.task_queries(queries), [])
+
+        # Different query params are cached separately
+        response = self.client.get(reverse('task-list'), {'status': 'co'})
+        self.assertEqual(response.data, [])
+
+    def test_writes_invalidate_list(self):
+        """
+        Test create, update and destroy through the API are visible on the next read.
+        """
+        self.assertEqual(self.client.get(reverse('task-list')).data, [])
+        self.client.post(reverse('task-list'), data={'name': 'New Cached Task'})
+        response = self.client.get(reverse('task-list'))
+        self.assertEqual(len(response.data), 1)
+        task_id = response.data[0]['task_id']
+
+        self.assertEqual(self.client.get(reverse('task-detail', args=[task_id])).data['name'], 'New Cached Task')
+        self.client.put(reverse('task-detail', args=[task_id]), data={'name': 'Renamed Cached Task'})
+        self.assertEqual(self.client.get(reverse('task-detail', args=[task_id])).data['name'], 'Renamed Cached Task')
+
+        self.client.delete(reverse('task-detail', args=[task_id]))
+        self.assertEqual(self.client.get(reverse('task-list')).data, [])
+        self.assertEqual(self.client.get(reverse('task-detail', args=[task_id])).status_code, 404)
+
+    def test_run_task_completion_invalidates_detail(self):
+        """
+        Test the worker completion is visible on the next read.
+        """
+        task = Task.objects.create(name='Running Cached Task', status='ru', user=self.user)
+        response = self.client.get(reverse('task-detail', args=[task.task_id]))
+        self.assertEqual(response.data['status'], 'Running')
+        run_task(task.task_id, 0)
+        response = self.client.get(reverse('task-detail', args=[task.task_id]))
+        self.assertEqual(response.data['status'], 'Completed')
+
+    def test_version_is_bumped_again_on_commit(self):
+        """
+        Test invalidation bumps the version now and after commit.
+        """
+        version = get_tasks_version(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_user_tasks(self.user.id)
+            self.assertEqual(get_tasks_version(self.user.id), version + 1)
+        self.assertEqual(get_tasks_version(self.user.id), version + 2)
+
+
+class CachedJWTAuthenticationTestCase(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='authcacheuser', password='testpass')
+        cls.client = APIClient()
+        cls.access_token = cls.client.post(
+            reverse('token_obtain_pair'),
+            data={'username': 'authcacheuser', 'password': 'testpass'},
+            format='json'
+        )
+
+    def setUp(self):
+        cache.clear()
+        token_user_cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access_token.data['access']}")
+
+    def user_queries(self, queries):
+        return [q for q in queries if 'auth_user' in q['sql']]
+
+    def test_user_lookup_is_cached(self):
+        """
+        Test only the first request with a token loads the user from the database.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('task-list')).status_code, 200)
+        self.assertEqual(len(self.user_queries(queries)), 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('task-list')).status_code, 200)
+        self.assertEqual(self.user_queries(queries), [])
+
+    def test_shared_cache_is_used_on_local_miss(self):
+        """
+        Test another process (empty local LRU) resolves the user from the shared cache.
+        """
+        self.client.get(reverse('task-list'))
+        token_user_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('task-list')).status_code, 200)
+        self.assertEqual(self.user_queries(queries), [])
+
+    def test_deactivated_user_is_rejected(self):
+        """
+        Test deactivating a user invalidates its cached authentication.
+        """
+        self.assertEqual(self.client.get(reverse('task-list')).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        try:
+            self.assertEqual(self.client.get(reverse('task-list')).status_code, 401)
+        finally:
+            self.user.is_active = True
+            self.user.save()
+
+    def test_password_change_invalidates_cache(self):
+        """
+        Test a password change drops the cached user.
+        """
+        self.client.get(reverse('task-list'))
+        self.assertIsNotNone(token_user_cache.get(self.access_token.data['access'].encode()))
+        self.user.set_password('newpass')
+        self.user.save()
+        self.assertIsNone(token_user_cache.get(self.access_token.data['access'].encode()))
+
+    def test_cached_user_is_read_only(self):
+        """
+        Test the cached user loads other fields on access and refuses to be saved.
+        """
+        user_fields = {'id': self.user.id, 'username': 'authcacheuser', 'is_active': True}
+        user = CachedJWTAuthentication().build_user(user_fields)
+        self.assertEqual(user, self.user)
+        self.assertNotIn('username', user.get_deferred_fields())
+        self.assertIn('password', user.get_deferred_fields())
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('testpass'))
+        with self.assertRaises(NotImplementedError):
+            user.save()
+        with self.assertRaises(NotImplementedError):
+            user.delete()
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('testpass'))
+
+    def test_cache_entry_never_outlives_token(self):
+        """
+        Test entries for expired tokens are not cached.
+        """
+        token = RefreshToken.for_user(self.user).access_token
+        token.set_exp(lifetime=timedelta(seconds=-1))
+        CachedJWTAuthentication().cache_token(b'expired', {'id': self.user.id}, token)
+        self.assertIsNone(token_user_cache.get(b'expired'))
+
+
+class ClientStartupTestCase(SimpleTestCase):
+    """
+    Cold start of `client.py`, which runs one process per command in scripts.
+    """
+    # Import time budget of client.py on top of typer (~130ms on its own, and
+    # needed by every command). Measured at ~15ms with lazy imports versus
+    # ~65ms when requests/urllib3 were imported at module load.
+    CLIENT_IMPORT_BUDGET_MS = 40
+
+    def run_python(self, *args):
+        return subprocess.run(
+            [sys.executable, *args], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        )
+
+    def test_client_import_skips_heavy_modules(self):
+        """
+        Test importing the cli doesn't load modules only some commands need.
+        """
+        output = self.run_python('-c', 'import json, sys, client; print(json.dumps(sorted(sys.modules)))').stdout
+        loaded = set(json.loads(output))
+        for module in ('requests', 'urllib3', 'rich.progress', 'concurrent.futures'):
+            self.assertNotIn(module, loaded)
+
+    def test_client_import_budget(self):
+        """
+        Test `python -X importtime` of the cli stays within CLIENT_IMPORT_BUDGET_MS on top of typer.
+        """
+        def import_ms():
+            cumulative = {}
+            for line in self.run_python('-X', 'importtime', '-c', 'import client').stderr.splitlines():
+                _, _, total, name = (part.strip() for part in line.replace('|', ':').split(':', 3))
+                if total.isdigit():
+                    cumulative[name] = int(total)
+            return (cumulative['client'] - cumulative['typer']) / 1000
+
+        # Best of a few runs, a single run is at the mercy of the machine's load.
+        self.assertLessEqual(min(import_ms() for _ in range(3)), self.CLIENT_IMPORT_BUDGET_MS)
+
+
+class ClientSessionTestCase(SimpleTestCase):
+
+    def test_session_is_shared_and_retries_safely(self):
+        with patch.object(client, '_session', None):
+            session = client.get_session()
+            self.assertIs(client.get_session(), session)
+        retry = session.get_adapter(client.SERVER_URL).max_retries
+        self.assertEqual(retry.total, client.CLIENT_RETRIES)
+        self.assertEqual(set(retry.status_forcelist), {502, 503, 504})
+        # A POST reaching the server isn't sent again, a create would be duplicated
+        self.assertNotIn('POST', retry.allowed_methods)
+
+    def test_default_timeout(self):
+        request = Mock()
+        request_with_timeout = client._with_default_timeout(request, (1, 2))
+        request_with_timeout('GET', 'http://server/')
+        request.assert_called_with('GET', 'http://server/', timeout=(1, 2))
+        request_with_timeout('GET', 'http://server/', timeout=5)
+        request.assert_called_with('GET', 'http://server/', timeout=5)
+
+
+class ClientBulkTestCase(SimpleTestCase):
+    """
+    Test the bulk command against a stubbed session.
+    """
+
+    def setUp(self):
+        self.session = Mock()
+        self.session.post.return_value = Mock(status_code=201)
+        self.session.put.return_value = Mock(status_code=400, reason='Bad Request', json=lambda: {'error': 'Invalid'})
+        self.session.delete.return_value = Mock(status_code=204)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name)
+        for target, value in (('get_session', lambda: self.session), ('console', Console(file=io.StringIO()))):
+            patcher = patch.object(client, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_bulk(self, rows, **kwargs):
+        path = self.path / 'tasks.ndjson'
+        path.write_text(''.join(json.dumps(row) + '\n' for row in rows))
+        options = {'operation': None, 'file_format': None, 'concurrency': 2, 'retry_file': None, **kwargs}
+        client.bulk(access_token='token', file=path, **options)
+        return path
+
+    def test_failed_rows_are_written_for_retry(self):
+        task_id = str(uuid.uuid4())
+        rows = [
+            {'name': 'Bulk CLI'},
+            {'op': 'update', 'task_id': task_id, 'status': 'ru'},
+            ['not', 'an', 'object'],
+            {'op': 'delete'},
+        ]
+        with self.assertRaises(client.typer.Exit):
+            self.run_bulk(rows, operation='create')
+        self.session.post.assert_called_once_with(
+            f'{client.SERVER_URL}api/tasks/', json={'name': 'Bulk CLI'}, headers={'Authorization': 'Bearer token'}
+        )
+        failed = [json.loads(line) for line in (self.path / 'tasks.failed.ndjson').read_text().splitlines()]
+        self.assertCountEqual(failed, [
+            {'op': 'update', 'task_id': task_id, 'status': 'ru', 'error': 'HTTP 400: Invalid'},
+            {'row': ['not', 'an', 'object'], 'error': 'Row must be an object'},
+            {'op': 'delete', 'error': 'task_id is required to delete a task'},
+        ])
+
+    def test_retry_file_is_removed_when_all_succeed(self):
+        path = self.run_bulk([{'name': f'Bulk CLI {i}'} for i in range(5)], operation='create')
+        self.assertEqual(self.session.post.call_count, 5)
+        self.assertFalse((self.path / 'tasks.failed.ndjson').exists())
+        self.assertTrue(path.exists())
+
+    def test_retry_file_cannot_be_the_input(self):
+        path = self.path / 'tasks.ndjson'
+        with self.assertRaises(client.typer.Exit):
+            self.run_bulk([{'name': 'Bulk CLI'}], operation='create', retry_file=path)
+        self.assertEqual(path.read_text(), json.dumps({'name': 'Bulk CLI'}) + '\n')
+        self.session.post.assert_not_called()
+
+
+class ClientSyncTestCase(SimpleTestCase):
+
+    def test_expired_fresh_sync_is_not_retried(self):
+        """
+        Test a 410 for the cursor of a fresh sync stops the command instead of
+        syncing from scratch again and again.
+        """
+        session = Mock()
+        session.get.return_value = Mock(status_code=410)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        state_path = Path(directory.name) / 'sync.json'
+        state_path.write_text(json.dumps({'since': 'stale', 'tasks': {}}))
+        with patch.object(client, 'get_session', lambda: session), \
+                patch.object(client, 'SYNC_STATE_PATH', str(state_path)), \
+                patch.object(client, 'console', Console(file=io.StringIO())):
+            with self.assertRaises(client.typer.Exit):
+                client.sync_tasks(access_token='token')
+        self.assertEqual(session.get.call_count, 2)
+        self.assertEqual(session.get.call_args.kwargs['params'], {})
+
+
+@patch('apiapp.middleware.REQUEST_METRICS_SAMPLE_RATE', 1)
+class RequestMetricsTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='metricsuser', password='testpass')
+        Task.objects.create(name='Metrics Task', user=cls.user)
+
+    def setUp(self):
+        REQUEST_DURATION.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('task-list'))
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        self.assertIn('auth;dur=', timing)
+        self.assertTrue(timing.split(', ')[-1].startswith('total;dur='))
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('task-list'))
+        self.client.get(reverse('task-list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_count{view="task-list",method="GET",status="200"} 2', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="task-list",method="GET",status="200",le="+Inf"} 2', body)
+        self.assertIn('http_request_db_queries_bucket{view="task-list",method="GET",le="+Inf"}', body)
+
+    def test_unsampled_requests_are_not_timed(self):
+        with patch('apiapp.middleware.REQUEST_METRICS_SAMPLE_RATE', 0):
+            response = self.client.get(reverse('task-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('view="task-list"', '\n'.join(REQUEST_DURATION.render()))
+
+    @override_settings(ROOT_URLCONF=AsyncTaskUrls)
+    async def test_async_views_are_timed(self):
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        response = await self.async_client.get(reverse('task-list'), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('auth;dur=', response['Server-Timing'])
+        self.assertIn('queries"', response['Server-Timing'])
+
+
+class HistogramTestCase(SimpleTestCase):
+
+    def test_render_is_cumulative(self):
+        histogram = Histogram('test_seconds', 'Test.', ('view',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value, view='a"b')
+        self.assertEqual(histogram.render(), [
+            '# HELP test_seconds Test.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{view="a\\"b",le="0.1"} 1',
+            'test_seconds_bucket{view="a\\"b",le="1"} 3',
+            'test_seconds_bucket{view="a\\"b",le="+Inf"} 4',
+            'test_seconds_sum{view="a\\"b"} 6.05',
+            'test_seconds_count{view="a\\"b"} 4',
+        ])
+
+
+    def test_failing_collector_is_skipped(self):
+        registry = Registry()
+        counter = registry.register(Counter('test_total', 'Test.'))
+        counter.inc()
+
+        def broken():
+            raise ConnectionError('broker down')
+
+        registry.register_collector(broken)
+        with self.assertLogs('apiapp.metrics', 'ERROR'):
+            self.assertIn('test_total 1\n', registry.render())
+
+
+class TaskMetricsTestCase(SimpleTestCase):
+    """
+    Test the Celery signal handlers recording task telemetry.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def run_signals(self, state='SUCCESS', **request):
+        run_task.push_request(id='metrics-task', delivery_info={'routing_key': 'high'}, **request)
+        try:
+            task_started(task_id='metrics-task', task=run_task)
+            task_finished(task_id='metrics-task', task=run_task, state=state)
+        finally:
+            run_task.pop_request()
+
+    def render(self):
+        return '\n'.join(line for metric in collect_task_metrics() for line in metric.render())
+
+    def test_publish_stamps_header(self):
+        headers = {}
+        stamp_published_at(headers=headers)
+        self.assertAlmostEqual(headers['published_at'], time.time(), delta=1)
+
+    def test_records_queue_wait_run_time_and_state(self):
+        self.run_signals(published_at=time.time() - 2)
+        self.run_signals(state='FAILURE', published_at=time.time() - 2)
+        body = self.render()
+        labels = 'task="apiapp.tasks.run_task",queue="high"'
+        self.assertIn(f'celery_task_queue_wait_seconds_bucket{{{labels},le="1"}} 0', body)
+        self.assertIn(f'celery_task_queue_wait_seconds_bucket{{{labels},le="2.5"}} 2', body)
+        self.assertIn(f'celery_task_run_seconds_count{{{labels}}} 2', body)
+        self.assertIn(f'celery_task_runs_total{{{labels},state="SUCCESS"}} 1', body)
+        self.assertIn(f'celery_task_runs_total{{{labels},state="FAILURE"}} 1', body)
+
+    def test_queue_wait_starts_at_eta(self):
+        self.run_signals(published_at=time.time() - 60, eta=timezone.now().isoformat())
+        self.assertIn(
+            'celery_task_queue_wait_seconds_bucket{task="apiapp.tasks.run_task",queue="high",le="0.5"} 1',
+            self.render(),
+        )
+
+    def test_worker_buffers_until_flush(self):
+        buffer = TaskMetricsBuffer(flush_seconds=60)
+        buffer.start()
+        self.addCleanup(buffer.close)
+        buffer.add([('task-metrics:test', 2)])
+        buffer.add([('task-metrics:test', 3)])
+        self.assertIsNone(cache.get('task-metrics:test'))
+        buffer.flush()
+        self.assertEqual(cache.get('task-metrics:test'), 5)
+
+    def test_queue_depths(self):
+        with Connection('memory://') as connection:
+            queue = connection.SimpleQueue('bulk')
+            self.addCleanup(queue.clear)
+            queue.put({'n': 1})
+            queue.put({'n': 2})
+            with patch.object(celery_app, 'connection_for_read', lambda: Connection('memory://')):
+                self.assertEqual(queue_depths(), {'high': 0, 'celery': 0, 'bulk': 2})
+
+
+class TaskValuesSerializerTestCase(TestCase):
+    """
+    Test the values_list fast path renders the same bytes as the serializers.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='valuesuser', password='testpass')
+        Task.objects.bulk_create(
+            Task(name=f'Values {status} {priority}', status=status, priority=priority, user=cls.user)
+            for status in Task.TaskStatus.values
+            for priority in Task.Priority.values
+        )
+        cls.queryset = Task.objects.filter(user=cls.user).order_by('created_at', 'task_id')
+
+    def assertSameOutput(self, serializer_class):
+        fast = TaskValuesSerializer(serializer_class)
+        self.assertEqual(
+            JSONRenderer().render(fast.many(fast.values(self.queryset))),
+            JSONRenderer().render(serializer_class(self.queryset, many=True).data),
+        )
+
+    def test_matches_serializers(self):
+        for serializer_class in (TaskViewSerializer, TaskViewInDetailSerializer):
+            with self.subTest(serializer_class.__name__):
+                self.assertSameOutput(serializer_class)
+
+    def test_matches_in_other_time_zone(self):
+        with timezone.override('Asia/Kolkata'):
+            self.assertSameOutput(TaskViewInDetailSerializer)
+
+    def test_extra_columns_are_not_rendered(self):
+        fast = TaskValuesSerializer(TaskViewSerializer)
+        row = fast.values(self.queryset, 'created_at', 'task_id', named=True).first()
+        self.assertEqual(row._fields, ('task_id', 'status', 'created_at'))
+        self.assertEqual(list(fast.to_representation(row)), ['task_id', 'status'])
+
+    def test_export_matches_serializer(self):
+        expected = ''.join(json.dumps(TaskViewInDetailSerializer(task).data) + '\n' for task in self.queryset)
+        self.assertEqual(''.join(export_tasks(self.queryset, 'ndjson', chunk_size=5)), expected)
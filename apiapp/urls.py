@@ -1,4 +1,6 @@
+from django.conf import settings
 from rest_framework.routers import DefaultRouter
+from apiapp import async_views
 from apiapp.views import TaskViewSet, user_signup
 from django.urls import path
 from rest_framework_simplejwt.views import (
@@ -8,8 +10,28 @@ from rest_framework_simplejwt.views import (
 
 router = DefaultRouter()
 router.register(r'tasks', TaskViewSet, basename='task')
+
+# Async variant of the task list/detail endpoints, served instead of the
+# TaskViewSet routes when TASK_API_ASYNC is set. Bulk actions stay on TaskViewSet.
+async_task_urls = [
+    path('tasks/', async_views.task_list, name='task-list'),
+    path('tasks/<str:pk>/', async_views.task_detail, name='task-detail'),
+]
+
+
+def get_task_urls(use_async=False):
+    if not use_async:
+        return router.urls
+    # Router action routes (tasks/bulk/...) are listed before the detail route
+    # they would otherwise collide with, so keep them first.
+    sync_urls = [url for url in router.urls if url.name not in ('task-list', 'task-detail')]
+    return sync_urls + async_task_urls
+
+
 urlpatterns = [
     path('user-signup/', user_signup, name='user-signup'),
+    # Before the task routes, `tasks/<pk>/` would match it otherwise
+    path('tasks/events/', async_views.task_events, name='task-events'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-] + router.urls
+] + get_task_urls(settings.TASK_API_ASYNC)
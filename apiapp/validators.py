@@ -12,3 +12,15 @@ def validate_uuid(uuid_to_test, version=4):
     except ValueError:
         return False
     return str(val) == uuid_to_test
+
+
+def validate_timer(timer):
+    """
+    Validate a task timer value.
+    :param timer: Timer duration in seconds (int or numeric string)
+    :return: True if it is a non-negative integer, False otherwise
+    """
+    try:
+        return int(timer) >= 0
+    except (TypeError, ValueError):
+        return False
@@ -1,37 +1,57 @@
 from rest_framework import viewsets
 from rest_framework.response import Response
-from .models import Task
+from rest_framework.decorators import action
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from .models import Task, TaskStats
 from apiapp.serializers import (
     TaskSerializer,
+    TaskValuesSerializer,
     TaskViewSerializer,
     TaskUpdateSerializer,
     TaskViewInDetailSerializer,
 )
-from apiapp.validators import validate_uuid
+from apiapp.validators import validate_uuid, validate_timer
+from apiapp.pagination import TaskKeysetPagination
 from rest_framework.decorators import api_view
 from django.contrib.auth import get_user_model
-from apiapp.tasks import run_task
+from apiapp.outbox import enqueue_task_runs
+from apiapp.cache import cached_task_data, invalidate_user_tasks
+from apiapp.export import EXPORT_CONTENT_TYPES, export_tasks
+from apiapp.events import events_enabled, publish_task_events
+from apiapp.metrics import REGISTRY
+from apiapp.changes import ChangesExpired, task_changes
+from apiapp.conditional import detail_validators, list_validators, not_modified, page_validators, set_validators
 from apiapp.helpers import (
     validate_updation_status,
     DEFAULT_TASK_RUNTIME,
     TASK_STATUS_MAP,
+    TASK_BULK_MAX_SIZE,
+    TASK_CHANGES_PAGE_SIZE,
+    TASK_MAX_PAGE_SIZE,
 )
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from apiapp.authentication import CachedJWTAuthentication
 from rest_framework.decorators import (
     api_view,
     permission_classes,
     authentication_classes,
 )
 import logging
+import uuid
 
 
 logger = logging.getLogger(__name__)
 
+# Keys accepted in the `filter` of bulk updates and deletes
+BULK_FILTER_KEYS = ("status", "created_before", "created_after")
+
 
 class TaskViewSet(viewsets.ViewSet):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = TaskKeysetPagination
 
     def get_queryset(self, user):
         return Task.objects.filter(user=user)
@@ -43,13 +63,123 @@ class TaskViewSet(viewsets.ViewSet):
         args:
             request: The HTTP request object.
             status: Optional filter for task status.
+            cursor: Optional opaque cursor returned by a previous page.
+            page_size: Optional page size, capped at TASK_MAX_PAGE_SIZE.
+
+        Responses carry an ETag, a request sending it back as If-None-Match
+        gets a 304 while none of the listed tasks changed.
         """
+        url = request.build_absolute_uri()
+        paginator = self.pagination_class()
+        data = None
+        if paginator.is_requested(request):
+            # A page's validators come from its own rows, an aggregate over every
+            # task would make each page cost as much as the whole list.
+            data, etag = cached_task_data(
+                request.user.id, f"page-etag:{url}", lambda: self._page_data(request, paginator)
+            )
+        else:
+            # Validators only change on writes, which bump the cache version, so they are cached too.
+            etag = cached_task_data(
+                request.user.id, f"etag:{url}",
+                lambda: list_validators(request.user.id, url, self._list_queryset(request)),
+            )
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        if data is None:
+            data = cached_task_data(request.user.id, url, lambda: self._list_data(request))
+        return set_validators(Response(data), etag)
+
+    def _list_queryset(self, request):
         status_filter = request.query_params.get("status", None)
         queryset = self.get_queryset(request.user).order_by("created_at")
         if TASK_STATUS_MAP.get(status_filter):
             queryset = queryset.filter(status=status_filter)
-        serializer = TaskViewSerializer(queryset, many=True)
-        return Response(serializer.data)
+        return queryset
+
+    def _list_data(self, request):
+        serializer = TaskValuesSerializer(TaskViewSerializer)
+        return serializer.many(serializer.values(self._list_queryset(request)))
+
+    def _page_data(self, request, paginator):
+        """
+        (data, etag) of the requested page.
+        """
+        serializer = TaskValuesSerializer(TaskViewSerializer)
+        # `created_at` for the next page's cursor, `updated_at` for the validators
+        rows = serializer.values(self._list_queryset(request), "created_at", "updated_at", named=True)
+        page = paginator.paginate_queryset(rows, request, view=self)
+        etag = page_validators(request.user.id, request.build_absolute_uri(), page, paginator.next_cursor)
+        return paginator.get_paginated_data(serializer.many(page)), etag
+
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        """
+        Stream every task of the authenticated user as NDJSON or CSV.
+
+        Unlike `list`, rows are read through a server-side cursor and written as
+        they are fetched, so memory use doesn't grow with the number of tasks.
+
+        args:
+            request: The HTTP request object.
+            file_format: Optional output format, ndjson (default) or csv.
+            status: Optional filter for task status.
+        """
+        # `format` is taken by DRF's format suffix/content negotiation.
+        file_format = request.query_params.get("file_format", "ndjson")
+        if file_format not in EXPORT_CONTENT_TYPES:
+            return Response({"error": "file_format must be one of: ndjson, csv"}, status=400)
+        status_filter = request.query_params.get("status", None)
+        queryset = self.get_queryset(request.user).order_by("created_at", "task_id")
+        if TASK_STATUS_MAP.get(status_filter):
+            queryset = queryset.filter(status=status_filter)
+
+        response = StreamingHttpResponse(
+            export_tasks(queryset, file_format), content_type=EXPORT_CONTENT_TYPES[file_format]
+        )
+        response["Content-Disposition"] = f'attachment; filename="tasks.{file_format}"'
+        logger.info(f"[export] Streaming {file_format} export for user {request.user.id}")
+        return response
+
+    @action(detail=False, methods=["get"], url_path="changes")
+    def changes(self, request):
+        """
+        Incremental change feed of the authenticated user's tasks.
+
+        Returns the tasks created, updated or deleted after `since`, oldest
+        first, and the `since` cursor to send on the next call. Deleted tasks
+        are reported with `"deleted": true`. Without `since` all tasks are
+        returned. A 410 means the cursor expired and the client must sync from scratch.
+
+        args:
+            request: The HTTP request object.
+            since: Optional cursor returned by the previous call.
+            limit: Optional number of changes per call, capped at TASK_MAX_PAGE_SIZE.
+        """
+        try:
+            limit = int(request.query_params.get("limit", TASK_CHANGES_PAGE_SIZE))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=400)
+        limit = min(max(limit, 1), TASK_MAX_PAGE_SIZE)
+        try:
+            data = task_changes(request.user, request.query_params.get("since"), limit)
+        except ChangesExpired:
+            logger.error(f"[changes] Expired cursor for user {request.user.id}")
+            return Response({"error": "since cursor expired, sync from scratch"}, status=410)
+        return Response(data)
+
+    @action(detail=False, methods=["get"], url_path="stats")
+    def stats(self, request):
+        """
+        Number of the authenticated user's tasks, in total and per status.
+
+        Read from the counters kept in `TaskStats`, not counted from the tasks.
+
+        args:
+            request: The HTTP request object.
+        """
+        return Response(TaskStats.for_user(request.user.id))
 
     def retrieve(self, request, pk=None):
         """
@@ -62,12 +192,28 @@ class TaskViewSet(viewsets.ViewSet):
         if not (pk and validate_uuid(pk)):
             logger.error(f"[retrieve] Invalid task ID: {pk}")
             return Response({"error": "Invalid task ID"}, status=400)
-        task = self.get_queryset(request.user).filter(task_id=pk).first()
-        if task is None:
+        # The validators come from the row fetched for the response, a 304
+        # saves its serialization.
+        entry = cached_task_data(request.user.id, f"task:{pk}", lambda: self._retrieve_data(request, pk))
+        if entry is None:
             logger.error(f"[retrieve] Task not found for ID: {pk}")
             return Response(status=404)
+        updated_at, data = entry
+        etag, last_modified = detail_validators(request.user.id, pk, updated_at)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        return set_validators(Response(data), etag, last_modified)
+
+    def _retrieve_data(self, request, pk):
+        """
+        (updated_at, data) of the task, None if not found.
+        """
+        task = self.get_queryset(request.user).filter(task_id=pk).first()
+        if task is None:
+            return None
         serializer = TaskViewInDetailSerializer(task)
-        return Response(serializer.data)
+        return task.updated_at, serializer.data
 
     def _fork_task(self, task_id, user):
         task = (
@@ -82,20 +228,33 @@ class TaskViewSet(viewsets.ViewSet):
         new_task = TaskSerializer(
             data={
                 "name": f"{task.name}-forked",
-            }
+            },
+            context={"user_id": user.id},
         )
         if new_task.is_valid():
-            new_task_instance = new_task.save()
+            new_task_instance = new_task.save(user=user)
+            invalidate_user_tasks(user.id)
+            publish_task_events(user.id, [(new_task_instance.task_id, new_task_instance.status)])
             # Return the new task details
             serializer = TaskSerializer(new_task_instance, context={"user_id": user.id})
             return Response(serializer.data)
         return Response(new_task.errors, status=400)
 
-    def _run_task(self, task: Task, timer=DEFAULT_TASK_RUNTIME):
-        if task.status == Task.TaskStatus.RUNNING:
-            # If the task is running, start the task
-            run_task.delay(task.task_id, int(timer))
-            logger.info(f"[run_task] Task {task.task_id} is already running.")
+    def _run_task(self, task_id, timer=DEFAULT_TASK_RUNTIME, priority=Task.Priority.NORMAL):
+        # Start a task which was just moved to running
+        self._run_tasks([(task_id, int(timer), priority)])
+
+    def _run_tasks(self, task_runs):
+        """
+        Queue running tasks for dispatch to Celery through the outbox.
+        Called inside the transaction of the write, the outbox relay publishes
+        them once it is committed.
+
+        args:
+            task_runs: List of (task_id, timer, priority) tuples.
+        """
+        enqueue_task_runs(task_runs)
+        logger.info(f"[run_task] Queued {len(task_runs)} running tasks.")
 
     def create(self, request):
         """
@@ -105,6 +264,7 @@ class TaskViewSet(viewsets.ViewSet):
             request: The HTTP request object containing task data.
             timer: Optional timer duration for the task.
             status: Optional status of the task.
+            priority: Optional priority of the task (hi, nm or lo).
         """
         task_id = request.data.get("fork_task_id", None)
         if task_id and validate_uuid(task_id):
@@ -112,17 +272,96 @@ class TaskViewSet(viewsets.ViewSet):
 
         serializer = TaskSerializer(data=request.data, context={"user_id": request.user.id})
         if serializer.is_valid():
-            task = serializer.save()
-            task.user = request.user
-            task.save()
+            with transaction.atomic():
+                task = serializer.save(user=request.user)
+                invalidate_user_tasks(request.user.id)
+                publish_task_events(request.user.id, [(task.task_id, task.status)])
+                if task.status == Task.TaskStatus.RUNNING:
+                    self._run_task(task.task_id, request.data.get("timer", DEFAULT_TASK_RUNTIME), task.priority)
             logger.info(
                 f"[create] Task created with ID: {task.task_id} - {task.created_at}"
             )
-            self._run_task(task, request.data.get("timer", DEFAULT_TASK_RUNTIME))
             return Response({"message": "Task created successfully"}, status=201)
         logger.error(f"[create] Task creation failed: {serializer.errors}")
         return Response(serializer.errors, status=400)
 
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request):
+        """
+        Create many tasks in one request.
+
+        Name uniqueness is checked for the whole batch with one query, valid tasks
+        are inserted with a single bulk insert and running tasks are queued for
+        dispatch in the same transaction. Invalid items are reported per index and skipped.
+
+        args:
+            request: The HTTP request object containing a list of tasks
+                (or {"tasks": [...]}), each with name, optional status, priority and timer.
+        """
+        items = request.data.get("tasks") if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({"error": "Expected a non-empty list of tasks"}, status=400)
+        if len(items) > TASK_BULK_MAX_SIZE:
+            return Response({"error": f"At most {TASK_BULK_MAX_SIZE} tasks per request"}, status=400)
+
+        errors = {}
+        valid = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors[index] = {"error": "Invalid task data"}
+                continue
+            timer = item.get("timer", DEFAULT_TASK_RUNTIME)
+            if not validate_timer(timer):
+                errors[index] = {"timer": ["Timer must be a non-negative integer."]}
+                continue
+            # No user_id in context: name uniqueness is checked below for the whole batch.
+            serializer = TaskSerializer(data=item)
+            if not serializer.is_valid():
+                errors[index] = serializer.errors
+                continue
+            valid.append((index, serializer.validated_data, int(timer)))
+
+        names = [data["name"] for _, data, _ in valid]
+        existing = set(
+            self.get_queryset(request.user).filter(name__in=names).values_list("name", flat=True)
+        )
+        tasks = []
+        timers = {}
+        seen = set()
+        for index, data, timer in valid:
+            if data["name"] in existing or data["name"] in seen:
+                errors[index] = {"name": ["Task with this name already exists."]}
+                continue
+            seen.add(data["name"])
+            task = Task(**data, user=request.user)
+            tasks.append((index, task))
+            timers[task.task_id] = timer
+
+        try:
+            with transaction.atomic():
+                Task.objects.bulk_create([task for _, task in tasks])
+                invalidate_user_tasks(request.user.id)
+                publish_task_events(request.user.id, [(task.task_id, task.status) for _, task in tasks])
+                self._run_tasks(
+                    [
+                        (task.task_id, timers[task.task_id], task.priority)
+                        for _, task in tasks
+                        if task.status == Task.TaskStatus.RUNNING
+                    ]
+                )
+        except IntegrityError:
+            logger.error("[bulk_create] Task names conflict with a concurrent write")
+            return Response({"error": "Task names conflict with a concurrent write, retry the request"}, status=409)
+
+        logger.info(f"[bulk_create] Created {len(tasks)} tasks, {len(errors)} failed")
+        return Response(
+            {
+                "created": [{"index": index, "task_id": task.task_id} for index, task in tasks],
+                "errors": [{"index": index, "errors": errors[index]} for index in sorted(errors)],
+            },
+            status=201 if tasks else 400,
+        )
+
     def update(self, request, pk=None):
         """
         Update an existing task.
@@ -134,27 +373,51 @@ class TaskViewSet(viewsets.ViewSet):
             status: Optional new status for the task.
             name: Optional new name for the task.
             timer: Optional new timer duration for the running task.
+            priority: Optional new priority (hi, nm or lo), picks the queue of the next run.
         """
         if not (pk and validate_uuid(pk)):
             logger.error(f"[update] Invalid task ID: {pk}")
             return Response({"error": "Invalid task ID"}, status=400)
-        task = self.get_queryset(request.user).filter(task_id=pk).first()
-        if task is None:
-            logger.error(f"[update] Task not found for ID: {pk}")
-            return Response({"error": f"Task with id:-{pk} not found"}, status=404)
-
         if "status" in request.data:
             if validate_updation_status(request.data["status"]) is False:
                 logger.error(f'[update] Invalid status value: {request.data["status"]}')
                 return Response({"error": "Invalid status value"}, status=400)
+        timer = request.data.get("timer", DEFAULT_TASK_RUNTIME)
+        if not validate_timer(timer):
+            return Response({"error": "Timer must be a non-negative integer"}, status=400)
 
-        serializer = TaskUpdateSerializer(task, data=request.data, partial=True, context={"user_id": request.user.id})
-        if serializer.is_valid():
-            task = serializer.save()
-            self._run_task(task, request.data.get("timer", DEFAULT_TASK_RUNTIME))
-            logger.info(f"[update] Task updated successfully: {task.task_id}")
-            return Response({"message": "Task updated successfully"}, status=200)
-        return Response(serializer.errors, status=400)
+        serializer = TaskUpdateSerializer(data=request.data, partial=True, context={"user_id": request.user.id})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        fields = dict(serializer.validated_data)
+        status = fields.pop("status", None)
+
+        # Status goes through a compare-and-set transition and other fields through a
+        # plain UPDATE, so no stale read is ever written back over a concurrent change.
+        queryset = self.get_queryset(request.user).filter(task_id=pk)
+        with transaction.atomic():
+            updated = True
+            if status is not None:
+                updated = queryset.transition(status) == 1
+            if updated and fields:
+                updated = queryset.update(**fields) == 1
+            if not (status or fields):
+                updated = queryset.exists()
+            if not updated:
+                if status is None or not queryset.exists():
+                    logger.error(f"[update] Task not found for ID: {pk}")
+                    return Response({"error": f"Task with id:-{pk} not found"}, status=404)
+                logger.error(f"[update] Task {pk} can't move to status {status}")
+                return Response({"error": f"Task with id:-{pk} can't move to status {status}"}, status=409)
+            if status == Task.TaskStatus.RUNNING:
+                priority = fields.get("priority") or queryset.values_list("priority", flat=True).first()
+                self._run_task(uuid.UUID(pk), timer, priority)
+            invalidate_user_tasks(request.user.id)
+            if status is not None:
+                publish_task_events(request.user.id, [(uuid.UUID(pk), status)])
+
+        logger.info(f"[update] Task updated successfully: {pk}")
+        return Response({"message": "Task updated successfully"}, status=200)
 
     def destroy(self, request, pk=None):
         """
@@ -165,13 +428,129 @@ class TaskViewSet(viewsets.ViewSet):
         """
         if not (pk and validate_uuid(pk)):
             return Response({"error": "Invalid task ID"}, status=400)
-        task = self.get_queryset(request.user).filter(task_id=pk).first()
-        if task is None:
+        # Queryset delete, which leaves a tombstone for the change feed
+        deleted, _ = self.get_queryset(request.user).filter(task_id=pk).delete()
+        if not deleted:
             return Response(status=404)
-        task.delete()
+        invalidate_user_tasks(request.user.id)
         logger.info(f"[destroy] Task deleted successfully: {pk}")
         return Response({"message": f"Task {pk} deleted successfully"}, status=204)
 
+    def _bulk_queryset(self, request):
+        """
+        Build the queryset targeted by a bulk request.
+
+        The request selects tasks either by `task_ids` or by a `filter` with an
+        optional `status` and `created_before`/`created_after` ISO datetimes.
+        Both can be combined; at least one is required, and a filter with any
+        other key is rejected, so a bulk request never targets every task by
+        accident (a typo in a filter key would otherwise match them all).
+
+        returns:
+            (queryset, None) or (None, error response)
+        """
+        task_ids = request.data.get("task_ids")
+        filters = request.data.get("filter")
+        if not task_ids and not filters:
+            return None, Response({"error": "Either task_ids or filter is required"}, status=400)
+
+        queryset = self.get_queryset(request.user)
+        if task_ids:
+            if not isinstance(task_ids, list) or len(task_ids) > TASK_BULK_MAX_SIZE:
+                return None, Response(
+                    {"error": f"task_ids must be a list of at most {TASK_BULK_MAX_SIZE} IDs"}, status=400
+                )
+            invalid_ids = [task_id for task_id in task_ids if not (isinstance(task_id, str) and validate_uuid(task_id))]
+            if invalid_ids:
+                return None, Response({"error": "Invalid task ID", "task_ids": invalid_ids}, status=400)
+            queryset = queryset.filter(task_id__in=task_ids)
+
+        if filters:
+            if not isinstance(filters, dict):
+                return None, Response({"error": "Invalid filter"}, status=400)
+            unknown_keys = sorted(set(filters) - set(BULK_FILTER_KEYS))
+            if unknown_keys:
+                return None, Response({"error": "Unknown filter keys", "keys": unknown_keys}, status=400)
+            if "status" in filters:
+                if not isinstance(filters["status"], str) or not TASK_STATUS_MAP.get(filters["status"]):
+                    return None, Response({"error": "Invalid status filter"}, status=400)
+                queryset = queryset.filter(status=filters["status"])
+            for key, lookup in (("created_before", "created_at__lt"), ("created_after", "created_at__gt")):
+                if key in filters:
+                    try:
+                        value = parse_datetime(filters[key])
+                    except (TypeError, ValueError):
+                        value = None
+                    if value is None:
+                        return None, Response({"error": f"Invalid {key} datetime"}, status=400)
+                    queryset = queryset.filter(**{lookup: value})
+        return queryset, None
+
+    @action(detail=False, methods=["post"], url_path="bulk-update")
+    def bulk_update(self, request):
+        """
+        Move many tasks to a new status with one set-based UPDATE.
+
+        args:
+            request: The HTTP request object.
+
+            status: New status for the tasks (ru, fa or co).
+            task_ids: Optional list of task IDs to update.
+            filter: Optional filter, e.g. {"status": "fa", "created_before": "2025-01-01T00:00:00Z"}.
+            timer: Optional timer duration when moving tasks to running.
+        """
+        status = request.data.get("status")
+        if not isinstance(status, str) or validate_updation_status(status) is False:
+            logger.error(f"[bulk_update] Invalid status value: {status}")
+            return Response({"error": "Invalid status value"}, status=400)
+        status = TASK_STATUS_MAP[status.strip().lower()]
+        timer = request.data.get("timer", DEFAULT_TASK_RUNTIME)
+        if not validate_timer(timer):
+            return Response({"error": "Timer must be a non-negative integer"}, status=400)
+
+        queryset, error = self._bulk_queryset(request)
+        if error:
+            return error
+        with transaction.atomic():
+            if status == Task.TaskStatus.RUNNING or events_enabled():
+                # Running tasks have to be dispatched and status events name each
+                # task, so lock and collect their IDs first.
+                task_priorities = list(
+                    queryset.filter(status__in=Task.transition_sources(status))
+                    .select_for_update()
+                    .values_list("task_id", "priority")
+                )
+                task_ids = [task_id for task_id, _ in task_priorities]
+                updated = Task.objects.filter(task_id__in=task_ids).transition(status)
+                if status == Task.TaskStatus.RUNNING:
+                    self._run_tasks([(task_id, int(timer), priority) for task_id, priority in task_priorities])
+                publish_task_events(request.user.id, [(task_id, status) for task_id in task_ids])
+            else:
+                updated = queryset.transition(status)
+            invalidate_user_tasks(request.user.id)
+        logger.info(f"[bulk_update] {updated} tasks moved to status {status}")
+        return Response({"updated": updated}, status=200)
+
+    @action(detail=False, methods=["post"], url_path="bulk-delete")
+    def bulk_delete(self, request):
+        """
+        Delete many tasks with one set-based DELETE.
+
+        args:
+            request: The HTTP request object.
+
+            task_ids: Optional list of task IDs to delete.
+            filter: Optional filter, e.g. {"status": "fa", "created_before": "2025-01-01T00:00:00Z"}.
+        """
+        queryset, error = self._bulk_queryset(request)
+        if error:
+            return error
+        with transaction.atomic():
+            deleted, _ = queryset.delete()
+            invalidate_user_tasks(request.user.id)
+        logger.info(f"[bulk_delete] {deleted} tasks deleted")
+        return Response({"deleted": deleted}, status=200)
+
 
 @api_view(
     ["POST"],
@@ -192,17 +571,11 @@ def user_signup(request):
         )
 
     # Check if user already exists
-    user = get_user_model().objects.filter(username=username).first()
-    if user:
+    if get_user_model().objects.filter(username=username).exists():
         return Response({"error": "User already exists."}, status=400)
 
-    # Create new user
-    user = get_user_model().objects.create(
-        username=username,
-        email=email,
-    )
-    user.set_password(password)
-    user.save()
+    # Create new user, password hashed before the single INSERT
+    get_user_model().objects.create_user(username=username, email=email, password=password)
     logger.info(f"[user_signup] New User created successfully: {username}")
     return Response({"message": "User created successfully."}, status=201)
 
@@ -236,3 +609,10 @@ def get_jwt_token(request):
         },
         status=200,
     )
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint with the metrics of this process.
+    """
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,309 @@
+"""
+Throughput and p50/p95/p99 latency of every task API endpoint.
+
+Seeds `--users` users with `--tasks` tasks each, then sends `--requests`
+requests per endpoint (`--auth-requests` for signup and tokens, which hash
+passwords) through the WSGI app in-process, no network involved. Requests run
+one at a time, rotating over the seeded users; anything a request consumes
+(tasks to update, delete...) is prepared outside the timed call.
+
+`get_jwt_token` isn't routed, it is called as a view. The event stream
+(`tasks/events/`) is left out: it is a long-lived response and needs Redis.
+
+Results go to `--output` as JSON, one entry per endpoint, to keep and diff
+between releases; `--compare` prints the change against an earlier file.
+
+    python -m benchmarks.api --users 10 --tasks 1000 --requests 200 --output api-benchmark.json
+    python -m benchmarks.api --compare api-benchmark-previous.json
+"""
+import argparse
+from dataclasses import dataclass
+import datetime
+import itertools
+import json
+import platform
+import subprocess
+import time
+
+from benchmarks.common import percentile
+
+BULK_SIZE = 10
+PASSWORD = 'bench-pass'
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    data: dict = None
+    token: str = None
+    status: int = 200
+    view: object = None  # call this view directly instead of going through the URL conf
+
+
+class Bench:
+    def __init__(self, users):
+        from django.test import RequestFactory
+
+        self.factory = RequestFactory()
+        self.users = users  # [(user, token)]
+        self.counter = itertools.count()
+
+    def user(self, i):
+        return self.users[i % len(self.users)]
+
+    def new_tasks(self, user, count, status='cr'):
+        from apiapp.models import Task
+
+        n = next(self.counter)
+        tasks = Task.objects.bulk_create(
+            Task(name=f'bench-{n}-{i}', status=status, user=user) for i in range(count)
+        )
+        return [str(task.task_id) for task in tasks]
+
+    def some_task(self, user):
+        from apiapp.models import Task
+
+        return str(Task.objects.filter(user=user).values_list('task_id', flat=True).first())
+
+    def call(self, request):
+        """
+        Send `request`, returning its latency in milliseconds.
+        """
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {request.token}'} if request.token else {}
+        body = json.dumps(request.data) if request.data is not None else ''
+        http_request = self.factory.generic(
+            request.method, request.path, body, content_type='application/json', **headers
+        )
+        if request.view is not None:
+            start = time.perf_counter()
+            response = request.view(http_request)
+            response.render()
+            elapsed = time.perf_counter() - start
+            status, content = response.status_code, response.content
+        else:
+            from taskmanager.wsgi import application
+
+            statuses = []
+            start = time.perf_counter()
+            content = b''.join(
+                application(http_request.environ, lambda status, headers: statuses.append(status))
+            )
+            elapsed = time.perf_counter() - start
+            status = int(statuses[0].split()[0])
+        assert status == request.status, (request.method, request.path, status, content[:200])
+        return elapsed * 1000
+
+
+def signup_requests(bench, count):
+    for _ in range(count):
+        n = next(bench.counter)
+        yield Request('POST', '/api/user-signup/', {
+            'username': f'bench-signup-{n}', 'password': PASSWORD, 'email': f'bench-{n}@example.com',
+        }, status=201)
+
+
+def token_requests(bench, count):
+    for i in range(count):
+        yield Request('POST', '/api/token/', {'username': bench.user(i)[0].username, 'password': PASSWORD})
+
+
+def get_jwt_token_requests(bench, count):
+    from apiapp.views import get_jwt_token
+
+    for i in range(count):
+        yield Request('POST', '/api/token/', {'username': bench.user(i)[0].username, 'password': PASSWORD},
+                      view=get_jwt_token)
+
+
+def list_requests(bench, count):
+    for i in range(count):
+        yield Request('GET', '/api/tasks/', token=bench.user(i)[1])
+
+
+def page_requests(bench, count):
+    for i in range(count):
+        yield Request('GET', '/api/tasks/?page_size=100', token=bench.user(i)[1])
+
+
+def retrieve_requests(bench, count):
+    tasks = [bench.some_task(user) for user, _ in bench.users]
+    for i in range(count):
+        yield Request('GET', f'/api/tasks/{tasks[i % len(tasks)]}/', token=bench.user(i)[1])
+
+
+def create_requests(bench, count):
+    for i in range(count):
+        yield Request('POST', '/api/tasks/', {'name': f'bench-create-{next(bench.counter)}'},
+                      token=bench.user(i)[1], status=201)
+
+
+def fork_requests(bench, count):
+    for i in range(count):
+        user, token = bench.user(i)
+        yield Request('POST', '/api/tasks/', {'fork_task_id': bench.new_tasks(user, 1)[0]}, token=token)
+
+
+def bulk_create_requests(bench, count):
+    for i in range(count):
+        n = next(bench.counter)
+        yield Request('POST', '/api/tasks/bulk/', [{'name': f'bench-bulk-{n}-{j}'} for j in range(BULK_SIZE)],
+                      token=bench.user(i)[1], status=201)
+
+
+def rename_requests(bench, count):
+    tasks = [bench.some_task(user) for user, _ in bench.users]
+    for i in range(count):
+        yield Request('PUT', f'/api/tasks/{tasks[i % len(tasks)]}/', {'name': f'bench-rename-{next(bench.counter)}'},
+                      token=bench.user(i)[1])
+
+
+def run_requests(bench, count):
+    for i in range(count):
+        user, token = bench.user(i)
+        yield Request('PUT', f'/api/tasks/{bench.new_tasks(user, 1)[0]}/', {'status': 'ru'}, token=token)
+
+
+def destroy_requests(bench, count):
+    for i in range(count):
+        user, token = bench.user(i)
+        yield Request('DELETE', f'/api/tasks/{bench.new_tasks(user, 1)[0]}/', token=token, status=204)
+
+
+def bulk_update_requests(bench, count):
+    for i in range(count):
+        user, token = bench.user(i)
+        yield Request('POST', '/api/tasks/bulk-update/',
+                      {'task_ids': bench.new_tasks(user, BULK_SIZE), 'status': 'fa'}, token=token)
+
+
+def bulk_delete_requests(bench, count):
+    for i in range(count):
+        user, token = bench.user(i)
+        yield Request('POST', '/api/tasks/bulk-delete/', {'task_ids': bench.new_tasks(user, BULK_SIZE)}, token=token)
+
+
+def export_requests(bench, count):
+    for i in range(count):
+        yield Request('GET', '/api/tasks/export/', token=bench.user(i)[1])
+
+
+def changes_requests(bench, count):
+    for i in range(count):
+        yield Request('GET', '/api/tasks/changes/', token=bench.user(i)[1])
+
+
+def stats_requests(bench, count):
+    for i in range(count):
+        yield Request('GET', '/api/tasks/stats/', token=bench.user(i)[1])
+
+
+# endpoint: (requests generator, hashes passwords)
+ENDPOINTS = {
+    'POST /api/user-signup/': (signup_requests, True),
+    'POST /api/token/': (token_requests, True),
+    'get_jwt_token': (get_jwt_token_requests, True),
+    'GET /api/tasks/': (list_requests, False),
+    'GET /api/tasks/?page_size=100': (page_requests, False),
+    'GET /api/tasks/<id>/': (retrieve_requests, False),
+    'POST /api/tasks/': (create_requests, False),
+    'POST /api/tasks/ (fork)': (fork_requests, False),
+    f'POST /api/tasks/bulk/ ({BULK_SIZE} tasks)': (bulk_create_requests, False),
+    'PUT /api/tasks/<id>/ (rename)': (rename_requests, False),
+    'PUT /api/tasks/<id>/ (run)': (run_requests, False),
+    'DELETE /api/tasks/<id>/': (destroy_requests, False),
+    f'POST /api/tasks/bulk-update/ ({BULK_SIZE} tasks)': (bulk_update_requests, False),
+    f'POST /api/tasks/bulk-delete/ ({BULK_SIZE} tasks)': (bulk_delete_requests, False),
+    'GET /api/tasks/export/': (export_requests, False),
+    'GET /api/tasks/changes/': (changes_requests, False),
+    'GET /api/tasks/stats/': (stats_requests, False),
+}
+
+
+def run_endpoint(bench, requests, count):
+    latencies = []
+    for request in requests(bench, count + 1):
+        latencies.append(bench.call(request))
+    latencies = latencies[1:]  # warm up
+    return {
+        'requests': count,
+        'requests_per_second': round(count / (sum(latencies) / 1000), 1),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def compare(results, baseline):
+    print(f"\n{'endpoint':<42} {'req/s':>8} {'p50':>8} {'p99':>8}   vs {baseline['meta'].get('revision') or 'baseline'}")
+    for name, result in results['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if not before:
+            continue
+        changes = [
+            (result[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            for key in ('requests_per_second', 'p50_ms', 'p99_ms')
+        ]
+        print(f"{name:<42} " + ' '.join(f'{change:>+7.1f}%' for change in changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--tasks', type=int, default=1000, help='Tasks seeded per user.')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint.')
+    parser.add_argument('--auth-requests', type=int, default=10, help='Requests per signup/token endpoint.')
+    parser.add_argument('--endpoint', action='append', help='Only run endpoints containing this text, repeatable.')
+    parser.add_argument('--output', default='api-benchmark.json')
+    parser.add_argument('--compare', help='Earlier --output file to compare against.')
+    args = parser.parse_args()
+
+    from benchmarks.common import setup_django, seed_user
+
+    setup_django()
+    import django
+
+    users = []
+    for i in range(args.users):
+        user, token = seed_user(f'bench-api-{i}', tasks=args.tasks)
+        users.append((user, token))
+    bench = Bench(users)
+
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'users': args.users,
+            'tasks_per_user': args.tasks,
+        },
+        'endpoints': {},
+    }
+    print(f"{'endpoint':<42} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, (requests, hashes_passwords) in ENDPOINTS.items():
+        if args.endpoint and not any(part in name for part in args.endpoint):
+            continue
+        result = run_endpoint(bench, requests, args.auth_requests if hashes_passwords else args.requests)
+        results['endpoints'][name] = result
+        print(f"{name:<42} {result['requests_per_second']:>8.1f} {result['p50_ms']:>8.2f} "
+              f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+    print(f'\nWrote {args.output}')
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Concurrent-request throughput of the task API: sync views behind the WSGI app
+(taskmanager/wsgi.py) versus the async views behind the ASGI app
+(taskmanager/asgi.py), plus the sync views under ASGI for reference.
+
+Requests are fed to the WSGI/ASGI callables in-process (no sockets), so the
+numbers compare the request-handling stacks, not a web server.
+
+    python -m benchmarks.asgi_vs_wsgi --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MODES = {
+    # mode: (server interface, TASK_API_ASYNC)
+    'wsgi-sync': ('wsgi', False),
+    'asgi-sync': ('asgi', False),
+    'asgi-async': ('asgi', True),
+}
+
+
+def run_wsgi(paths, token, concurrency):
+    from django.test import RequestFactory
+    from taskmanager.wsgi import application
+
+    factory = RequestFactory()
+
+    def call(path):
+        environ = factory.get(path, HTTP_AUTHORIZATION=f'Bearer {token}').environ
+        statuses = []
+        body = b''.join(application(environ, lambda status, headers: statuses.append(status)))
+        assert statuses[0].startswith('200'), (statuses[0], body[:200])
+        return len(body)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        list(executor.map(call, paths))
+        return time.perf_counter() - start
+
+
+def run_asgi(paths, token, concurrency):
+    from taskmanager.asgi import application
+
+    async def call(path, semaphore):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode())],
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+        }
+        messages = []
+        body_sent = False
+        response_done = asyncio.Event()
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # Django listens for a disconnect while handling the request.
+            await response_done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body'):
+                response_done.set()
+
+        async with semaphore:
+            await application(scope, receive, send)
+        assert messages[0]['status'] == 200, messages
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        start = time.perf_counter()
+        await asyncio.gather(*(call(path, semaphore) for path in paths))
+        return time.perf_counter() - start
+
+    return asyncio.run(main())
+
+
+def run_mode(mode, requests, concurrency, tasks):
+    from benchmarks.common import setup_django, seed_user
+
+    interface, use_async = MODES[mode]
+    setup_django(TASK_API_ASYNC=use_async)
+    from apiapp.models import Task
+
+    user, token = seed_user('bench-user', tasks=tasks)
+    task_ids = list(Task.objects.filter(user=user).values_list('task_id', flat=True)[:100])
+    paths = [
+        '/api/tasks/?page_size=50' if i % 2 else f'/api/tasks/{task_ids[i % len(task_ids)]}/'
+        for i in range(requests)
+    ]
+    runner = run_wsgi if interface == 'wsgi' else run_asgi
+    runner(paths[:concurrency], token, concurrency)  # warm up
+    elapsed = runner(paths, token, concurrency)
+    return {'mode': mode, 'requests': requests, 'concurrency': concurrency, 'seconds': elapsed,
+            'requests_per_second': requests / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--tasks', type=int, default=1000, help="Tasks seeded for the benchmark user.")
+    parser.add_argument('--mode', choices=MODES, help="Run a single mode in this process.")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.requests, args.concurrency, args.tasks)))
+        return
+
+    # Each mode runs in its own process: the URL conf is chosen once per process.
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.asgi_vs_wsgi', '--mode', mode, '--requests', str(args.requests),
+             '--concurrency', str(args.concurrency), '--tasks', str(args.tasks)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<12} {result['requests_per_second']:>10.1f} req/s  "
+              f"({result['requests']} requests, concurrency {result['concurrency']})")
+
+
+if __name__ == '__main__':
+    main()
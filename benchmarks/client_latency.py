@@ -0,0 +1,112 @@
+"""
+Per-command latency of `client.py` with a new connection per request (plain
+`requests.get/post/...`, as before the shared session) versus the pooled
+keep-alive session from `client.get_session`.
+
+Commands run back to back through the Typer app, like the `run_api` REPL,
+against a local HTTP/1.1 stub of the task API. The stub answers instantly, so
+the difference is the client's connection setup; over TLS or a real network
+each new connection costs one or more extra round trips on top.
+
+    python -m benchmarks.client_latency --commands 2000
+"""
+import argparse
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import types
+from unittest.mock import patch
+import uuid
+
+from benchmarks.common import percentile
+
+TASK_ID = str(uuid.uuid4())
+RESPONSES = {
+    'GET': (200, [{'task_id': TASK_ID, 'status': 'Created'}]),
+    'POST': (201, {'message': 'Task created successfully'}),
+    'PUT': (200, {'message': 'Task updated successfully'}),
+    'DELETE': (204, None),
+}
+
+
+class StubTaskAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    # Headers and body are separate writes; without TCP_NODELAY a kept-alive
+    # connection waits on delayed ACKs (~40ms), unlike a real server.
+    disable_nagle_algorithm = True
+
+    def respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        status, data = RESPONSES[self.command]
+        body = json.dumps(data).encode() if data is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubTaskAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # clients dropping their connections
+
+
+def run(client, commands):
+    token = 'bench-token'
+    command_args = [
+        ['get-task', '-at', token],
+        ['create-task', '-at', token, '-n', 'bench task'],
+        ['update-task', '-at', token, '-t', TASK_ID, '-s', 'ru'],
+        ['destroy-task', '-at', token, '-t', TASK_ID],
+    ]
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(commands):
+            start = time.perf_counter()
+            try:
+                client.app(args=command_args[i % len(command_args)], prog_name='task-manager-cli')
+            except SystemExit as e:
+                assert not e.code, e.code
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--commands', type=int, default=2000)
+    args = parser.parse_args()
+
+    server = StubTaskAPIServer(('127.0.0.1', 0), StubTaskAPIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['SERVER_URL'] = f'http://127.0.0.1:{server.server_port}/'
+    os.environ['RESPONSE_CACHE_PATH'] = os.path.join(tempfile.mkdtemp(), 'cli-cache.json')
+
+    import requests
+    import client
+
+    # One connection per request, what `requests.get(...)` and friends do.
+    per_request = types.SimpleNamespace(get=requests.get, post=requests.post, put=requests.put, delete=requests.delete)
+    for name, session in (('new connection', lambda: per_request), ('shared session', client.get_session)):
+        with patch('client.get_session', session):
+            run(client, 50)  # warm up
+            latencies = run(client, args.commands)
+        print(f'{name:<15} p50 {percentile(latencies, 50):6.2f} ms  p95 {percentile(latencies, 95):6.2f} ms  '
+              f'p99 {percentile(latencies, 99):6.2f} ms  ({args.commands} commands)')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Shared setup for the benchmark scripts.
+
+Each benchmark runs against a throwaway, migrated SQLite database so it needs
+neither Postgres nor Redis, and is run as a module from the repo root, e.g.
+`python -m benchmarks.asgi_vs_wsgi`.
+"""
+import os
+import tempfile
+
+
+def setup_django(**env):
+    """
+    Point Django at a fresh SQLite database, apply migrations and return its path.
+    Extra keyword arguments are exported as environment variables (settings overrides).
+    """
+    db_file = tempfile.NamedTemporaryFile(prefix='taskmanager-bench-', suffix='.sqlite3', delete=False)
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file.name}'
+    os.environ.setdefault('DEBUG', 'False')
+    os.environ.update({key: str(value) for key, value in env.items()})
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'taskmanager.settings')
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0)
+    return db_file.name
+
+
+def seed_user(username, tasks=0):
+    """
+    Create a user with `tasks` tasks and return (user, access token).
+    """
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from apiapp.models import Task
+
+    user = User.objects.create_user(username=username, password='bench-pass')
+    Task.objects.bulk_create(
+        (Task(name=f'{username}-task-{i}', status=Task.TaskStatus.CREATED, user=user) for i in range(tasks)),
+        batch_size=1000,
+    )
+    return user, str(RefreshToken.for_user(user).access_token)
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of an unsorted list of numbers.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
@@ -0,0 +1,52 @@
+"""
+Completions/sec of `run_task` writing each completion in its own transaction
+(TASK_COMPLETION_BATCH_SIZE=1) versus the worker's completion buffer flushing
+batches as one set-based transition.
+
+Simulates a burst of expired timers: `--tasks` running tasks are completed
+back to back through `run_task(task_id, 0)`, as a worker would run them.
+
+    python -m benchmarks.completions --tasks 20000 --batch-size 500
+"""
+import argparse
+import time
+
+
+def run(buffer, task_ids):
+    from unittest.mock import patch
+    from apiapp.tasks import run_task
+
+    with patch('apiapp.tasks.completion_buffer', buffer):
+        buffer.start()
+        start = time.perf_counter()
+        for task_id in task_ids:
+            run_task(task_id, 0)
+        buffer.close()  # worker shutdown: whatever is left is written too
+        return len(task_ids) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--flush-ms', type=int, default=100)
+    args = parser.parse_args()
+
+    from benchmarks.common import setup_django, seed_user
+
+    setup_django(TASK_CACHE_ENABLED=False)
+    from apiapp.completions import CompletionBuffer
+    from apiapp.models import Task
+
+    for name, batch_size in (('per-task write', 1), (f'buffered ({args.batch_size})', args.batch_size)):
+        user, _ = seed_user(f'bench-completions-{batch_size}', tasks=args.tasks)
+        Task.objects.filter(user=user).transition(Task.TaskStatus.RUNNING)
+        task_ids = list(Task.objects.filter(user=user).values_list('task_id', flat=True))
+        rate = run(CompletionBuffer(batch_size=batch_size, flush_ms=args.flush_ms), task_ids)
+        completed = Task.objects.filter(user=user, status=Task.TaskStatus.COMPLETED).count()
+        assert completed == args.tasks, completed
+        print(f'{name:<18} {rate:>10.1f} completions/s')
+
+
+if __name__ == '__main__':
+    main()
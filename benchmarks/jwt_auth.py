@@ -0,0 +1,60 @@
+"""
+Requests/sec of an authenticated task detail request with simplejwt's
+JWTAuthentication (one auth_user SELECT per request) versus
+CachedJWTAuthentication, through the WSGI app in-process.
+
+    python -m benchmarks.jwt_auth --requests 5000
+"""
+import argparse
+import time
+
+
+def run(authentication_class, path, token, requests):
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+    from apiapp.views import TaskViewSet
+    from taskmanager.wsgi import application
+
+    TaskViewSet.authentication_classes = [authentication_class]
+    environ = RequestFactory().get(path, HTTP_AUTHORIZATION=f'Bearer {token}').environ
+
+    def call():
+        statuses = []
+        b''.join(application(dict(environ), lambda status, headers: statuses.append(status)))
+        assert statuses[0].startswith('200'), statuses[0]
+
+    call()  # warm up
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        for _ in range(requests):
+            call()
+        elapsed = time.perf_counter() - start
+    user_queries = sum('auth_user' in query['sql'] for query in queries)
+    return requests / elapsed, user_queries / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    from benchmarks.common import setup_django, seed_user
+
+    setup_django(TASK_CACHE_ENABLED=False)
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from apiapp.authentication import CachedJWTAuthentication
+    from apiapp.models import Task
+
+    user, token = seed_user('bench-auth-user', tasks=1)
+    path = f'/api/tasks/{Task.objects.get(user=user).task_id}/'
+    for name, authentication_class in (
+        ('JWTAuthentication', JWTAuthentication),
+        ('CachedJWTAuthentication', CachedJWTAuthentication),
+    ):
+        rps, user_queries = run(authentication_class, path, token, args.requests)
+        print(f'{name:<25} {rps:>10.1f} req/s  {user_queries:.2f} auth_user queries/request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Rows/sec of task listings through the DRF serializers (a model instance and
+the field machinery per row) versus `TaskValuesSerializer` (a `values_list`
+tuple and a status/priority label lookup per row).
+
+Fetches and serializes all `--rows` tasks of one user the way `GET /api/tasks/`
+(TaskViewSerializer) and the export (TaskViewInDetailSerializer) do, best of
+`--repeat` runs, and checks both paths render the same JSON.
+
+    python -m benchmarks.list_serialization --rows 100000
+"""
+import argparse
+import time
+
+
+def best_rate(render, rows, repeat):
+    best = min(timed(render) for _ in range(repeat))
+    return rows / best
+
+
+def timed(render):
+    start = time.perf_counter()
+    render()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    from benchmarks.common import setup_django, seed_user
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from apiapp.models import Task
+    from apiapp.serializers import TaskValuesSerializer, TaskViewInDetailSerializer, TaskViewSerializer
+
+    user, _ = seed_user('bench-list-serialization', tasks=args.rows)
+    queryset = Task.objects.filter(user=user).order_by('created_at', 'task_id')
+
+    for name, serializer_class in (('list', TaskViewSerializer), ('export', TaskViewInDetailSerializer)):
+        fast = TaskValuesSerializer(serializer_class)
+        slow_data = serializer_class(queryset, many=True).data
+        fast_data = fast.many(fast.values(queryset))
+        assert JSONRenderer().render(fast_data) == JSONRenderer().render(slow_data), name
+
+        slow = best_rate(lambda: serializer_class(queryset.all(), many=True).data, args.rows, args.repeat)
+        quick = best_rate(lambda: fast.many(fast.values(queryset)), args.rows, args.repeat)
+        print(f'{name:<7} {serializer_class.__name__:<27} {slow:>10.0f} rows/s')
+        print(f'{name:<7} {"TaskValuesSerializer":<27} {quick:>10.0f} rows/s  ({quick / slow:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Tail latency of high priority task runs under a flood of low priority ones,
+with every run on one shared queue (as before priorities) versus routed by
+`apiapp.outbox.task_queue` to queues with their own workers.
+
+Runs real `run_task` completions through Celery workers started in-process on
+the in-memory broker, with the same number of workers in both setups: all of
+them on the shared queue, or split between the bulk and high queues. Latency
+is measured from the outbox relay publishing a run to the worker finishing it.
+On SQLite the workers still queue for the single database write lock, which is
+most of what is left of the routed latency; on Postgres completions of
+different tasks don't wait on each other.
+
+    python -m benchmarks.queue_latency --flood 2000 --high 50
+"""
+import argparse
+import contextlib
+import time
+from unittest.mock import patch
+
+from benchmarks.common import percentile
+
+
+def run(app, user, flood, high, interval, worker_queues, route):
+    from celery.contrib.testing.worker import start_worker
+    from celery.signals import task_postrun
+    from django.db import transaction
+    from apiapp.models import Task
+    from apiapp.outbox import drain_outbox, enqueue_task_runs
+
+    finished = {}
+
+    def record_finish(args=None, **kwargs):
+        finished[str(args[0])] = time.perf_counter()
+
+    def create_running(prefix, count, priority):
+        tasks = Task.objects.bulk_create(
+            Task(name=f'{prefix}-{i}', status=Task.TaskStatus.RUNNING, priority=priority, user=user)
+            for i in range(count)
+        )
+        return [task.task_id for task in tasks]
+
+    flood_ids = create_running(f'{user.username}-flood', flood, Task.Priority.LOW)
+    high_ids = create_running(f'{user.username}-high', high, Task.Priority.HIGH)
+    published = {}
+    task_postrun.connect(record_finish, weak=False)
+    with contextlib.ExitStack() as stack:
+        if not route:
+            stack.enter_context(patch('apiapp.outbox.task_queue', lambda priority, timer: app.conf.task_default_queue))
+        for index, queues in enumerate(worker_queues):
+            stack.enter_context(start_worker(
+                app, pool='solo', queues=queues, hostname=f'bench-{index}@localhost', perform_ping_check=False,
+            ))
+        with transaction.atomic():
+            enqueue_task_runs([(task_id, 0, Task.Priority.LOW) for task_id in flood_ids])
+        while drain_outbox():
+            pass
+        for task_id in high_ids:
+            with transaction.atomic():
+                enqueue_task_runs([(task_id, 0, Task.Priority.HIGH)])
+            published[str(task_id)] = time.perf_counter()
+            drain_outbox()
+            time.sleep(interval / 1000)
+        deadline = time.perf_counter() + 300
+        while len(finished) < flood + high and time.perf_counter() < deadline:
+            time.sleep(0.01)
+    task_postrun.disconnect(record_finish)
+    assert len(finished) == flood + high, f'{len(finished)} of {flood + high} runs finished'
+    return [(finished[task_id] - start) * 1000 for task_id, start in published.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--flood', type=int, default=2000, help='Low priority runs published at once.')
+    parser.add_argument('--high', type=int, default=50, help='High priority runs published during the flood.')
+    parser.add_argument('--interval', type=float, default=20, help='Milliseconds between high priority runs.')
+    parser.add_argument('--workers', type=int, default=2, help='Workers in each setup.')
+    args = parser.parse_args()
+
+    from benchmarks.common import setup_django, seed_user
+
+    # Each completion is its own transaction; IMMEDIATE keeps the workers'
+    # concurrent SQLite writes from failing with "database is locked".
+    setup_django(TASK_COMPLETION_BATCH_SIZE=1, CELERY_BROKER_URL='memory://')
+    from django.db import connections
+    connections.settings['default']['OPTIONS'].update(transaction_mode='IMMEDIATE', timeout=30)
+    from apiapp.helpers import TASK_QUEUE_BULK, TASK_QUEUE_DEFAULT, TASK_QUEUE_HIGH
+    from taskmanager.celery import app
+
+    app.conf.broker_transport_options = {'polling_interval': 0.001}
+    app.conf.task_default_queue = TASK_QUEUE_DEFAULT
+    high_workers = max(1, args.workers // 2)
+    setups = (
+        ('shared queue', False, [[TASK_QUEUE_DEFAULT]] * args.workers),
+        ('routed queues', True, [[TASK_QUEUE_BULK]] * (args.workers - high_workers) + [[TASK_QUEUE_HIGH]] * high_workers),
+    )
+    for name, route, worker_queues in setups:
+        user, _ = seed_user(f'bench-queue-{int(route)}')
+        latencies = run(app, user, args.flood, args.high, args.interval, worker_queues, route)
+        print(f'{name:<14} high priority p50 {percentile(latencies, 50):8.1f} ms  p95 {percentile(latencies, 95):8.1f} ms  '
+              f'p99 {percentile(latencies, 99):8.1f} ms  ({args.high} runs under a {args.flood} run flood)')
+
+
+if __name__ == '__main__':
+    main()
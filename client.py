@@ -1,15 +1,119 @@
 import typer
 from typing_extensions import Annotated
 from decouple import config
-import requests
 from rich.console import Console
-import shlex
-from rich.rule import Rule
-from rich.pretty import pprint
+import json
+import os
+import time
+from pathlib import Path
+
+# Startup time matters for scripted, one command per process use, so only what
+# every command needs is imported here: typer (which loads rich.console itself),
+# decouple and the stdlib. requests/urllib3 and the rich renderables are
+# imported by the commands using them; `test_client_import_budget` in
+# apiapp/tests.py fails if a heavy import creeps back in.
 
 console = Console()
 
 SERVER_URL = config("SERVER_URL", default="http://0.0.0.0:8000/")
+# HTTP session settings, the session is shared by every command of a process
+# (including the whole `run_api` REPL) so connections are kept alive and reused
+CLIENT_CONNECT_TIMEOUT = config("CLIENT_CONNECT_TIMEOUT", default=3.05, cast=float)
+CLIENT_READ_TIMEOUT = config("CLIENT_READ_TIMEOUT", default=30, cast=float)
+CLIENT_RETRIES = config("CLIENT_RETRIES", default=3, cast=int)
+CLIENT_RETRY_BACKOFF = config("CLIENT_RETRY_BACKOFF", default=0.5, cast=float)
+CLIENT_POOL_SIZE = config("CLIENT_POOL_SIZE", default=10, cast=int)
+# Local mirror of the user's tasks kept up to date by `sync-tasks`
+SYNC_STATE_PATH = config(
+    "SYNC_STATE_PATH", default=os.path.join(os.path.expanduser("~"), ".taskmanager-cli-tasks.json")
+)
+# Local copies of GET responses with their ETag/Last-Modified, reused on 304
+RESPONSE_CACHE_PATH = config(
+    "RESPONSE_CACHE_PATH", default=os.path.join(os.path.expanduser("~"), ".taskmanager-cli-cache.json")
+)
+
+
+_session = None
+
+
+def get_session():
+    """
+    The process wide `requests.Session`, created (and requests imported) on first use.
+
+    Connections are pooled and kept alive between commands and every request
+    gets a default (connect, read) timeout. Failed connections and 502/503/504
+    responses are retried with exponential backoff; POST is only retried when
+    the request never reached the server, so a create isn't sent twice.
+    """
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=CLIENT_RETRIES,
+            backoff_factor=CLIENT_RETRY_BACKOFF,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=CLIENT_POOL_SIZE, pool_maxsize=CLIENT_POOL_SIZE, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.request = _with_default_timeout(session.request, (CLIENT_CONNECT_TIMEOUT, CLIENT_READ_TIMEOUT))
+        _session = session
+    return _session
+
+
+def _with_default_timeout(request, timeout):
+    def request_with_timeout(method, url, **kwargs):
+        kwargs.setdefault("timeout", timeout)
+        return request(method, url, **kwargs)
+    return request_with_timeout
+
+
+def load_response_cache() -> dict:
+    try:
+        with open(RESPONSE_CACHE_PATH) as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_response_cache(response_cache: dict):
+    try:
+        with open(RESPONSE_CACHE_PATH, "w") as cache_file:
+            json.dump(response_cache, cache_file)
+    except OSError as e:
+        console.print(f"[yellow]Could not save response cache: {e}[/yellow]")
+
+
+def conditional_get(url: str, access_token: str):
+    """
+    GET `url` sending the validators of the local copy, if any.
+    Returns (status code, body); a 304 returns the local copy with status 200.
+    """
+    response_cache = load_response_cache()
+    cached = response_cache.get(url)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    if cached:
+        headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    response = get_session().get(url, headers=headers)
+    if response.status_code == 304 and cached:
+        return 200, cached["data"]
+    data = response.json()
+    if response.status_code == 200 and response.headers.get("ETag"):
+        response_cache[url] = {
+            "etag": response.headers["ETag"],
+            "last_modified": response.headers.get("Last-Modified"),
+            "data": data,
+        }
+        save_response_cache(response_cache)
+    return response.status_code, data
 
 app = typer.Typer(
     name="task-manager-cli",
@@ -26,7 +130,7 @@ def get_jwt_token(
     ],
 ):
     try:
-        response = requests.post(
+        response = get_session().post(
             f"{SERVER_URL}api/token/",
             data={
                 "username": username,
@@ -65,7 +169,7 @@ def user_signup(
         typer.Exit: _description_
     """
     try:
-        response = requests.post(
+        response = get_session().post(
             f"{SERVER_URL}api/user-signup/",
             json={
                 "username": username,
@@ -95,11 +199,13 @@ def get_task(
         url = f"{SERVER_URL}api/tasks/"
         if task_id:
             url += f"{task_id}/"
-        response = requests.get(url, headers={"Authorization": f"Bearer {access_token}"})
-        if response.status_code == 200:
-            pprint(response.json())
+        status_code, data = conditional_get(url, access_token)
+        if status_code == 200:
+            from rich.pretty import pprint
+
+            pprint(data)
         else:
-            console.print(f"Error: {response.json().get('error', 'Unknown error')}")
+            console.print(f"Error: {data.get('error', 'Unknown error')}")
             raise typer.Exit(1)
     except Exception as e:
         typer.echo(f"Network error: {e}")
@@ -112,14 +218,15 @@ def create_task(
     name: Annotated[str, typer.Option("--name", "-n", help="Task name.")],
     status: Annotated[str, typer.Option("--status", "-s", help="Task status.")] = None,
     timer: Annotated[int, typer.Option("--timer", "-ti", help="Task timer duration in seconds.")] = None,
+    priority: Annotated[str, typer.Option("--priority", "-p", help="Task priority: hi, nm or lo.")] = None,
 ):
     """
     Create a new task with status create or running.
     """
     try:
-        data = {'name': name, 'status': status, 'timer': timer}
+        data = {'name': name, 'status': status, 'timer': timer, 'priority': priority}
         data = {k: v for k, v in data.items() if v is not None and v != ""}
-        response = requests.post(
+        response = get_session().post(
             f"{SERVER_URL}api/tasks/",
             json=data,
             headers={"Authorization": f"Bearer {access_token}"},
@@ -142,7 +249,7 @@ def destroy_task(
     Destroy a task by ID.
     """
     try:
-        response = requests.delete(
+        response = get_session().delete(
             f"{SERVER_URL}api/tasks/{task_id}/",
             headers={"Authorization": f"Bearer {access_token}"},
         )
@@ -163,15 +270,16 @@ def update_task(
     status: Annotated[str, typer.Option("--status", "-s", help="Task status.")] = None,
     name: Annotated[str, typer.Option("--name", "-n", help="Task name.")] = None,
     timer: Annotated[int, typer.Option("--timer", "-ti", help="Task timer duration in seconds.")] = None,
+    priority: Annotated[str, typer.Option("--priority", "-p", help="Task priority: hi, nm or lo.")] = None,
 ):
     """
     Update a task by ID.
     """
     try:
-        data = {'name': name, 'status': status, 'timer': timer}
+        data = {'name': name, 'status': status, 'timer': timer, 'priority': priority}
         data = {k: v for k, v in data.items() if v is not None and v != ""}
         print(f"Data to be sent: {data}")
-        response = requests.put(
+        response = get_session().put(
             f"{SERVER_URL}api/tasks/{task_id}/",
             json=data,
             headers={"Authorization": f"Bearer {access_token}"},
@@ -185,11 +293,300 @@ def update_task(
         typer.echo(f"Network error: {e}")
         raise typer.Exit(1)
 
+def load_sync_state() -> dict:
+    try:
+        with open(SYNC_STATE_PATH) as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return {"since": None, "tasks": {}}
+
+
+def save_sync_state(state: dict):
+    # Written to a temporary file first so an interrupted sync never leaves a
+    # cursor ahead of the tasks it covers.
+    tmp_path = f"{SYNC_STATE_PATH}.tmp"
+    with open(tmp_path, "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(tmp_path, SYNC_STATE_PATH)
+
+
+@app.command()
+def sync_tasks(
+    access_token: Annotated[str, typer.Option("--access-token", "-at", help="JWT access token for authentication.")],
+    show: Annotated[bool, typer.Option("--show", help="Print the synced tasks.")] = False,
+    reset: Annotated[bool, typer.Option("--reset", help="Drop the local copy and sync from scratch.")] = False,
+):
+    """
+    Sync a local copy of your tasks from the change feed.
+    Only tasks changed since the last sync are downloaded.
+    """
+    state = {"since": None, "tasks": {}} if reset else load_sync_state()
+    applied = 0
+    resynced = False
+    try:
+        while True:
+            params = {"since": state["since"]} if state["since"] else {}
+            response = get_session().get(
+                f"{SERVER_URL}api/tasks/changes/",
+                params=params,
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            if response.status_code == 410:
+                if resynced:
+                    # A cursor from a fresh sync must not expire, don't download everything again
+                    console.print("Error: [bold red]The server expired the cursor of a fresh sync[/bold red]")
+                    raise typer.Exit(1)
+                resynced = True
+                console.print("[yellow]Local copy is too old, syncing from scratch.[/yellow]")
+                state = {"since": None, "tasks": {}}
+                continue
+            if response.status_code != 200:
+                console.print(f"Error: {response.json().get('error', 'Unknown error')}")
+                raise typer.Exit(1)
+            data = response.json()
+            for change in data["changes"]:
+                if change["deleted"]:
+                    state["tasks"].pop(change["task_id"], None)
+                else:
+                    state["tasks"][change["task_id"]] = change["task"]
+            applied += len(data["changes"])
+            state["since"] = data["since"]
+            save_sync_state(state)
+            if not data["has_more"]:
+                break
+    except typer.Exit:
+        raise
+    except Exception as e:
+        typer.echo(f"Network error: {e}")
+        raise typer.Exit(1)
+
+    console.print(f"[bold green]{applied} changes applied, {len(state['tasks'])} tasks in local copy.[/bold green]")
+    if show:
+        from rich.pretty import pprint
+
+        pprint(list(state["tasks"].values()))
+
+
+def iter_sse_events(response):
+    """
+    Yield the JSON data of each Server-Sent Event of a streamed response, and
+    None for keep-alive comments.
+    """
+    data = []
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith(":"):
+            yield None
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
+        elif not line and data:
+            yield json.loads("\n".join(data))
+            data = []
+
+
+@app.command()
+def watch(
+    access_token: Annotated[str, typer.Option("--access-token", "-at", help="JWT access token for authentication.")],
+    task_id: Annotated[str, typer.Option("--task-id", "-t", help="Only watch this task, until it completes or fails.")] = None,
+    timeout: Annotated[float, typer.Option("--timeout", help="Give up after this many seconds.")] = None,
+):
+    """
+    Print status changes of your tasks as they happen.
+    With --task-id, exit once the task completes (exit code 0) or fails (exit code 1).
+    """
+    import requests
+
+    deadline = time.monotonic() + timeout if timeout else None
+    params = {"task_id": task_id} if task_id else {}
+    reconnects = 0
+    while True:
+        try:
+            with get_session().get(
+                f"{SERVER_URL}api/tasks/events/",
+                params=params,
+                headers={"Authorization": f"Bearer {access_token}", "Accept": "text/event-stream"},
+                stream=True,
+            ) as response:
+                if response.status_code != 200:
+                    console.print(f"Error: {response.json().get('error', 'Unknown error')}")
+                    raise typer.Exit(1)
+                reconnects = 0
+                for event in iter_sse_events(response):
+                    if event is not None:
+                        console.print(f"{event['task_id']}: [bold]{event['status']}[/bold]")
+                        if task_id and event["status"] in ("Completed", "Failed"):
+                            raise typer.Exit(0 if event["status"] == "Completed" else 1)
+                    if deadline and time.monotonic() > deadline:
+                        console.print("[yellow]Timed out waiting for events.[/yellow]")
+                        raise typer.Exit(2)
+        except requests.RequestException as e:
+            # The stream dropped; a task stream restarts with the task's current
+            # status, so nothing is missed by reconnecting.
+            reconnects += 1
+            if reconnects > CLIENT_RETRIES:
+                typer.echo(f"Network error: {e}")
+                raise typer.Exit(1)
+            time.sleep(CLIENT_RETRY_BACKOFF * 2 ** reconnects)
+
+
+BULK_OPERATIONS = ("create", "update", "delete")
+
+
+def read_bulk_rows(path: Path, file_format: str):
+    """
+    Lazily yield the rows of a CSV (with a header) or NDJSON file as dicts.
+    """
+    import csv
+
+    with open(path, newline="") as bulk_file:
+        if file_format == "csv":
+            yield from csv.DictReader(bulk_file)
+            return
+        for line in bulk_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def run_bulk_row(row: dict, default_operation: str, access_token: str):
+    """
+    Run the create/update/delete described by `row`.
+    Returns None on success or an error message.
+    """
+    if not isinstance(row, dict):
+        return "Row must be an object"
+    operation = str(row.get("op") or default_operation or "").strip().lower()
+    if operation not in BULK_OPERATIONS:
+        return f"Unknown operation {operation!r}, expected one of {', '.join(BULK_OPERATIONS)}"
+    task_id = row.get("task_id")
+    if operation != "create" and not task_id:
+        return f"task_id is required to {operation} a task"
+    data = {key: row.get(key) for key in ("name", "status", "timer", "priority")}
+    data = {k: v for k, v in data.items() if v is not None and v != ""}
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    if operation == "create":
+        response = get_session().post(f"{SERVER_URL}api/tasks/", json=data, headers=headers)
+        expected = 201
+    elif operation == "update":
+        response = get_session().put(f"{SERVER_URL}api/tasks/{task_id}/", json=data, headers=headers)
+        expected = 200
+    else:
+        response = get_session().delete(f"{SERVER_URL}api/tasks/{task_id}/", headers=headers)
+        expected = 204
+    if response.status_code == expected:
+        return None
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    error = body.get("error", body) if isinstance(body, dict) else body
+    return f"HTTP {response.status_code}: {error or response.reason}"
+
+
+@app.command()
+def bulk(
+    access_token: Annotated[str, typer.Option("--access-token", "-at", help="JWT access token for authentication.")],
+    file: Annotated[Path, typer.Argument(help="CSV (with header) or NDJSON file, one task operation per row.", exists=True, dir_okay=False)],
+    operation: Annotated[str, typer.Option("--op", "-o", help="Operation for rows without an `op` column: create, update or delete.")] = None,
+    file_format: Annotated[str, typer.Option("--format", "-f", help="csv or ndjson, guessed from the file extension by default.")] = None,
+    concurrency: Annotated[int, typer.Option("--concurrency", "-c", help="Requests in flight at once.")] = 8,
+    retry_file: Annotated[Path, typer.Option("--retry-file", "-r", help="NDJSON file the failed rows are written to.")] = None,
+):
+    """
+    Create, update or delete many tasks from a file.
+
+    Rows have an optional `op` (create, update, delete) and the task fields
+    `task_id`, `name`, `status`, `timer` and `priority`. The file is read as it is
+    processed and at most `concurrency` requests run at once over the pooled
+    session. Failed rows are written with their error to the retry file, which
+    can be passed back to this command as is.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
+
+    file_format = (file_format or ("csv" if file.suffix.lower() == ".csv" else "ndjson")).lower()
+    if file_format not in ("csv", "ndjson"):
+        console.print(f"Error: [bold red]Unknown format {file_format}, expected csv or ndjson[/bold red]")
+        raise typer.Exit(1)
+    if concurrency < 1:
+        console.print("Error: [bold red]Concurrency must be at least 1[/bold red]")
+        raise typer.Exit(1)
+    if concurrency > CLIENT_POOL_SIZE:
+        # Connections past the pool size would be opened and thrown away per request.
+        console.print(f"[yellow]Concurrency capped at CLIENT_POOL_SIZE={CLIENT_POOL_SIZE}[/yellow]")
+        concurrency = CLIENT_POOL_SIZE
+    retry_file = retry_file or file.with_name(f"{file.stem}.failed.ndjson")
+    if retry_file.resolve() == file.resolve():
+        # The retry file is truncated before the input is read.
+        console.print("Error: [bold red]The retry file can't be the input file[/bold red]")
+        raise typer.Exit(1)
+
+    succeeded = failed = 0
+    read_error = None
+    start = time.perf_counter()
+    columns = (
+        SpinnerColumn(),
+        TextColumn("[green]{task.fields[succeeded]} ok[/green] [red]{task.fields[failed]} failed[/red]"),
+        TextColumn("{task.fields[rate]:.1f} ops/s"),
+        TimeElapsedColumn(),
+    )
+    with Progress(*columns, console=console) as progress, open(retry_file, "w") as failures, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        progress_task = progress.add_task("bulk", total=None, succeeded=0, failed=0, rate=0.0)
+        pending = {}
+
+        def collect(done):
+            nonlocal succeeded, failed
+            for future in done:
+                row = pending.pop(future)
+                try:
+                    error = future.result()
+                except Exception as e:
+                    error = f"Network error: {e}"
+                if error is None:
+                    succeeded += 1
+                else:
+                    failed += 1
+                    # Keep the resolved operation so the retry file can be passed back as is.
+                    record = {**row, "op": row.get("op") or operation} if isinstance(row, dict) else {"row": row}
+                    failures.write(json.dumps({**record, "error": error}) + "\n")
+            progress.update(
+                progress_task, succeeded=succeeded, failed=failed,
+                rate=(succeeded + failed) / (time.perf_counter() - start),
+            )
+
+        try:
+            for row in read_bulk_rows(file, file_format):
+                # Keep the number of rows read ahead bounded, the file may not fit in memory.
+                if len(pending) >= concurrency * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[executor.submit(run_bulk_row, row, operation, access_token)] = row
+        except (OSError, ValueError) as e:
+            read_error = e
+        collect(wait(pending).done)
+
+    elapsed = time.perf_counter() - start
+    console.print(
+        f"[bold green]{succeeded} succeeded[/bold green], [bold red]{failed} failed[/bold red] "
+        f"in {elapsed:.1f}s ({(succeeded + failed) / elapsed:.1f} ops/s)"
+    )
+    if read_error:
+        console.print(f"Error: [bold red]Stopped reading {file}: {read_error}[/bold red]")
+    if failed:
+        console.print(f"Failed rows written to {retry_file}")
+    if failed or read_error:
+        raise typer.Exit(1)
+    retry_file.unlink(missing_ok=True)
+
+
 @app.command()
 def run_api(access_token: Annotated[str, typer.Option("--access-token", "-at", help="JWT access token for authentication.")] = None):
     """
     Run the API server.
     """
+    import shlex
+    from rich.rule import Rule
+
     console.print("[bold magenta]Welcome to the task manager CLI![/bold magenta]")
     console.print("Enter commands like 'create my-res --value hello', 'get', 'destroy my-res', or 'exit'.")
     access_token = access_token.strip().replace(" ", "")
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its total time covers the whole stack
+    'apiapp.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,6 +91,22 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Redis when CACHE_REDIS_URL is set, so web and celery processes share it.
+
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default='')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_REDIS_URL,
+    } if CACHE_REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -124,13 +142,17 @@ USE_TZ = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apiapp.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
 }
 
+# Serve the task list/detail endpoints from the async views (apiapp/async_views.py),
+# meant for ASGI deployments (taskmanager/asgi.py under uvicorn/daphne).
+TASK_API_ASYNC = config('TASK_API_ASYNC', default=False, cast=bool)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
@@ -152,5 +174,11 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CELERY_TASK_TIME_LIMIT = 1 * 60  # 1 minute
 CELERY_TASK_SOFT_TIME_LIMIT = 50  # 50 seconds
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
+# Task timers are scheduled with ETA/countdown instead of sleeping in the worker.
+# Redis redelivers unacked messages after the visibility timeout, so it must be
+# longer than the longest task timer.
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'visibility_timeout': config('CELERY_VISIBILITY_TIMEOUT', default=12 * 60 * 60, cast=int),
+}
 DJANGO_SETTINGS_MODULE = 'taskmanager.settings'
\ No newline at end of file
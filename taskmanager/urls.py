@@ -15,8 +15,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from apiapp.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('apiapp.urls')),
+    path('metrics', metrics, name='metrics'),
 ]